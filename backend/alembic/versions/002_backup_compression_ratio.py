@@ -0,0 +1,24 @@
+"""Add compression ratio to backups
+
+Revision ID: 002_backup_compression_ratio
+Revises: 001_initial_schema
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '002_backup_compression_ratio'
+down_revision = '001_initial_schema'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Uncompressed size / stored size, filled by the compression stage
+    op.add_column('backups', sa.Column('compression_ratio', sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('backups', 'compression_ratio')
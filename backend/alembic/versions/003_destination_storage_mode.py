@@ -0,0 +1,27 @@
+"""Add storage mode to database destinations
+
+Revision ID: 003_destination_storage_mode
+Revises: 002_backup_compression_ratio
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '003_destination_storage_mode'
+down_revision = '002_backup_compression_ratio'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # "file" (one file per backup) or "dedup" (chunk store + manifests)
+    op.add_column(
+        'database_destinations',
+        sa.Column('storage_mode', sa.String(), nullable=False, server_default='file')
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('database_destinations', 'storage_mode')
@@ -0,0 +1,38 @@
+"""Add incremental backup chains
+
+Revision ID: 004_incremental_backup_chains
+Revises: 003_destination_storage_mode
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '004_incremental_backup_chains'
+down_revision = '003_destination_storage_mode'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Backups: kind, link to the previous backup of the chain, kind specific metadata
+    op.add_column('backups', sa.Column('backup_kind', sa.String(), nullable=False, server_default='full'))
+    op.add_column('backups', sa.Column('parent_backup_id', sa.Integer(), nullable=True))
+    op.add_column('backups', sa.Column('backup_metadata', sa.Text(), nullable=True))
+    with op.batch_alter_table('backups') as batch_op:
+        batch_op.create_foreign_key('fk_backups_parent_backup_id', 'backups', ['parent_backup_id'], ['id'])
+    op.create_index(op.f('ix_backups_parent_backup_id'), 'backups', ['parent_backup_id'], unique=False)
+
+    # Schedules: "full" or "incremental"
+    op.add_column('schedules', sa.Column('backup_kind', sa.String(), nullable=False, server_default='full'))
+
+
+def downgrade() -> None:
+    op.drop_column('schedules', 'backup_kind')
+    op.drop_index(op.f('ix_backups_parent_backup_id'), table_name='backups')
+    with op.batch_alter_table('backups') as batch_op:
+        batch_op.drop_constraint('fk_backups_parent_backup_id', type_='foreignkey')
+    op.drop_column('backups', 'backup_metadata')
+    op.drop_column('backups', 'parent_backup_id')
+    op.drop_column('backups', 'backup_kind')
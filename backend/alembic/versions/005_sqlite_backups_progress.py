@@ -0,0 +1,30 @@
+"""Add SQLite database type and backup progress
+
+Revision ID: 005_sqlite_backups_progress
+Revises: 004_incremental_backup_chains
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '005_sqlite_backups_progress'
+down_revision = '004_incremental_backup_chains'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Native enum on PostgreSQL; SQLite stores the enum as plain text
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.execute("ALTER TYPE databasetype ADD VALUE IF NOT EXISTS 'SQLITE'")
+
+    # Live progress of running backups (JSON)
+    op.add_column('backups', sa.Column('progress', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('backups', 'progress')
+    # PostgreSQL cannot drop a value from an enum type: 'SQLITE' stays in databasetype
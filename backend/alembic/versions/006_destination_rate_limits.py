@@ -0,0 +1,26 @@
+"""Add bandwidth limits to database destinations
+
+Revision ID: 006_destination_rate_limits
+Revises: 005_sqlite_backups_progress
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '006_destination_rate_limits'
+down_revision = '005_sqlite_backups_progress'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Token bucket per destination: rate (bytes/s) and burst (bytes), NULL = unlimited
+    op.add_column('database_destinations', sa.Column('rate_limit_bps', sa.BigInteger(), nullable=True))
+    op.add_column('database_destinations', sa.Column('burst_bytes', sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('database_destinations', 'burst_bytes')
+    op.drop_column('database_destinations', 'rate_limit_bps')
@@ -0,0 +1,24 @@
+"""Record the size and duration estimate of backups
+
+Revision ID: 007_backup_estimates
+Revises: 006_destination_rate_limits
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '007_backup_estimates'
+down_revision = '006_destination_rate_limits'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # JSON prediction made before the run, compared with the outcome by later estimates
+    op.add_column('backups', sa.Column('estimate', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('backups', 'estimate')
@@ -0,0 +1,24 @@
+"""Record the change fingerprint of backups
+
+Revision ID: 008_backup_fingerprints
+Revises: 007_backup_estimates
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '008_backup_fingerprints'
+down_revision = '007_backup_estimates'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Probed before the dump; "unchanged" backups point at their parent instead of storing an artifact
+    op.add_column('backups', sa.Column('fingerprint', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('backups', 'fingerprint')
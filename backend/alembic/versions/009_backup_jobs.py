@@ -0,0 +1,48 @@
+"""Add the persistent backup job queue
+
+Revision ID: 009_backup_jobs
+Revises: 008_backup_fingerprints
+Create Date: 2026-10-17 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '009_backup_jobs'
+down_revision = '008_backup_fingerprints'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Queued scheduled/manual backups and retries, claimed by workers under a lease
+    op.create_table(
+        'backup_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('backup_id', sa.Integer(), nullable=False),
+        sa.Column('database_id', sa.Integer(), nullable=False),
+        sa.Column('action', sa.String(), nullable=False),
+        sa.Column('backup_kind', sa.String(), nullable=True),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('worker', sa.String(), nullable=True),
+        sa.Column('lease_expires_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+        sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.ForeignKeyConstraint(['backup_id'], ['backups.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['database_id'], ['databases.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_backup_jobs_id'), 'backup_jobs', ['id'], unique=False)
+    op.create_index(op.f('ix_backup_jobs_backup_id'), 'backup_jobs', ['backup_id'], unique=False)
+    op.create_index(op.f('ix_backup_jobs_status'), 'backup_jobs', ['status'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_backup_jobs_status'), table_name='backup_jobs')
+    op.drop_index(op.f('ix_backup_jobs_backup_id'), table_name='backup_jobs')
+    op.drop_index(op.f('ix_backup_jobs_id'), table_name='backup_jobs')
+    op.drop_table('backup_jobs')
@@ -0,0 +1,27 @@
+"""Add per-group concurrency limits and job wait times
+
+Revision ID: 010_concurrency_limits
+Revises: 009_backup_jobs
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '010_concurrency_limits'
+down_revision = '009_backup_jobs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Backups of a group running at once (NULL: BACKUP_MAX_PER_GROUP)
+    op.add_column('groups', sa.Column('max_concurrent_backups', sa.Integer(), nullable=True))
+    # Seconds a job spent queued before it was claimed
+    op.add_column('backup_jobs', sa.Column('wait_seconds', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('backup_jobs', 'wait_seconds')
+    op.drop_column('groups', 'max_concurrent_backups')
@@ -0,0 +1,29 @@
+"""Add schedule/job priorities and group weights
+
+Revision ID: 011_fair_share_priorities
+Revises: 010_concurrency_limits
+Create Date: 2026-10-17 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '011_fair_share_priorities'
+down_revision = '010_concurrency_limits'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Queued backups with a higher priority run first
+    op.add_column('schedules', sa.Column('priority', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('backup_jobs', sa.Column('priority', sa.Integer(), nullable=False, server_default='0'))
+    # Share of the workers between groups (weighted fair share)
+    op.add_column('groups', sa.Column('weight', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade() -> None:
+    op.drop_column('groups', 'weight')
+    op.drop_column('backup_jobs', 'priority')
+    op.drop_column('schedules', 'priority')
@@ -0,0 +1,39 @@
+"""Add worker node registrations
+
+Revision ID: 012_worker_nodes
+Revises: 011_fair_share_priorities
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '012_worker_nodes'
+down_revision = '011_fair_share_priorities'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Worker processes sharing the job queue: capacity, reachable destinations, heartbeat
+    op.create_table(
+        'worker_nodes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('hostname', sa.String(), nullable=False),
+        sa.Column('pid', sa.Integer(), nullable=True),
+        sa.Column('capacity', sa.Integer(), nullable=False),
+        sa.Column('destinations', sa.Text(), nullable=True),
+        sa.Column('started_at', sa.DateTime(timezone=True), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+        sa.Column('heartbeat_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_worker_nodes_id'), 'worker_nodes', ['id'], unique=False)
+    op.create_index(op.f('ix_worker_nodes_name'), 'worker_nodes', ['name'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_worker_nodes_name'), table_name='worker_nodes')
+    op.drop_index(op.f('ix_worker_nodes_id'), table_name='worker_nodes')
+    op.drop_table('worker_nodes')
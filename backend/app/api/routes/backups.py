@@ -1,34 +1,56 @@
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import List
-from pydantic import BaseModel
-from datetime import datetime
+from pydantic import BaseModel, Field
+from datetime import datetime, timezone
 
 from app.core.database import get_db
 from app.core.deps import get_current_user
 from app.models.user import User
 from app.models.database import Database
-from app.models.backup import Backup, BackupStatus
+from app.models.backup import Backup, BackupKind, BackupStatus
 from app.models.database_destination import DatabaseDestination
-from app.utils.backup_task import execute_backup_task
+from app.models.backup_job import JobAction
+from app.core.job_queue import enqueue_job, get_active_job, get_group_wait_stats, get_queue_stats, get_worker_nodes
+from app.utils.backup_chain import get_backup_chain, get_point_in_time_chain, has_dependents, load_metadata
+from app.utils.backup_encryption import (
+    ENCRYPTED_EXTENSION,
+    EncryptedFile,
+    decrypt_chunks,
+    is_encrypted_file,
+    iter_decrypted_file,
+    parse_byte_range
+)
+from app.utils.backup_pipeline import compute_checksum, iter_file_chunks
+from app.utils.dedup_store import (
+    is_manifest,
+    read_manifest,
+    missing_chunks,
+    iter_manifest_data,
+    remove_backup_file,
+    collect_garbage
+)
 
 router = APIRouter()
 
 
 class ManualBackupRequest(BaseModel):
     database_id: int
+    backup_kind: str = Field(default="full", pattern="^(full|incremental)$")
+    priority: int = Field(default=0, ge=0, le=100)  # Higher runs first when backups queue up
 
 
 @router.post("/manual")
 async def trigger_manual_backup(
     request: ManualBackupRequest,
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Trigger a manual backup for a database.
-    Uses the database's configured destinations.
+    Uses the database's configured destinations. The backup is queued and
+    run by the worker pool with the scheduled ones.
     """
     database_id = request.database_id
     database = db.query(Database).filter(Database.id == database_id).first()
@@ -58,22 +80,23 @@ async def trigger_manual_backup(
         schedule_id=None,  # Manual backup
         status=BackupStatus.PENDING,
         created_by=current_user.id,
-        is_compressed=True
+        is_compressed=True,
+        backup_kind=request.backup_kind
     )
 
     db.add(new_backup)
     db.commit()
     db.refresh(new_backup)
 
-    # Execute backup in background task
-    background_tasks.add_task(execute_backup_task, new_backup.id, database_id)
+    job = enqueue_job(db, new_backup, priority=request.priority)
 
     return {
-        "message": "Backup started",
+        "message": "Backup queued",
         "backup_id": new_backup.id,
+        "job_id": job.id,
         "backup_name": backup_name,
         "destinations": [dest.path for dest in destinations],
-        "status": "in_progress"
+        "status": "queued"
     }
 
 
@@ -95,6 +118,91 @@ async def list_backups(
     return backups
 
 
+@router.get("/restore-plan")
+async def get_restore_plan(
+    database_id: int,
+    target_time: datetime,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Get the backups to restore, in order, to bring a database back to
+    target_time (UTC): a chain root plus only the increments needed.
+    Replay the last increment up to target_time (recovery_target_time for
+    PostgreSQL WAL, mysqlbinlog --stop-datetime for MySQL binlogs).
+    """
+    database = db.query(Database).filter(Database.id == database_id).first()
+    if not database:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Database not found"
+        )
+
+    if target_time.tzinfo:
+        target_time = target_time.astimezone(timezone.utc).replace(tzinfo=None)
+
+    chain, covered = get_point_in_time_chain(db, database_id, target_time)
+    if not chain:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No incremental chain covers this point in time"
+        )
+
+    return {
+        "database_id": database_id,
+        "target_time": target_time,
+        "covered": covered,
+        "backups": [
+            {
+                "id": link.id,
+                "name": link.name,
+                "backup_kind": link.backup_kind,
+                "completed_at": link.completed_at,
+                "metadata": load_metadata(link),
+                "destination_results": link.destination_results
+            }
+            for link in chain
+        ]
+    }
+
+
+@router.get("/queue")
+async def get_backup_queue(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Backup job queue: queue depth, running jobs, the age of the oldest
+    queued job, and the queued/running jobs in the order they will run.
+    """
+    return get_queue_stats(db)
+
+
+@router.get("/queue/groups")
+async def get_backup_queue_groups(
+    hours: int = 24,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Wait times per group: queued and running jobs, the oldest queued job,
+    and the waits of the jobs started in the last `hours`.
+    """
+    return get_group_wait_stats(db, hours)
+
+
+@router.get("/workers")
+async def get_backup_workers(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Worker nodes draining the job queue: capacity, running jobs, the
+    destinations they can reach and their last heartbeat.
+    """
+    return get_worker_nodes(db)
+
+
 @router.get("/{backup_id}")
 async def get_backup(
     backup_id: int,
@@ -112,15 +220,104 @@ async def get_backup(
     return backup
 
 
+@router.get("/{backup_id}/chain")
+async def get_backup_chain_info(
+    backup_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Get every backup needed to restore this one, in restore order
+    (chain root first). Full backups are a chain of one.
+    """
+    backup = db.query(Backup).filter(Backup.id == backup_id).first()
+    if not backup:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Backup not found"
+        )
+
+    chain = get_backup_chain(backup)
+    return {
+        "backup_id": backup_id,
+        "length": len(chain),
+        "backups": [
+            {
+                "id": link.id,
+                "name": link.name,
+                "backup_kind": link.backup_kind,
+                "parent_backup_id": link.parent_backup_id,
+                "status": link.status.value,
+                "created_at": link.created_at,
+                "file_size": link.file_size,
+                "metadata": load_metadata(link),
+                "destination_results": link.destination_results
+            }
+            for link in chain
+        ]
+    }
+
+
+@router.post("/{backup_id}/retry")
+async def retry_backup(
+    backup_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Retry the copies of a failed or partial backup from its staged dump.
+    Destinations that already have the backup are skipped; interrupted
+    copies resume from their last checkpoint.
+    """
+    import os
+
+    backup = db.query(Backup).filter(Backup.id == backup_id).first()
+    if not backup:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Backup not found"
+        )
+
+    if backup.status not in (BackupStatus.FAILED, BackupStatus.PARTIAL):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Only failed or partial backups can be retried (status: {backup.status.value})"
+        )
+
+    if not backup.file_path or not os.path.exists(backup.file_path):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="The staged dump of this backup is gone, start a new backup instead"
+        )
+
+    if get_active_job(db, backup.id):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="This backup is already queued or running"
+        )
+
+    job = enqueue_job(db, backup, JobAction.RETRY)
+
+    return {
+        "message": "Backup retry queued",
+        "backup_id": backup.id,
+        "job_id": job.id,
+        "status": "queued"
+    }
+
+
 @router.get("/{backup_id}/verify")
 async def verify_backup_files(
     backup_id: int,
+    verify_checksum: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Verify if backup files still exist on disk for all destinations.
     Returns file existence status for each destination.
+    With verify_checksum, every file is read back and compared with the
+    checksum recorded when the backup was written.
     """
     import json
     import os
@@ -132,6 +329,10 @@ async def verify_backup_files(
             detail="Backup not found"
         )
 
+    # Unchanged backups have no files of their own: use the backup they reference
+    if backup.backup_kind == BackupKind.UNCHANGED.value and backup.parent:
+        backup = backup.parent
+
     if not backup.destination_results:
         return {
             "backup_id": backup_id,
@@ -139,6 +340,7 @@ async def verify_backup_files(
             "destinations": {},
             "all_exist": False,
             "missing_count": 0,
+            "corrupted_count": 0,
             "total_count": 0
         }
 
@@ -146,6 +348,7 @@ async def verify_backup_files(
         results = json.loads(backup.destination_results)
         verification = {}
         missing_count = 0
+        corrupted_count = 0
         total_count = 0
 
         for path, result in results.items():
@@ -161,6 +364,25 @@ async def verify_backup_files(
                     "original_size_mb": result.get('size_mb')
                 }
 
+                # Dedup destinations: the backup exists only if all its chunks do
+                if exists and is_manifest(file_path):
+                    missing = missing_chunks(file_path)
+                    exists = not missing
+                    verification[path].update({
+                        "exists": exists,
+                        "size_bytes": read_manifest(file_path).get("size"),
+                        "missing_chunks": len(missing)
+                    })
+
+                expected = result.get('checksum') or backup.checksum
+                verification[path]["checksum"] = expected
+                if verify_checksum and exists and expected:
+                    chunks = iter_manifest_data(file_path) if is_manifest(file_path) else iter_file_chunks(file_path)
+                    actual = await run_in_threadpool(compute_checksum, chunks, expected)
+                    verification[path]["checksum_match"] = actual == expected if actual else None
+                    if actual and actual != expected:
+                        corrupted_count += 1
+
                 total_count += 1
                 if not exists:
                     missing_count += 1
@@ -171,6 +393,7 @@ async def verify_backup_files(
             "destinations": verification,
             "all_exist": missing_count == 0,
             "missing_count": missing_count,
+            "corrupted_count": corrupted_count,
             "total_count": total_count
         }
 
@@ -184,7 +407,9 @@ async def verify_backup_files(
 @router.get("/{backup_id}/download")
 async def download_backup(
     backup_id: int,
+    request: Request,
     destination_path: str = None,
+    decrypt: bool = True,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -193,8 +418,10 @@ async def download_backup(
 
     - backup_id: ID of backup
     - destination_path: Path of destination to download from (optional, uses first available if not specified)
+    - decrypt: Decrypt encrypted backups on the fly (default). Ranges of the
+      decrypted content are supported with the Range header.
     """
-    from fastapi.responses import FileResponse
+    from fastapi.responses import FileResponse, StreamingResponse
     import json
     import os
 
@@ -205,6 +432,10 @@ async def download_backup(
             detail="Backup not found"
         )
 
+    # Unchanged backups have no files of their own: use the backup they reference
+    if backup.backup_kind == BackupKind.UNCHANGED.value and backup.parent:
+        backup = backup.parent
+
     if not backup.destination_results:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -233,6 +464,22 @@ async def download_backup(
                 detail="Backup file not found on disk"
             )
 
+        if is_manifest(file_path):
+            # Dedup destination: reassemble the artifact from its chunks
+            filename = read_manifest(file_path).get("filename") or os.path.basename(file_path)
+            data = iter_manifest_data(file_path)
+            if backup.is_encrypted and decrypt:
+                data = decrypt_chunks(data)
+                filename = filename.removesuffix(ENCRYPTED_EXTENSION)
+            return StreamingResponse(
+                data,
+                media_type='application/octet-stream',
+                headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+            )
+
+        if backup.is_encrypted and decrypt and is_encrypted_file(file_path):
+            return _decrypted_file_response(file_path, request.headers.get("range"))
+
         return FileResponse(
             path=file_path,
             filename=os.path.basename(file_path),
@@ -246,6 +493,54 @@ async def download_backup(
         )
 
 
+def _decrypted_file_response(file_path: str, range_header: str = None):
+    """Stream the plaintext of an encrypted backup file, or a byte range of it"""
+    from fastapi.responses import StreamingResponse
+    import os
+
+    try:
+        encrypted = EncryptedFile(file_path)
+        size = encrypted.size
+        encrypted.close()
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+    try:
+        byte_range = parse_byte_range(range_header, size)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail=str(e),
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+
+    filename = os.path.basename(file_path).removesuffix(ENCRYPTED_EXTENSION)
+    headers = {
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "Accept-Ranges": "bytes"
+    }
+    if byte_range is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(
+            iter_decrypted_file(file_path),
+            media_type='application/octet-stream',
+            headers=headers
+        )
+
+    start, end = byte_range
+    headers["Content-Length"] = str(end - start)
+    headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+    return StreamingResponse(
+        iter_decrypted_file(file_path, start, end),
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        media_type='application/octet-stream',
+        headers=headers
+    )
+
+
 @router.delete("/{backup_id}")
 async def delete_backup(
     backup_id: int,
@@ -273,8 +568,16 @@ async def delete_backup(
             detail="Not authorized to delete this backup"
         )
 
+    # Later backups of an incremental chain cannot be restored without this one
+    if has_dependents(db, backup):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Backup is part of an incremental chain: delete the backups that depend on it first"
+        )
+
     deleted_files = []
     errors = []
+    chunk_stores = set()
 
     # Delete physical files if requested
     if delete_files and backup.destination_results:
@@ -288,13 +591,23 @@ async def delete_backup(
                     file_path = result['file_path']
                     try:
                         if os.path.exists(file_path):
-                            os.remove(file_path)
+                            store_root = remove_backup_file(file_path)
+                            if store_root:
+                                chunk_stores.add(store_root)
                             deleted_files.append(file_path)
                     except Exception as e:
                         errors.append(f"{file_path}: {str(e)}")
         except Exception as e:
             errors.append(f"Error parsing destination results: {str(e)}")
 
+        # Drop chunks no other backup references any more
+        for store_root in chunk_stores:
+            try:
+                # Walks the whole store: off the event loop
+                await run_in_threadpool(collect_garbage, store_root)
+            except Exception as e:
+                errors.append(f"Chunk cleanup failed for {store_root}: {str(e)}")
+
     # Delete database record
     db.delete(backup)
     db.commit()
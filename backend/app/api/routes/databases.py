@@ -9,6 +9,7 @@ from app.models.user import User
 from app.models.database import Database
 from app.models.group import Group
 from app.models.backup import Backup, BackupStatus
+from app.models.database_destination import DatabaseDestination
 from app.models.schedule import Schedule
 from app.models.schedule import Schedule
 # from app.models.backup_destination import BackupDestination, DestinationStatus  # OLD - removed
@@ -24,6 +25,9 @@ from app.schemas.database import (
     DestinationFileInfo
 )
 from app.utils.file_verification import verify_backup_file
+from app.utils.backup_executor import build_compressor, get_dump_mode, parse_connection_options
+from app.utils.dedup_store import STORAGE_MODE_DEDUP
+from app.utils.estimator import check_destination_space, estimate_backup
 from app.utils.database_connection import test_database_connection as test_db_conn
 
 router = APIRouter()
@@ -192,12 +196,16 @@ def get_database_details(
             schedule_name=schedule_name,
             status=backup.status.value,
             error_message=backup.error_message,
+            progress=backup.progress,
             started_at=backup.started_at,
             completed_at=backup.completed_at,
             duration_seconds=backup.duration_seconds,
             created_at=backup.created_at,
             is_compressed=backup.is_compressed,
             compression_type=backup.compression_type,
+            compression_ratio=backup.compression_ratio,
+            backup_kind=backup.backup_kind,
+            parent_backup_id=backup.parent_backup_id,
             destinations=destinations_list,
             destination_results=backup.destination_results,  # Include multi-destination results JSON
             # Legacy fields for backward compatibility
@@ -225,6 +233,45 @@ def get_database_details(
     return DatabaseDetailResponse(**response_data)
 
 
+@router.get("/{database_id}/estimate")
+def estimate_database_backup(
+    database_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Predict the next full backup: dump and stored size, compression ratio,
+    duration and dump timeout, plus the destinations without room for it.
+    """
+    database = db.query(Database).filter(Database.id == database_id).first()
+    if not database:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Database not found"
+        )
+
+    destinations = db.query(DatabaseDestination).filter(
+        DatabaseDestination.database_id == database_id,
+        DatabaseDestination.enabled == True
+    ).all()
+    db_type = database.db_type.value
+    options = parse_connection_options(database.connection_options)
+    compressor = build_compressor(
+        db_type, options, get_dump_mode(db_type, options),
+        dedup=any(dest.storage_mode == STORAGE_MODE_DEDUP for dest in destinations)
+    )
+
+    estimate = estimate_backup(db, database, compressor.codec if compressor else None)
+    insufficient = {}
+    if estimate["artifact_bytes"]:
+        insufficient = check_destination_space(destinations, estimate["artifact_bytes"])
+    return {
+        "database_id": database_id,
+        **estimate,
+        "insufficient_space": {path: result["error"] for path, result in insufficient.items()}
+    }
+
+
 @router.post("/", response_model=DatabaseResponse, status_code=status.HTTP_201_CREATED)
 def create_database(
     database_data: DatabaseCreate,
@@ -90,7 +90,10 @@ def add_database_destination(
     new_destination = DatabaseDestination(
         database_id=database_id,
         path=path,
-        enabled=destination_data.enabled
+        enabled=destination_data.enabled,
+        storage_mode=destination_data.storage_mode,
+        rate_limit_bps=destination_data.rate_limit_bps,
+        burst_bytes=destination_data.burst_bytes
     )
 
     db.add(new_destination)
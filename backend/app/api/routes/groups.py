@@ -72,6 +72,8 @@ def create_group(
     new_group = Group(
         name=group_data.name,
         description=group_data.description,
+        max_concurrent_backups=group_data.max_concurrent_backups,
+        weight=group_data.weight,
         created_by=current_user.id
     )
 
@@ -9,14 +9,12 @@ import logging
 
 from app.core.database import get_db
 from app.core.deps import get_current_user
-from app.core.scheduler import add_schedule_job, remove_schedule_job
+from app.core.scheduler import add_schedule_job, remove_schedule_job, select_expired_backups, delete_backups
 from app.models.user import User
 from app.models.schedule import Schedule
 from app.models.database import Database
 from app.models.backup import Backup, BackupStatus
 from app.schemas.schedule import ScheduleCreate, ScheduleUpdate, ScheduleResponse
-from sqlalchemy import and_
-from datetime import timedelta
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -204,74 +202,17 @@ def cleanup_schedule_backups(
             detail="Schedule not found"
         )
 
-    # Get all completed backups for this schedule
-    all_backups = db.query(Backup).filter(
-        and_(
-            Backup.schedule_id == schedule.id,
-            Backup.status == BackupStatus.COMPLETED
-        )
-    ).order_by(Backup.created_at.desc()).all()
-
-    backups_to_delete = []
-    deleted_files = []
-    errors = []
-
-    # Apply retention_days policy
-    if schedule.retention_days and schedule.retention_days > 0:
-        cutoff_date = datetime.utcnow() - timedelta(days=schedule.retention_days)
-        for backup in all_backups:
-            if backup.created_at and backup.created_at < cutoff_date:
-                backups_to_delete.append(backup)
-
-    # Apply max_backups policy
-    if schedule.max_backups and schedule.max_backups > 0:
-        if len(all_backups) > schedule.max_backups:
-            excess_backups = all_backups[schedule.max_backups:]
-            for backup in excess_backups:
-                if backup not in backups_to_delete:
-                    backups_to_delete.append(backup)
-
-    # Delete marked backups
-    for backup in backups_to_delete:
-        try:
-            # Delete files from multi-destination results
-            if backup.destination_results:
-                try:
-                    results = json.loads(backup.destination_results)
-                    for dest_name, dest_data in results.items():
-                        if dest_data.get('success') and dest_data.get('file_path'):
-                            file_path = dest_data['file_path']
-                            if os.path.exists(file_path):
-                                try:
-                                    os.remove(file_path)
-                                    deleted_files.append(file_path)
-                                    logger.info(f"Deleted backup file: {file_path}")
-                                except Exception as e:
-                                    errors.append(f"Error deleting {file_path}: {str(e)}")
-                except json.JSONDecodeError as e:
-                    errors.append(f"Error parsing destination_results for backup {backup.id}: {str(e)}")
-            
-            # Delete legacy file path
-            if backup.file_path and os.path.exists(backup.file_path):
-                try:
-                    os.remove(backup.file_path)
-                    deleted_files.append(backup.file_path)
-                except Exception as e:
-                    errors.append(f"Error deleting {backup.file_path}: {str(e)}")
-            
-            # Delete backup record
-            db.delete(backup)
-        except Exception as e:
-            errors.append(f"Error processing backup {backup.id}: {str(e)}")
-
-    db.commit()
+    # Same selection and deletion as the scheduler: dedup chunks are garbage
+    # collected, backups other backups depend on are kept
+    backups_to_delete, total_backups = select_expired_backups(db, schedule)
+    deleted_files, errors = delete_backups(db, backups_to_delete)
 
     return {
         "message": f"Cleanup completed for schedule {schedule.name}",
         "schedule_id": schedule_id,
         "retention_days": schedule.retention_days,
         "max_backups": schedule.max_backups,
-        "total_backups_before": len(all_backups),
+        "total_backups_before": total_backups,
         "backups_deleted": len(backups_to_delete),
         "files_deleted": deleted_files,
         "errors": errors if errors else None
@@ -1,4 +1,6 @@
 from cryptography.fernet import Fernet
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 import base64
 import os
 from hashlib import sha256
@@ -12,6 +14,12 @@ def get_encryption_key() -> bytes:
     return base64.urlsafe_b64encode(key_hash)
 
 
+def derive_key(purpose: bytes, length: int = 32) -> bytes:
+    """Derive an independent key for `purpose` from the ENCRYPTION_KEY material (HKDF-SHA256)"""
+    material = base64.urlsafe_b64decode(get_encryption_key())
+    return HKDF(algorithm=hashes.SHA256(), length=length, salt=None, info=purpose).derive(material)
+
+
 def encrypt_password(password: str) -> str:
     """Encrypt a password for storage"""
     if not password:
@@ -0,0 +1,712 @@
+"""
+Persistent backup job queue.
+Scheduled and manual backups (and retries) are queued as rows of the
+backup_jobs table and run by a fixed pool of BACKUP_WORKERS threads: a
+burst of schedules never runs more dumps at once than the pool has
+workers, and queued work survives a restart. A running job holds a lease
+renewed by the process running it; jobs whose lease expired (their
+process is gone) are queued again.
+
+Jobs are also held while their source server (Database host:port) or
+their group already runs as many backups as allowed, so databases sharing
+a server are not all dumped at once; the next job that fits runs instead.
+
+The pool runs inside the API process (BACKUP_WORKER_MODE=embedded) or in
+separate worker processes started with `python -m app.worker`
+(BACKUP_WORKER_MODE=external on the API): the API then only queues jobs
+and reads their state, the table is the only link between the two.
+
+Among the jobs that can start, the highest priority (from the schedule or
+the manual request) goes first. Equal priorities are shared between
+groups in proportion to Group.weight: the group running the fewest
+backups per unit of weight goes next, so a group queueing hundreds of
+small backups cannot starve the others. Ties run in arrival order.
+
+Several worker nodes (hosts) can drain one queue through a shared
+PostgreSQL app database. Claims then take a transaction-level advisory
+lock, so limits and fair share are decided on one consistent view, and
+lock the job row with SELECT ... FOR UPDATE SKIP LOCKED; on SQLite the
+conditional update alone makes claims safe (one writer at a time). A
+node only claims jobs whose destinations it can reach (see
+core/worker_nodes), and the jobs of a node that stops heartbeating are
+requeued for the others.
+"""
+import os
+import json
+import threading
+import time
+import math
+import logging
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+
+from app.core.database import SessionLocal
+from app.models.backup import Backup, BackupKind, BackupStatus
+from app.models.backup_job import BackupJob, JobAction, JobStatus
+from app.models.database import Database
+from app.models.database_destination import DatabaseDestination
+from app.models.group import Group
+from app.models.worker_node import WorkerNode
+from app.core.worker_nodes import (
+    NODE_NAME,
+    NODE_DESTINATIONS,
+    describe_node,
+    get_live_nodes,
+    heartbeat_node,
+    prune_dead_nodes,
+    reaches,
+    register_node,
+    unregister_node
+)
+from app.utils.backup_task import (
+    execute_backup_task,
+    retry_backup_task,
+    fail_interrupted_backups,
+    reclaim_staging_space
+)
+from app.utils.command_output import kill_running_commands
+
+logger = logging.getLogger(__name__)
+
+# "embedded": the API process runs the workers; "external": worker processes do (app.worker)
+WORKER_MODE_EMBEDDED = "embedded"
+WORKER_MODE_EXTERNAL = "external"
+WORKER_MODE = os.getenv("BACKUP_WORKER_MODE", WORKER_MODE_EMBEDDED).lower()
+
+# Backups running at once in a worker process (its capacity as a node)
+WORKER_COUNT = max(int(os.getenv("BACKUP_WORKERS", "4")), 1)
+
+# A running job is requeued when its lease is not renewed for this long;
+# a node silent for this long is dead
+JOB_LEASE_SECONDS = int(os.getenv("BACKUP_JOB_LEASE_SECONDS", "300"))
+
+# Claims of a job before it is given up (interruptions, not failed backups)
+JOB_MAX_ATTEMPTS = int(os.getenv("BACKUP_JOB_MAX_ATTEMPTS", "3"))
+
+# Finished jobs are deleted after this many days
+JOB_RETENTION_DAYS = int(os.getenv("BACKUP_JOB_RETENTION_DAYS", "7"))
+
+# Idle workers look for jobs queued by other processes this often
+QUEUE_POLL_SECONDS = 5.0
+
+# Backups running at once against one source server (host:port) and in one
+# group (Group.max_concurrent_backups overrides the latter), 0 = no limit
+MAX_PER_HOST = int(os.getenv("BACKUP_MAX_PER_HOST", "2"))
+MAX_PER_GROUP = int(os.getenv("BACKUP_MAX_PER_GROUP", "0"))
+
+# Dead nodes are listed (GET /api/backups/workers) this long before they are forgotten
+NODE_FORGET_SECONDS = 24 * 3600
+
+# Key of the PostgreSQL advisory lock serializing claims across nodes
+CLAIM_LOCK_KEY = 0x4241434B
+
+
+def enqueue_job(db: Session, backup: Backup, action: JobAction = JobAction.BACKUP,
+                priority: int = None) -> BackupJob:
+    """
+    Queue a run of `backup` and wake up an idle worker. Scheduled backups
+    default to their schedule's priority.
+    """
+    if priority is None:
+        priority = backup.schedule.priority if backup.schedule else 0
+    job = BackupJob(
+        backup_id=backup.id,
+        database_id=backup.database_id,
+        action=action.value,
+        backup_kind=backup.backup_kind,
+        priority=priority,
+        status=JobStatus.QUEUED.value
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    logger.info(f"Queued job {job.id}: {action.value} of backup {backup.id}")
+    worker_pool.notify()
+    return job
+
+
+def get_active_job(db: Session, backup_id: int) -> Optional[BackupJob]:
+    """Queued or running job of a backup, if any"""
+    return db.query(BackupJob).filter(
+        BackupJob.backup_id == backup_id,
+        BackupJob.status.in_((JobStatus.QUEUED.value, JobStatus.RUNNING.value))
+    ).first()
+
+
+def _seconds_since(moment: Optional[datetime], now: datetime) -> Optional[int]:
+    if moment is None:
+        return None
+    return max(int((now - moment.replace(tzinfo=None)).total_seconds()), 0)
+
+
+def _source_key(host: Optional[str], port: Optional[int]) -> Optional[str]:
+    return f"{host}:{port}" if host else None
+
+
+def _running_counts(db: Session):
+    """Running jobs per source server and per group"""
+    rows = db.query(Database.host, Database.port, Database.group_id).join(
+        BackupJob, BackupJob.database_id == Database.id
+    ).filter(BackupJob.status == JobStatus.RUNNING.value).all()
+    hosts = Counter(_source_key(host, port) for host, port, _ in rows)
+    groups = Counter(group_id for _, _, group_id in rows)
+    return hosts, groups
+
+
+def _held_by(source: Optional[str], group_id: Optional[int], group_limit: Optional[int],
+             hosts: Counter, groups: Counter) -> Optional[str]:
+    """Why a queued job cannot start yet (a concurrency limit), None if it can"""
+    if source and MAX_PER_HOST and hosts[source] >= MAX_PER_HOST:
+        return f"host {source} runs {hosts[source]}/{MAX_PER_HOST} backups"
+    limit = group_limit or MAX_PER_GROUP
+    if group_id is not None and limit and groups[group_id] >= limit:
+        return f"group {group_id} runs {groups[group_id]}/{limit} backups"
+    return None
+
+
+def _queued_jobs(db: Session):
+    """Queued jobs in arrival order, with what limits and dispatch order need"""
+    return db.query(
+        BackupJob.id, BackupJob.database_id, BackupJob.created_at, BackupJob.priority, Database.host, Database.port,
+        Database.group_id, Group.max_concurrent_backups, Group.weight
+    ).outerjoin(
+        Database, Database.id == BackupJob.database_id
+    ).outerjoin(
+        Group, Group.id == Database.group_id
+    ).filter(
+        BackupJob.status == JobStatus.QUEUED.value
+    ).order_by(BackupJob.id).all()
+
+
+def _dispatch_order(queued, hosts: Counter, groups: Counter):
+    """
+    Queued jobs in the order they would start if slots kept freeing up:
+    priority, then weighted fair share between groups, then arrival. Each
+    pick counts as running for the next ones (limits, group shares); jobs
+    the limits still hold afterwards are left out.
+    """
+    hosts, groups = Counter(hosts), Counter(groups)
+    pending = list(queued)
+    order = []
+    while pending:
+        ready = [
+            job for job in pending
+            if not _held_by(_source_key(job.host, job.port), job.group_id, job.max_concurrent_backups, hosts, groups)
+        ]
+        if not ready:
+            break
+        job = min(ready, key=lambda job: (
+            -(job.priority or 0),
+            groups[job.group_id] / (job.weight or 1),
+            job.id
+        ))
+        order.append(job)
+        pending.remove(job)
+        hosts[_source_key(job.host, job.port)] += 1
+        groups[job.group_id] += 1
+    return order
+
+
+def _destination_paths(db: Session, database_ids) -> dict:
+    """Enabled destination paths per database"""
+    paths = {database_id: [] for database_id in database_ids}
+    if paths:
+        for database_id, path in db.query(DatabaseDestination.database_id, DatabaseDestination.path).filter(
+            DatabaseDestination.database_id.in_(list(paths)),
+            DatabaseDestination.enabled == True
+        ):
+            paths[database_id].append(path)
+    return paths
+
+
+def _lock_claims(db: Session):
+    """Serialize claims of all nodes until the end of the transaction (PostgreSQL)"""
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": CLAIM_LOCK_KEY})
+
+
+def claim_next_job(db: Session, worker: str, destinations: Optional[List[str]] = None) -> Optional[BackupJob]:
+    """
+    Take the next job in dispatch order among those whose destinations
+    are under `destinations` (None: any), leased to `worker`.
+    The job row is locked with FOR UPDATE SKIP LOCKED (ignored by SQLite)
+    and claimed with a conditional update, so two workers never get the
+    same job; the claim lock keeps concurrent claims of other nodes (and
+    the pool's own lock those of this process) from overshooting limits.
+    """
+    try:
+        _lock_claims(db)
+        hosts, groups = _running_counts(db)
+        queued = _queued_jobs(db)
+        if destinations is not None:
+            paths = _destination_paths(db, {job.database_id for job in queued})
+            queued = [job for job in queued if reaches(destinations, paths[job.database_id])]
+
+        for candidate in _dispatch_order(queued, hosts, groups):
+            job_id = candidate.id
+            locked = db.query(BackupJob.id).filter(
+                BackupJob.id == job_id,
+                BackupJob.status == JobStatus.QUEUED.value
+            ).with_for_update(skip_locked=True).first()
+            if not locked:
+                continue
+            now = datetime.utcnow()
+            waited = _seconds_since(candidate.created_at, now)
+            claimed = db.query(BackupJob).filter(
+                BackupJob.id == job_id,
+                BackupJob.status == JobStatus.QUEUED.value
+            ).update({
+                BackupJob.status: JobStatus.RUNNING.value,
+                BackupJob.worker: worker,
+                BackupJob.lease_expires_at: now + timedelta(seconds=JOB_LEASE_SECONDS),
+                BackupJob.started_at: now,
+                BackupJob.wait_seconds: waited,
+                BackupJob.attempts: BackupJob.attempts + 1
+            }, synchronize_session=False)
+            if claimed:
+                db.commit()
+                logger.info(f"Job {job_id} claimed by {worker} after waiting {waited}s")
+                return db.query(BackupJob).filter(BackupJob.id == job_id).first()
+        return None
+    finally:
+        # Ends the transaction (and the claim lock) when nothing was claimed
+        db.rollback()
+
+
+def run_job(job_id: int):
+    """Run a claimed job and record that it finished"""
+    db = SessionLocal()
+    try:
+        job = db.query(BackupJob).filter(BackupJob.id == job_id).first()
+        if not job:
+            return
+        logger.info(f"Job {job.id}: {job.action} of backup {job.backup_id} (attempt {job.attempts})")
+        worker = job.worker
+        error = None
+        try:
+            if job.action == JobAction.RETRY.value:
+                retry_backup_task(job.backup_id)
+            else:
+                execute_backup_task(job.backup_id, job.database_id)
+                _apply_retention(db, job.backup_id)
+        except Exception as e:
+            error = str(e)
+            logger.error(f"Job {job.id} crashed: {error}")
+
+        # Unless the job was taken away meanwhile (requeued after its lease expired)
+        db.query(BackupJob).filter(
+            BackupJob.id == job_id,
+            BackupJob.status == JobStatus.RUNNING.value,
+            BackupJob.worker == worker
+        ).update({
+            BackupJob.status: JobStatus.FAILED.value if error else JobStatus.DONE.value,
+            BackupJob.error: error,
+            BackupJob.lease_expires_at: None,
+            BackupJob.finished_at: datetime.utcnow()
+        }, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _apply_retention(db: Session, backup_id: int):
+    """Retention policy of the schedule a backup belongs to, once the backup is done"""
+    # The scheduler queues jobs through this module: import it late
+    from app.core.scheduler import cleanup_old_backups
+
+    backup = db.query(Backup).filter(Backup.id == backup_id).first()
+    if backup and backup.schedule:
+        cleanup_old_backups(db, backup.schedule)
+
+
+def renew_leases(db: Session, worker: str):
+    db.query(BackupJob).filter(
+        BackupJob.worker == worker,
+        BackupJob.status == JobStatus.RUNNING.value
+    ).update({
+        BackupJob.lease_expires_at: datetime.utcnow() + timedelta(seconds=JOB_LEASE_SECONDS)
+    }, synchronize_session=False)
+    db.commit()
+
+
+def _finished_statuses(job: BackupJob) -> tuple:
+    if job.action == JobAction.RETRY.value:
+        # Retries start from a failed or partial backup, and resume harmlessly
+        return (BackupStatus.COMPLETED,)
+    return (BackupStatus.COMPLETED, BackupStatus.PARTIAL, BackupStatus.FAILED)
+
+
+def _requeue(db: Session, jobs) -> int:
+    """
+    Queue interrupted jobs again (their backups start over), or give them
+    up after JOB_MAX_ATTEMPTS claims. Returns the number requeued.
+    """
+    requeued = 0
+    for job in jobs:
+        backup = job.backup
+        if backup and backup.status in _finished_statuses(job):
+            # The task finished, only the end of the job was not recorded
+            job.status = JobStatus.DONE.value
+            job.lease_expires_at = None
+            job.finished_at = datetime.utcnow()
+            continue
+        if job.attempts >= JOB_MAX_ATTEMPTS or not backup:
+            job.status = JobStatus.FAILED.value
+            job.error = f"Interrupted {job.attempts} time(s), given up"
+            job.lease_expires_at = None
+            job.finished_at = datetime.utcnow()
+            if backup and backup.status == BackupStatus.IN_PROGRESS:
+                backup.status = BackupStatus.FAILED
+                backup.error_message = "Interrupted by a restart"
+                backup.parent_backup_id = None
+                backup.completed_at = datetime.utcnow()
+            continue
+
+        job.status = JobStatus.QUEUED.value
+        job.worker = None
+        job.lease_expires_at = None
+        job.started_at = None
+        if job.action == JobAction.BACKUP.value:
+            # Planned again from the requested kind: the chain may have moved on
+            backup.status = BackupStatus.PENDING
+            backup.backup_kind = job.backup_kind or BackupKind.FULL.value
+            backup.parent_backup_id = None
+            backup.progress = None
+        requeued += 1
+    db.commit()
+    return requeued
+
+
+def requeue_orphaned_jobs(db: Session) -> int:
+    """
+    Requeue running jobs whose worker is gone: their lease expired, or
+    their node is no longer registered as alive.
+    """
+    live = {node.name for node in get_live_nodes(db, JOB_LEASE_SECONDS)}
+    running = db.query(BackupJob).filter(BackupJob.status == JobStatus.RUNNING.value).all()
+    now = datetime.utcnow()
+    orphaned = [
+        job for job in running
+        if job.worker not in live
+        or (job.lease_expires_at and job.lease_expires_at.replace(tzinfo=None) < now)
+    ]
+    requeued = _requeue(db, orphaned)
+    if orphaned:
+        logger.warning(f"Workers of {len(orphaned)} running job(s) are gone, {requeued} requeued")
+    return requeued
+
+
+def requeue_worker_jobs(db: Session, worker: str) -> int:
+    """Hand the running jobs of `worker` back to the queue"""
+    jobs = db.query(BackupJob).filter(
+        BackupJob.status == JobStatus.RUNNING.value,
+        BackupJob.worker == worker
+    ).all()
+    requeued = _requeue(db, jobs)
+    if jobs:
+        logger.warning(f"Found {len(jobs)} interrupted job(s) of {worker}, {requeued} requeued")
+    return requeued
+
+
+def recover_interrupted_work(worker: str):
+    """
+    Run by a worker pool once registered, before it starts. Jobs a
+    previous process of the same name left running are requeued, and so
+    are the jobs of dead nodes; live nodes keep theirs. Backups cut short
+    outside of a job are failed so they can be retried, and staging
+    leftovers are reclaimed when no other worker runs a backup that could
+    own them.
+    """
+    db = SessionLocal()
+    try:
+        requeue_worker_jobs(db, worker)
+        requeue_orphaned_jobs(db)
+        others_running = db.query(BackupJob).filter(BackupJob.status == JobStatus.RUNNING.value).count()
+    finally:
+        db.close()
+
+    fail_interrupted_backups()
+    if others_running:
+        logger.info(f"Staging not reclaimed: {others_running} job(s) running on other workers")
+    else:
+        # Staged dumps of failed backups are kept for a retry; anything else is reclaimed
+        reclaim_staging_space()
+
+
+def prune_finished_jobs(db: Session):
+    cutoff = datetime.utcnow() - timedelta(days=JOB_RETENTION_DAYS)
+    db.query(BackupJob).filter(
+        BackupJob.status.in_((JobStatus.DONE.value, JobStatus.FAILED.value)),
+        BackupJob.finished_at < cutoff
+    ).delete(synchronize_session=False)
+    db.commit()
+
+
+def get_queue_stats(db: Session) -> dict:
+    """
+    Queue depth, running jobs and the age of the oldest queued job. Queued
+    jobs tell how long they have waited so far and which limit holds them.
+    """
+    counts = dict(db.query(BackupJob.status, func.count(BackupJob.id)).group_by(BackupJob.status).all())
+    active = db.query(BackupJob).filter(
+        BackupJob.status.in_((JobStatus.QUEUED.value, JobStatus.RUNNING.value))
+    ).order_by(BackupJob.id).all()
+
+    now = datetime.utcnow()
+    hosts, groups = _running_counts(db)
+    queued = _queued_jobs(db)
+    oldest = min((job.created_at for job in queued if job.created_at), default=None)
+    # Projected dispatch order, then the jobs the limits hold beyond it
+    ready = [job.id for job in _dispatch_order(queued, hosts, groups)]
+    order = ready + [job.id for job in queued if job.id not in ready]
+
+    # Queued jobs no live node can write the backup of
+    nodes = get_live_nodes(db, JOB_LEASE_SECONDS)
+    node_destinations = [json.loads(node.destinations) if node.destinations else None for node in nodes]
+    paths = _destination_paths(db, {job.database_id for job in queued})
+    unreachable = {
+        job.id for job in queued
+        if nodes and not any(reaches(prefixes, paths[job.database_id]) for prefixes in node_destinations)
+    }
+
+    jobs = []
+    for job in active:
+        database = job.database
+        source = _source_key(database.host, database.port) if database else None
+        is_queued = job.status == JobStatus.QUEUED.value
+        jobs.append({
+            "id": job.id,
+            "backup_id": job.backup_id,
+            "database_id": job.database_id,
+            "source": source,
+            "group_id": database.group_id if database else None,
+            "action": job.action,
+            "status": job.status,
+            "position": order.index(job.id) + 1 if job.id in order else None,
+            "priority": job.priority,
+            "held_by": (
+                "no live worker node reaches its destinations" if job.id in unreachable
+                else _held_by(source, database.group_id, database.group.max_concurrent_backups, hosts, groups)
+            ) if is_queued and database else None,
+            "wait_seconds": _seconds_since(job.created_at, now) if is_queued else job.wait_seconds,
+            "attempts": job.attempts,
+            "worker": job.worker,
+            "created_at": job.created_at,
+            "started_at": job.started_at
+        })
+
+    return {
+        "worker_mode": WORKER_MODE,
+        "worker_nodes": len(nodes),
+        "workers": sum(node.capacity for node in nodes),
+        "max_per_host": MAX_PER_HOST or None,
+        "max_per_group": MAX_PER_GROUP or None,
+        "queued": counts.get(JobStatus.QUEUED.value, 0),
+        "running": counts.get(JobStatus.RUNNING.value, 0),
+        "done": counts.get(JobStatus.DONE.value, 0),
+        "failed": counts.get(JobStatus.FAILED.value, 0),
+        "oldest_queued_seconds": _seconds_since(oldest, now),
+        "running_per_host": dict(hosts),
+        "jobs": jobs
+    }
+
+
+def _percentile(values, percent: float) -> Optional[int]:
+    """Nearest-rank percentile"""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(math.ceil(len(values) * percent / 100) - 1, 0)]
+
+
+def get_group_wait_stats(db: Session, hours: int = 24) -> list:
+    """
+    Per group: weight, queued and running jobs, the current wait of the
+    oldest queued job, and the waits of the jobs started in the last
+    `hours` (count, average, p95, max in seconds).
+    """
+    now = datetime.utcnow()
+    since = now - timedelta(hours=hours)
+    hosts, running = _running_counts(db)
+    queued = _queued_jobs(db)
+    started = db.query(Database.group_id, BackupJob.wait_seconds).join(
+        Database, Database.id == BackupJob.database_id
+    ).filter(
+        BackupJob.started_at >= since,
+        BackupJob.wait_seconds.isnot(None)
+    ).all()
+
+    stats = []
+    for group in db.query(Group).order_by(Group.name).all():
+        waits = [wait for group_id, wait in started if group_id == group.id]
+        oldest = min((job.created_at for job in queued if job.group_id == group.id and job.created_at),
+                     default=None)
+        stats.append({
+            "group_id": group.id,
+            "group_name": group.name,
+            "weight": group.weight,
+            "max_concurrent_backups": group.max_concurrent_backups or MAX_PER_GROUP or None,
+            "queued": sum(1 for job in queued if job.group_id == group.id),
+            "running": running[group.id],
+            "oldest_queued_seconds": _seconds_since(oldest, now),
+            "started": len(waits),
+            "avg_wait_seconds": int(sum(waits) / len(waits)) if waits else None,
+            "p95_wait_seconds": _percentile(waits, 95),
+            "max_wait_seconds": max(waits) if waits else None
+        })
+    return stats
+
+
+def get_worker_nodes(db: Session) -> list:
+    """Registered worker nodes with their capacity, running jobs and whether they are alive"""
+    now = datetime.utcnow()
+    live = {node.name for node in get_live_nodes(db, JOB_LEASE_SECONDS)}
+    running = Counter(worker for (worker,) in db.query(BackupJob.worker).filter(
+        BackupJob.status == JobStatus.RUNNING.value
+    ))
+    nodes = []
+    for node in db.query(WorkerNode).order_by(WorkerNode.name).all():
+        nodes.append(dict(describe_node(node, running[node.name], now), alive=node.name in live))
+    return nodes
+
+
+class WorkerPool:
+    """
+    Fixed set of worker threads draining the job queue, plus a heartbeat
+    thread keeping the node registered and the leases of its jobs
+    renewed, and requeueing the jobs of dead nodes.
+    """
+
+    def __init__(self, size: int, name: str = NODE_NAME, destinations: Optional[List[str]] = NODE_DESTINATIONS):
+        self.size = size
+        self.name = name
+        self.destinations = destinations
+        self.running = False
+        self._threads = []
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._claim_lock = threading.Lock()
+
+    def start(self):
+        if self.running:
+            logger.warning("Worker pool already started")
+            return
+        self._register()
+        recover_interrupted_work(self.name)
+        self.running = True
+        self._stopping.clear()
+        self._threads = [
+            threading.Thread(target=self._work, daemon=True, name=f"BackupWorker-{i + 1}")
+            for i in range(self.size)
+        ]
+        self._threads.append(threading.Thread(target=self._heartbeat, daemon=True, name="BackupWorkerHeartbeat"))
+        for thread in self._threads:
+            thread.start()
+        logger.info(f"Worker pool started: {self.size} worker(s) on {self.name}")
+
+    def stop(self, timeout: float = 5):
+        """
+        Stop taking jobs and leave the node list. Backups still running
+        after `timeout` are cut short: their dump processes are killed and,
+        once their workers are done, the jobs go back to the queue right
+        away for the other nodes. Jobs whose workers do not finish either
+        stay leased to this node until the lease expires, so no other node
+        runs them while they may still write.
+        """
+        if not self.running:
+            return
+        self.running = False
+        self._stopping.set()
+        self._wakeup.set()
+        busy = self._join(timeout)
+        if busy:
+            killed = kill_running_commands()
+            logger.warning(f"Worker pool: {busy} backup(s) still running, killed {killed} dump process(es)")
+            busy = self._join(timeout)
+        if busy:
+            logger.warning(f"Worker pool: {busy} backup(s) did not stop, "
+                           f"their jobs are requeued once their lease expires")
+            return
+
+        db = SessionLocal()
+        try:
+            requeue_worker_jobs(db, self.name)
+            unregister_node(db, self.name)
+        finally:
+            db.close()
+        logger.info("Worker pool stopped")
+
+    def _join(self, timeout: float) -> int:
+        """Wait up to `timeout` seconds for the threads; returns how many are still running"""
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(timeout=max(deadline - time.monotonic(), 0))
+        return sum(1 for thread in self._threads if thread.is_alive())
+
+    def _register(self, db: Session = None):
+        session = db or SessionLocal()
+        try:
+            register_node(session, self.name, self.size, self.destinations)
+        finally:
+            if db is None:
+                session.close()
+
+    def notify(self):
+        """A job was queued: wake up the idle workers"""
+        self._wakeup.set()
+
+    def _work(self):
+        while not self._stopping.is_set():
+            # Cleared before looking, so a job queued meanwhile is never missed
+            self._wakeup.clear()
+            db = SessionLocal()
+            try:
+                with self._claim_lock:
+                    job = claim_next_job(db, self.name, self.destinations)
+                job_id = job.id if job else None
+            except Exception as e:
+                logger.error(f"Error claiming a job: {str(e)}")
+                job_id = None
+            finally:
+                db.close()
+
+            if job_id is None:
+                self._wakeup.wait(QUEUE_POLL_SECONDS)
+                continue
+            run_job(job_id)
+            # A host/group slot is free again: jobs it held can start
+            self.notify()
+
+    def _heartbeat(self):
+        interval = max(JOB_LEASE_SECONDS / 3, 1)
+        while not self._stopping.wait(interval):
+            db = SessionLocal()
+            try:
+                if not heartbeat_node(db, self.name):
+                    # Taken for dead (stalled longer than the lease) and forgotten: announce again
+                    self._register(db)
+                renew_leases(db, self.name)
+                if requeue_orphaned_jobs(db):
+                    self.notify()
+                prune_dead_nodes(db, NODE_FORGET_SECONDS)
+                prune_finished_jobs(db)
+            except Exception as e:
+                logger.error(f"Worker heartbeat failed: {str(e)}")
+                db.rollback()
+            finally:
+                db.close()
+
+
+worker_pool = WorkerPool(WORKER_COUNT)
+
+
+def start_workers():
+    worker_pool.start()
+
+
+def stop_workers():
+    worker_pool.stop()
@@ -1,5 +1,5 @@
 """
-Background scheduler for executing scheduled backups.
+Background scheduler queueing scheduled backups (run by the job queue workers).
 Custom implementation using threading and croniter.
 """
 import threading
@@ -15,7 +15,9 @@ from sqlalchemy import and_
 from app.core.database import SessionLocal
 from app.models.schedule import Schedule
 from app.models.backup import Backup, BackupStatus
-from app.utils.backup_task import execute_backup_task
+from app.core.job_queue import enqueue_job
+from app.utils.backup_chain import protect_chains
+from app.utils.dedup_store import remove_backup_file, collect_garbage
 
 logger = logging.getLogger(__name__)
 
@@ -26,8 +28,8 @@ scheduler_running = False
 
 def execute_scheduled_backup(schedule_id: int):
     """
-    Execute a backup for a given schedule.
-    This function is called by APScheduler when a cron job triggers.
+    Queue a backup for a given schedule.
+    The worker pool runs it, then applies the schedule's retention policy.
     """
     db = SessionLocal()
     try:
@@ -47,7 +49,8 @@ def execute_scheduled_backup(schedule_id: int):
             schedule_id=schedule.id,
             status=BackupStatus.PENDING,
             created_by=schedule.created_by,
-            is_compressed=True
+            is_compressed=True,
+            backup_kind=schedule.backup_kind or "full"
         )
 
         db.add(new_backup)
@@ -64,13 +67,9 @@ def execute_scheduled_backup(schedule_id: int):
 
         db.commit()
 
-        # Execute backup (this will run in the background)
-        execute_backup_task(new_backup.id, schedule.database_id)
+        job = enqueue_job(db, new_backup)
 
-        # Cleanup old backups based on retention policy
-        cleanup_old_backups(db, schedule)
-
-        logger.info(f"Scheduled backup created successfully: {backup_name}")
+        logger.info(f"Scheduled backup queued: {backup_name} (job {job.id})")
 
     except Exception as e:
         logger.error(f"Error executing scheduled backup for schedule {schedule_id}: {str(e)}")
@@ -78,6 +77,120 @@ def execute_scheduled_backup(schedule_id: int):
         db.close()
 
 
+def select_expired_backups(db: Session, schedule: Schedule):
+    """
+    Completed backups of THIS schedule past its retention_days or beyond its
+    max_backups, minus those a kept backup still depends on (chains,
+    unchanged backups). Manual backups (schedule_id = NULL) are never selected.
+    Returns: (backups_to_delete, completed_backups_count)
+    """
+    # Get all completed backups for THIS SPECIFIC schedule only
+    # This ensures each schedule manages only its own backups
+    all_backups = db.query(Backup).filter(
+        and_(
+            Backup.schedule_id == schedule.id,  # ← CRITICAL: Only backups from THIS schedule
+            Backup.status == BackupStatus.COMPLETED
+        )
+    ).order_by(Backup.created_at.desc()).all()
+
+    logger.info(f"Found {len(all_backups)} completed backups for schedule {schedule.id}")
+
+    backups_to_delete = []
+
+    # Apply retention_days policy
+    if schedule.retention_days and schedule.retention_days > 0:
+        cutoff_date = datetime.utcnow() - timedelta(days=schedule.retention_days)
+        for backup in all_backups:
+            if backup.created_at and backup.created_at < cutoff_date:
+                backups_to_delete.append(backup)
+                logger.info(f"Backup {backup.id} ({backup.name}) marked for deletion (older than {schedule.retention_days} days)")
+
+    # Apply max_backups policy (keep only the N most recent)
+    if schedule.max_backups and schedule.max_backups > 0:
+        if len(all_backups) > schedule.max_backups:
+            # Skip the first max_backups (most recent), delete the rest
+            excess_backups = all_backups[schedule.max_backups:]
+            for backup in excess_backups:
+                if backup not in backups_to_delete:
+                    backups_to_delete.append(backup)
+                    logger.info(f"Backup {backup.id} ({backup.name}) marked for deletion (exceeds max_backups limit of {schedule.max_backups})")
+
+    # Never break an incremental chain (or an unchanged backup's reference) a kept backup still needs
+    return protect_chains(db, backups_to_delete), len(all_backups)
+
+
+def delete_backups(db: Session, backups_to_delete):
+    """
+    Delete backups with their files on every destination. Dedup manifests
+    go through remove_backup_file, and the chunk stores they used are
+    garbage collected once all records are gone.
+    Returns: (deleted_files, errors)
+    """
+    deleted_files = []
+    errors = []
+
+    # Chunk stores of dedup destinations touched by the deletions
+    chunk_stores = set()
+
+    for backup in backups_to_delete:
+        try:
+            # Delete files from multi-destination results (NEW SYSTEM)
+            if backup.destination_results:
+                try:
+                    results = json.loads(backup.destination_results)
+                    for dest_name, dest_data in results.items():
+                        if dest_data.get('success') and dest_data.get('file_path'):
+                            file_path = dest_data['file_path']
+                            if os.path.exists(file_path):
+                                try:
+                                    store_root = remove_backup_file(file_path)
+                                    if store_root:
+                                        chunk_stores.add(store_root)
+                                    deleted_files.append(file_path)
+                                    logger.info(f"Deleted backup file: {file_path} (destination: {dest_name})")
+                                except Exception as e:
+                                    errors.append(f"Error deleting {file_path}: {str(e)}")
+                                    logger.error(f"Error deleting file {file_path}: {str(e)}")
+                            else:
+                                # File not found - likely external destination not mounted in container
+                                # This is normal and not an error
+                                logger.debug(f"Backup file not accessible (external destination): {file_path}")
+                except json.JSONDecodeError as e:
+                    errors.append(f"Error parsing destination_results for backup {backup.id}: {str(e)}")
+                    logger.error(f"Error parsing destination_results for backup {backup.id}: {str(e)}")
+
+            # Delete legacy single file path (OLD SYSTEM - for backward compatibility)
+            if backup.file_path and os.path.exists(backup.file_path):
+                try:
+                    os.remove(backup.file_path)
+                    deleted_files.append(backup.file_path)
+                    logger.info(f"Deleted legacy backup file: {backup.file_path}")
+                except Exception as e:
+                    errors.append(f"Error deleting {backup.file_path}: {str(e)}")
+                    logger.error(f"Error deleting legacy file {backup.file_path}: {str(e)}")
+
+            # Delete backup record from database
+            db.delete(backup)
+            logger.info(f"Deleted backup record: {backup.id}")
+
+        except Exception as e:
+            errors.append(f"Error processing backup {backup.id}: {str(e)}")
+            logger.error(f"Error deleting backup {backup.id}: {str(e)}")
+
+    if backups_to_delete:
+        db.commit()
+
+        # Reference-counted GC: drop chunks no remaining manifest uses
+        for store_root in chunk_stores:
+            try:
+                collect_garbage(store_root)
+            except Exception as e:
+                errors.append(f"Chunk garbage collection failed for {store_root}: {str(e)}")
+                logger.error(f"Chunk garbage collection failed for {store_root}: {str(e)}")
+
+    return deleted_files, errors
+
+
 def cleanup_old_backups(db: Session, schedule: Schedule):
     """
     Cleanup old backups based on retention_days and max_backups settings.
@@ -92,82 +205,10 @@ def cleanup_old_backups(db: Session, schedule: Schedule):
     """
     try:
         logger.info(f"Starting cleanup for schedule {schedule.id} (retention_days={schedule.retention_days}, max_backups={schedule.max_backups})")
-        
-        # Get all completed backups for THIS SPECIFIC schedule only
-        # This ensures each schedule manages only its own backups
-        all_backups = db.query(Backup).filter(
-            and_(
-                Backup.schedule_id == schedule.id,  # ← CRITICAL: Only backups from THIS schedule
-                Backup.status == BackupStatus.COMPLETED
-            )
-        ).order_by(Backup.created_at.desc()).all()
-        
-        logger.info(f"Found {len(all_backups)} completed backups for schedule {schedule.id}")
-
-        backups_to_delete = []
-
-        # Apply retention_days policy
-        if schedule.retention_days and schedule.retention_days > 0:
-            cutoff_date = datetime.utcnow() - timedelta(days=schedule.retention_days)
-            for backup in all_backups:
-                if backup.created_at and backup.created_at < cutoff_date:
-                    backups_to_delete.append(backup)
-                    logger.info(f"Backup {backup.id} ({backup.name}) marked for deletion (older than {schedule.retention_days} days)")
-
-        # Apply max_backups policy (keep only the N most recent)
-        if schedule.max_backups and schedule.max_backups > 0:
-            if len(all_backups) > schedule.max_backups:
-                # Skip the first max_backups (most recent), delete the rest
-                excess_backups = all_backups[schedule.max_backups:]
-                for backup in excess_backups:
-                    if backup not in backups_to_delete:
-                        backups_to_delete.append(backup)
-                        logger.info(f"Backup {backup.id} ({backup.name}) marked for deletion (exceeds max_backups limit of {schedule.max_backups})")
-
-        # Delete marked backups
-        for backup in backups_to_delete:
-            try:
-                deleted_files = 0
-                
-                # Delete files from multi-destination results (NEW SYSTEM)
-                if backup.destination_results:
-                    try:
-                        results = json.loads(backup.destination_results)
-                        for dest_name, dest_data in results.items():
-                            if dest_data.get('success') and dest_data.get('file_path'):
-                                file_path = dest_data['file_path']
-                                if os.path.exists(file_path):
-                                    try:
-                                        os.remove(file_path)
-                                        deleted_files += 1
-                                        logger.info(f"Deleted backup file: {file_path} (destination: {dest_name})")
-                                    except Exception as e:
-                                        logger.error(f"Error deleting file {file_path}: {str(e)}")
-                                else:
-                                    # File not found - likely external destination not mounted in container
-                                    # This is normal and not an error
-                                    logger.debug(f"Backup file not accessible (external destination): {file_path}")
-                    except json.JSONDecodeError as e:
-                        logger.error(f"Error parsing destination_results for backup {backup.id}: {str(e)}")
-                
-                # Delete legacy single file path (OLD SYSTEM - for backward compatibility)
-                if backup.file_path and os.path.exists(backup.file_path):
-                    try:
-                        os.remove(backup.file_path)
-                        deleted_files += 1
-                        logger.info(f"Deleted legacy backup file: {backup.file_path}")
-                    except Exception as e:
-                        logger.error(f"Error deleting legacy file {backup.file_path}: {str(e)}")
-                
-                # Delete backup record from database
-                db.delete(backup)
-                logger.info(f"Deleted backup record: {backup.id} (removed {deleted_files} file(s))")
-                
-            except Exception as e:
-                logger.error(f"Error deleting backup {backup.id}: {str(e)}")
 
+        backups_to_delete, _ = select_expired_backups(db, schedule)
         if backups_to_delete:
-            db.commit()
+            delete_backups(db, backups_to_delete)
             logger.info(f"Cleanup completed: {len(backups_to_delete)} backups removed for schedule {schedule.id}")
         else:
             logger.info(f"No backups to cleanup for schedule {schedule.id}")
@@ -199,12 +240,8 @@ def scheduler_loop():
                         # Check if schedule should run
                         if should_schedule_run(schedule, now):
                             logger.info(f"Triggering scheduled backup: {schedule.name}")
-                            # Execute in separate thread to not block scheduler
-                            threading.Thread(
-                                target=execute_scheduled_backup,
-                                args=(schedule.id,),
-                                daemon=True
-                            ).start()
+                            # Only queued here: the worker pool bounds how many run at once
+                            execute_scheduled_backup(schedule.id)
 
                             # Update next_run_at
                             update_schedule_next_run(db, schedule)
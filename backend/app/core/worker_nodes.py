@@ -0,0 +1,111 @@
+"""
+Worker nodes sharing one job queue.
+Every process running backup workers (the API in embedded mode, each
+`python -m app.worker`) registers in the worker_nodes table with its
+capacity and the destinations it can reach, and heartbeats while it is
+up. Several hosts can so share the nightly load through one app database
+(PostgreSQL); a node whose heartbeat stops is dead and its jobs go back
+to the queue.
+"""
+import os
+import json
+import socket
+import logging
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.models.worker_node import WorkerNode
+
+logger = logging.getLogger(__name__)
+
+# Name of this worker process in the job leases. A stable name (one per worker process)
+# lets a restarted worker requeue its interrupted jobs at once instead of after their lease
+NODE_NAME = os.getenv("BACKUP_WORKER_NAME") or f"{socket.gethostname()}:{os.getpid()}"
+
+# Destination paths this node can write to (comma separated prefixes, empty: all of them),
+# e.g. the NAS mounted on this host only
+NODE_DESTINATIONS = [
+    os.path.abspath(path.strip()) for path in os.getenv("BACKUP_WORKER_DESTINATIONS", "").split(",")
+    if path.strip()
+] or None
+
+
+def _load_destinations(node: WorkerNode) -> Optional[List[str]]:
+    return json.loads(node.destinations) if node.destinations else None
+
+
+def reaches(prefixes: Optional[List[str]], paths: List[str]) -> bool:
+    """Whether a node limited to `prefixes` (None: no limit) can write to every path"""
+    if prefixes is None:
+        return True
+    for path in paths:
+        path = os.path.abspath(path)
+        if not any(path == prefix or path.startswith(prefix.rstrip(os.sep) + os.sep) for prefix in prefixes):
+            return False
+    return True
+
+
+def register_node(db: Session, name: str, capacity: int, destinations: Optional[List[str]]):
+    """Announce a node (again, after a restart under the same name)"""
+    node = db.query(WorkerNode).filter(WorkerNode.name == name).first()
+    if not node:
+        node = WorkerNode(name=name)
+        db.add(node)
+    node.hostname = socket.gethostname()
+    node.pid = os.getpid()
+    node.capacity = capacity
+    node.destinations = json.dumps(destinations) if destinations else None
+    node.started_at = datetime.utcnow()
+    node.heartbeat_at = datetime.utcnow()
+    db.commit()
+    logger.info(f"Worker node {name} registered: {capacity} worker(s), "
+                f"destinations: {', '.join(destinations) if destinations else 'all'}")
+
+
+def heartbeat_node(db: Session, name: str):
+    updated = db.query(WorkerNode).filter(WorkerNode.name == name).update(
+        {WorkerNode.heartbeat_at: datetime.utcnow()}, synchronize_session=False
+    )
+    db.commit()
+    return updated
+
+
+def unregister_node(db: Session, name: str):
+    db.query(WorkerNode).filter(WorkerNode.name == name).delete(synchronize_session=False)
+    db.commit()
+
+
+def get_live_nodes(db: Session, timeout: int) -> List[WorkerNode]:
+    """Nodes that heartbeat within the last `timeout` seconds"""
+    cutoff = datetime.utcnow() - timedelta(seconds=timeout)
+    return db.query(WorkerNode).filter(WorkerNode.heartbeat_at >= cutoff).order_by(WorkerNode.name).all()
+
+
+def prune_dead_nodes(db: Session, timeout: int) -> List[str]:
+    """Forget nodes silent for longer than `timeout` seconds; returns their names"""
+    cutoff = datetime.utcnow() - timedelta(seconds=timeout)
+    dead = db.query(WorkerNode).filter(WorkerNode.heartbeat_at < cutoff).all()
+    names = [node.name for node in dead]
+    for node in dead:
+        db.delete(node)
+    db.commit()
+    if names:
+        logger.warning(f"Worker node(s) stopped heartbeating: {', '.join(names)}")
+    return names
+
+
+def describe_node(node: WorkerNode, running: int, now: datetime) -> dict:
+    heartbeat = node.heartbeat_at.replace(tzinfo=None) if node.heartbeat_at else None
+    return {
+        "name": node.name,
+        "hostname": node.hostname,
+        "pid": node.pid,
+        "capacity": node.capacity,
+        "running": running,
+        "destinations": _load_destinations(node),
+        "started_at": node.started_at,
+        "heartbeat_at": node.heartbeat_at,
+        "heartbeat_seconds_ago": int((now - heartbeat).total_seconds()) if heartbeat else None
+    }
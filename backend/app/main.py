@@ -6,6 +6,7 @@ import os
 from app.core.database import init_db, SessionLocal
 from app.core.init_admin import create_default_admin
 from app.core.scheduler import start_scheduler, stop_scheduler
+from app.core.job_queue import WORKER_MODE, WORKER_MODE_EMBEDDED, start_workers, stop_workers
 from app.api.routes import auth, groups, databases, schedules, destinations, backups, dashboard
 
 
@@ -24,7 +25,15 @@ async def lifespan(app: FastAPI):
     finally:
         db.close()
 
-    # Start background scheduler
+    # Start the workers draining the job queue (they first recover what the
+    # previous shutdown cut short), unless separate worker processes do
+    if WORKER_MODE == WORKER_MODE_EMBEDDED:
+        start_workers()
+        print("✅ Backup workers started")
+    else:
+        print("ℹ️  Backup jobs are run by external workers (python -m app.worker)")
+
+    # The scheduler only queues jobs
     start_scheduler()
 
     yield
@@ -33,6 +42,9 @@ async def lifespan(app: FastAPI):
     print("👋 Shutting down BackupManager API...")
     stop_scheduler()
     print("✅ Background scheduler stopped")
+    if WORKER_MODE == WORKER_MODE_EMBEDDED:
+        stop_workers()
+        print("✅ Backup workers stopped")
 
 
 app = FastAPI(
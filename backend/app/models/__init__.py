@@ -2,10 +2,13 @@ from .user import User, Base
 from .group import Group
 from .database import Database, DatabaseType
 from .schedule import Schedule, ScheduleType
-from .backup import Backup, BackupStatus, StorageType
+from .backup import Backup, BackupKind, BackupStatus, StorageType
 from .database_destination import DatabaseDestination
+from .backup_job import BackupJob, JobAction, JobStatus
+from .worker_node import WorkerNode
 
 __all__ = [
-    "User", "Group", "Database", "Schedule", "Backup", "DatabaseDestination", "Base",
-    "DatabaseType", "ScheduleType", "BackupStatus", "StorageType"
+    "User", "Group", "Database", "Schedule", "Backup", "DatabaseDestination", "BackupJob", "WorkerNode", "Base",
+    "DatabaseType", "ScheduleType", "BackupKind", "BackupStatus", "StorageType",
+    "JobAction", "JobStatus"
 ]
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, BigInteger, ForeignKey, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, BigInteger, Float, ForeignKey, Enum as SQLEnum
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import enum
@@ -13,6 +13,16 @@ class BackupStatus(str, enum.Enum):
     PARTIAL = "partial"  # Saved to some destinations but not all
 
 
+class BackupKind(str, enum.Enum):
+    FULL = "full"  # Self-contained dump
+    INCREMENTAL = "incremental"  # Requested kind, resolved to a chain kind when the backup runs
+    BASE = "base"  # PostgreSQL pg_basebackup, root of a WAL chain
+    WAL = "wal"  # PostgreSQL WAL segments since the previous link
+    BINLOG = "binlog"  # MySQL binlog files since the previous link (root: a full dump)
+    OPLOG = "oplog"  # MongoDB oplog entries since the previous link (root: a full dump)
+    UNCHANGED = "unchanged"  # Nothing changed since the parent backup: no artifact of its own
+
+
 class StorageType(str, enum.Enum):
     LOCAL = "local"
     S3 = "s3"
@@ -31,24 +41,35 @@ class Backup(Base):
     database_id = Column(Integer, ForeignKey("databases.id"), nullable=False)
     schedule_id = Column(Integer, ForeignKey("schedules.id"), nullable=True)  # NULL if manual
 
+    # Incremental chains: each increment points at the previous link
+    backup_kind = Column(String, nullable=False, default=BackupKind.FULL.value, server_default=BackupKind.FULL.value)
+    parent_backup_id = Column(Integer, ForeignKey("backups.id"), nullable=True, index=True)
+    backup_metadata = Column(Text, nullable=True)  # JSON: kind specific data (LSNs, WAL segments...)
+    fingerprint = Column(String, nullable=True)  # Write activity probed before the dump (skip-if-unchanged)
+
     # Storage information (DEPRECATED - kept for backward compatibility)
     storage_type = Column(SQLEnum(StorageType), nullable=True, default=StorageType.LOCAL)
-    file_path = Column(Text, nullable=True)  # Local path or S3 key
+    file_path = Column(Text, nullable=True)  # Staged dump kept for a retry (staged mode), else unused
     file_size = Column(BigInteger, nullable=True)  # Size in bytes
-    checksum = Column(String, nullable=True)  # MD5 or SHA256
+    checksum = Column(String, nullable=True)  # "<algorithm>:<hex>" (sha256 or blake2b)
 
     # Multi-destination results (JSON string)
-    # Format: {"path": {"success": true, "file_path": "...", "size_mb": 150, "error": null}}
+    # Format: {"path": {"success": true, "file_path": "...", "size_mb": 150, "error": null,
+    #                   "duration_seconds": 12.5, "throughput_mb_s": 12.0}}
     destination_results = Column(Text, nullable=True)
 
     # Backup status
     status = Column(SQLEnum(BackupStatus), nullable=False, default=BackupStatus.PENDING)
     error_message = Column(Text, nullable=True)
+    # Live progress while running (JSON), e.g. {"unit": "pages", "done": 120, "total": 4000}
+    progress = Column(Text, nullable=True)
 
     # Timing
     started_at = Column(DateTime(timezone=True), nullable=True)
     completed_at = Column(DateTime(timezone=True), nullable=True)
     duration_seconds = Column(Integer, nullable=True)
+    # Predicted before the run (JSON): dump/artifact size, compression ratio, duration, timeout
+    estimate = Column(Text, nullable=True)
 
     # Metadata
     created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -57,11 +78,13 @@ class Backup(Base):
     # Compression and encryption
     is_compressed = Column(Boolean, default=True)
     is_encrypted = Column(Boolean, default=False)
-    compression_type = Column(String, nullable=True)  # gzip, bzip2, xz
+    compression_type = Column(String, nullable=True)  # gzip, pgzip, bzip2, xz, zstd
+    compression_ratio = Column(Float, nullable=True)  # Uncompressed size / stored size
 
     # Relationships
     database = relationship("Database", back_populates="backups")
     schedule = relationship("Schedule")
+    parent = relationship("Backup", remote_side=[id])
     creator = relationship("User", foreign_keys=[created_by])
 
     def __repr__(self):
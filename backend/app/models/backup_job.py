@@ -0,0 +1,52 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+import enum
+from app.models.user import Base
+
+
+class JobStatus(str, enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"  # Claimed by a worker, held by a lease
+    DONE = "done"  # The task ran, its outcome is the backup's status
+    FAILED = "failed"  # Interrupted too many times, or the task itself crashed
+
+
+class JobAction(str, enum.Enum):
+    BACKUP = "backup"  # Dump and copy (execute_backup_task)
+    RETRY = "retry"  # Copy a staged dump again (retry_backup_task)
+
+
+class BackupJob(Base):
+    """
+    Unit of work of the backup queue. Scheduled and manual backups are
+    queued here and run by the worker pool (see core/job_queue).
+    """
+    __tablename__ = "backup_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    backup_id = Column(Integer, ForeignKey("backups.id", ondelete="CASCADE"), nullable=False, index=True)
+    database_id = Column(Integer, ForeignKey("databases.id", ondelete="CASCADE"), nullable=False)
+    action = Column(String, nullable=False, default=JobAction.BACKUP.value)
+    # Kind requested when queued: a requeued backup is planned again from it
+    backup_kind = Column(String, nullable=True)
+
+    status = Column(String, nullable=False, default=JobStatus.QUEUED.value, index=True)
+    priority = Column(Integer, nullable=False, default=0)  # Higher runs first (Schedule.priority for scheduled backups)
+    attempts = Column(Integer, nullable=False, default=0)  # Claims so far (> 1: requeued after an interruption)
+    wait_seconds = Column(Integer, nullable=True)  # Time queued before the last claim (limits, busy workers)
+    error = Column(Text, nullable=True)
+
+    # Lease: the worker running the job renews it; an expired lease means the worker is gone
+    worker = Column(String, nullable=True)  # "<hostname>:<pid>"
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    backup = relationship("Backup")
+    database = relationship("Database")
+
+    def __repr__(self):
+        return f"<BackupJob {self.id} {self.action} backup={self.backup_id} ({self.status})>"
@@ -10,6 +10,7 @@ class DatabaseType(str, enum.Enum):
     MYSQL = "mysql"
     MONGODB = "mongodb"
     REDIS = "redis"
+    SQLITE = "sqlite"  # host holds the file path ("@app" = BackupManager's own database)
 
 
 class Database(Base):
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Text, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, Boolean, ForeignKey
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.models.user import Base
@@ -20,6 +20,15 @@ class DatabaseDestination(Base):
     # Enable/disable this destination
     enabled = Column(Boolean, default=True)
 
+    # Storage mode: "file" (one file per backup) or "dedup" (content-defined
+    # chunks under {path}/.chunks plus one manifest per backup)
+    storage_mode = Column(String, nullable=False, default="file", server_default="file")
+
+    # Bandwidth limit for writes to this destination (bytes/s, None = unlimited)
+    # and how many bytes may go out at once after an idle period
+    rate_limit_bps = Column(BigInteger, nullable=True)
+    burst_bytes = Column(BigInteger, nullable=True)
+
     # Metadata
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
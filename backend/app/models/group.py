@@ -10,6 +10,10 @@ class Group(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, index=True, nullable=False)
     description = Column(Text, nullable=True)
+    # Backups of the group's databases running at once (None: BACKUP_MAX_PER_GROUP)
+    max_concurrent_backups = Column(Integer, nullable=True)
+    # Share of the backup workers against other groups when jobs queue up (fair share)
+    weight = Column(Integer, nullable=False, default=1, server_default="1")
     created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
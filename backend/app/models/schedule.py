@@ -27,6 +27,12 @@ class Schedule(Base):
     retention_days = Column(Integer, default=30)  # Keep backups for N days
     max_backups = Column(Integer, nullable=True)  # Max number of backups to keep
 
+    # "full" or "incremental" (chained backups, see BackupKind)
+    backup_kind = Column(String, nullable=False, default="full", server_default="full")
+
+    # Queued backups with a higher priority run first (0-100)
+    priority = Column(Integer, nullable=False, default=0, server_default="0")
+
     # Database relationship
     database_id = Column(Integer, ForeignKey("databases.id"), nullable=False)
 
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime
+from sqlalchemy.sql import func
+from app.models.user import Base
+
+
+class WorkerNode(Base):
+    """
+    A process running backup workers, registered while it is up. Nodes
+    heartbeat regularly; one that stops doing so is dead and its jobs are
+    requeued for the others.
+    """
+    __tablename__ = "worker_nodes"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, unique=True, nullable=False, index=True)  # BackupJob.worker of its jobs
+    hostname = Column(String, nullable=False)
+    pid = Column(Integer, nullable=True)
+
+    # Backups it runs at once, and the destination paths it can write to
+    # (JSON list of path prefixes, null: every destination)
+    capacity = Column(Integer, nullable=False, default=1)
+    destinations = Column(Text, nullable=True)
+
+    started_at = Column(DateTime(timezone=True), server_default=func.now())
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+
+    def __repr__(self):
+        return f"<WorkerNode {self.name} ({self.capacity} workers)>"
@@ -10,6 +10,7 @@ class BackupBase(BaseModel):
     is_compressed: bool = True
     is_encrypted: bool = False
     compression_type: Optional[str] = "gzip"
+    compression_ratio: Optional[float] = None
 
 
 class BackupCreate(BaseModel):
@@ -25,15 +26,21 @@ class BackupResponse(BackupBase):
     database_id: int
     schedule_id: Optional[int] = None
     schedule_name: Optional[str] = None  # Nome dello scheduler (None se manuale)
+    backup_kind: str = "full"
+    parent_backup_id: Optional[int] = None
+    backup_metadata: Optional[str] = None  # JSON string with kind specific data
+    fingerprint: Optional[str] = None
     file_path: Optional[str] = None
     file_size: Optional[int] = None
     checksum: Optional[str] = None
     destination_results: Optional[str] = None  # JSON string with multi-destination results
     status: BackupStatus
     error_message: Optional[str] = None
+    progress: Optional[str] = None  # JSON string with live progress
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
     duration_seconds: Optional[int] = None
+    estimate: Optional[str] = None  # JSON string with the prediction made before the run
     created_by: int
     created_at: datetime
 
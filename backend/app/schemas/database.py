@@ -95,12 +95,16 @@ class BackupDetailItem(BaseModel):
     schedule_name: Optional[str] = None  # Nome dello scheduler (None se manuale)
     status: str
     error_message: Optional[str] = None
+    progress: Optional[str] = None  # JSON string with live progress
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
     duration_seconds: Optional[int] = None
     created_at: datetime
     is_compressed: bool
     compression_type: Optional[str] = None
+    compression_ratio: Optional[float] = None
+    backup_kind: str = "full"
+    parent_backup_id: Optional[int] = None
 
     # Multi-destination support
     destinations: List[BackupDestinationDetail] = []
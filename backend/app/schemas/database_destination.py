@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional
 from datetime import datetime
 
@@ -7,6 +7,9 @@ class DatabaseDestinationBase(BaseModel):
     """Base schema for database destination configuration"""
     path: str  # Full path (e.g., /home/user/backups, /mnt/nas, /media/usb-backup)
     enabled: bool = True
+    storage_mode: str = Field(default="file", pattern="^(file|dedup)$")  # file or dedup (chunk store)
+    rate_limit_bps: Optional[int] = Field(default=None, gt=0)  # Write bandwidth limit (bytes/s)
+    burst_bytes: Optional[int] = Field(default=None, gt=0)  # Default: one second at the limit
 
 
 class DatabaseDestinationCreate(DatabaseDestinationBase):
@@ -18,6 +21,9 @@ class DatabaseDestinationUpdate(BaseModel):
     """Schema for updating a destination"""
     path: Optional[str] = None
     enabled: Optional[bool] = None
+    storage_mode: Optional[str] = Field(default=None, pattern="^(file|dedup)$")
+    rate_limit_bps: Optional[int] = Field(default=None, gt=0)
+    burst_bytes: Optional[int] = Field(default=None, gt=0)
 
 
 class DatabaseDestinationResponse(DatabaseDestinationBase):
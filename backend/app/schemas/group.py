@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional
 from datetime import datetime
 
@@ -6,6 +6,8 @@ from datetime import datetime
 class GroupBase(BaseModel):
     name: str
     description: Optional[str] = None
+    max_concurrent_backups: Optional[int] = Field(default=None, ge=1)
+    weight: int = Field(default=1, ge=1, le=1000)  # Fair share of the backup workers
 
 
 class GroupCreate(GroupBase):
@@ -15,6 +17,8 @@ class GroupCreate(GroupBase):
 class GroupUpdate(BaseModel):
     name: Optional[str] = None
     description: Optional[str] = None
+    max_concurrent_backups: Optional[int] = Field(default=None, ge=1)
+    weight: Optional[int] = Field(default=None, ge=1, le=1000)
 
 
 class GroupResponse(GroupBase):
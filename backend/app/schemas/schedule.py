@@ -12,6 +12,8 @@ class ScheduleBase(BaseModel):
     interval_value: Optional[str] = None
     retention_days: int = Field(default=30, ge=1, le=365)
     max_backups: Optional[int] = Field(default=None, ge=1)
+    backup_kind: str = Field(default="full", pattern="^(full|incremental)$")
+    priority: int = Field(default=0, ge=0, le=100)  # Higher runs first when backups queue up
 
     @field_validator('cron_expression')
     @classmethod
@@ -41,6 +43,8 @@ class ScheduleUpdate(BaseModel):
     interval_value: Optional[str] = None
     retention_days: Optional[int] = Field(default=None, ge=1, le=365)
     max_backups: Optional[int] = Field(default=None, ge=1)
+    backup_kind: Optional[str] = Field(default=None, pattern="^(full|incremental)$")
+    priority: Optional[int] = Field(default=None, ge=0, le=100)
     is_active: Optional[bool] = None
 
 
@@ -0,0 +1,183 @@
+"""
+Incremental backup chains.
+An incremental schedule produces a chain of linked Backup rows: a root
+(e.g. a pg_basebackup) followed by increments, each pointing at the
+previous link through parent_backup_id. Restoring a link needs every
+backup before it, so retention and deletion must never break a chain.
+"Unchanged" backups point at the backup holding their data the same way
+and keep it from expiring like any other dependent.
+"""
+import json
+import os
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models.backup import Backup, BackupKind, BackupStatus
+
+logger = logging.getLogger(__name__)
+
+# Database type -> (chain root kind, increment kind)
+CHAIN_KINDS = {
+    "postgresql": (BackupKind.BASE.value, BackupKind.WAL.value),
+    "mysql": (BackupKind.FULL.value, BackupKind.BINLOG.value),
+    "mongodb": (BackupKind.FULL.value, BackupKind.OPLOG.value),
+}
+
+# A link saved to at least one destination can be built upon
+CHAIN_STATUSES = (BackupStatus.COMPLETED, BackupStatus.PARTIAL)
+
+# A new chain root is taken once the current one is older than this, so
+# restores replay a bounded number of increments and old chains expire
+DEFAULT_CHAIN_MAX_AGE_HOURS = int(os.getenv("BACKUP_CHAIN_MAX_AGE_HOURS", "24"))
+
+
+def load_metadata(backup: Backup) -> dict:
+    """Kind specific metadata of a backup (LSNs, positions...), {} when unset"""
+    if not backup or not backup.backup_metadata:
+        return {}
+    try:
+        return json.loads(backup.backup_metadata)
+    except ValueError:
+        logger.error(f"Invalid backup_metadata for backup {backup.id}")
+        return {}
+
+
+def get_chain_max_age(options: dict) -> timedelta:
+    """Chain length from connection_options `chain_max_age_hours`"""
+    try:
+        hours = int(options.get("chain_max_age_hours", DEFAULT_CHAIN_MAX_AGE_HOURS))
+    except (TypeError, ValueError):
+        hours = DEFAULT_CHAIN_MAX_AGE_HOURS
+    return timedelta(hours=max(hours, 1))
+
+
+def supports_incremental(db_type: str) -> bool:
+    return db_type in CHAIN_KINDS
+
+
+def plan_incremental_backup(db: Session, backup: Backup, db_type: str, options: dict) -> Tuple[str, Optional[Backup]]:
+    """
+    Turn an "incremental" request into a concrete kind.
+    Extends the current chain of the database when it is recent enough,
+    otherwise starts a new one.
+    Returns: (kind, parent backup or None for a chain root)
+    """
+    root_kind, increment_kind = CHAIN_KINDS[db_type]
+
+    # Roots carry the position increments start from: full dumps taken
+    # outside of a chain have no metadata and cannot be built upon
+    root = db.query(Backup).filter(
+        Backup.database_id == backup.database_id,
+        Backup.backup_kind == root_kind,
+        Backup.status.in_(CHAIN_STATUSES),
+        Backup.backup_metadata.isnot(None),
+        Backup.id != backup.id
+    ).order_by(Backup.created_at.desc(), Backup.id.desc()).first()
+
+    if not root or _naive(root.created_at) < datetime.utcnow() - get_chain_max_age(options):
+        return root_kind, None
+
+    # Chains of one database are sequential: the newest saved link after
+    # the newest root belongs to that root's chain
+    head = db.query(Backup).filter(
+        Backup.database_id == backup.database_id,
+        Backup.backup_kind == increment_kind,
+        Backup.status.in_(CHAIN_STATUSES),
+        Backup.id > root.id,
+        Backup.id != backup.id
+    ).order_by(Backup.id.desc()).first() or root
+
+    # An increment that found the chain unrecoverable (slot dropped, logs
+    # purged...) since the head asks for a new root
+    last_failure = db.query(Backup).filter(
+        Backup.database_id == backup.database_id,
+        Backup.backup_kind == increment_kind,
+        Backup.status == BackupStatus.FAILED,
+        Backup.id > head.id,
+        Backup.id != backup.id
+    ).order_by(Backup.id.desc()).first()
+    if last_failure and load_metadata(last_failure).get("restart_chain"):
+        return root_kind, None
+
+    return increment_kind, head
+
+
+def get_backup_chain(backup: Backup) -> List[Backup]:
+    """Every backup needed to restore this one, chain root first"""
+    chain = []
+    seen = set()
+    current = backup
+    while current is not None and current.id not in seen:
+        seen.add(current.id)
+        chain.append(current)
+        current = current.parent
+    chain.reverse()
+    return chain
+
+
+def get_point_in_time_chain(db: Session, database_id: int, target_time: datetime) -> Tuple[List[Backup], bool]:
+    """
+    The shortest chain that can restore a database to target_time: the
+    newest chain root taken before it, then the increments up to the first
+    one finished after it (only what is needed is replayed).
+    Returns: (chain, covered) where covered is False when target_time lies
+    after the newest increment.
+    """
+    root_kinds = [root_kind for root_kind, _ in CHAIN_KINDS.values()]
+    roots = db.query(Backup).filter(
+        Backup.database_id == database_id,
+        Backup.backup_kind.in_(root_kinds),
+        Backup.status.in_(CHAIN_STATUSES),
+        Backup.backup_metadata.isnot(None)
+    ).order_by(Backup.id.desc()).all()
+    root = next((candidate for candidate in roots if _naive(candidate.completed_at) <= target_time), None)
+    if not root:
+        return [], False
+
+    chain = [root]
+    while True:
+        child = db.query(Backup).filter(
+            Backup.parent_backup_id == chain[-1].id,
+            Backup.backup_kind != BackupKind.UNCHANGED.value,
+            Backup.status.in_(CHAIN_STATUSES)
+        ).order_by(Backup.id).first()
+        if child is None:
+            return chain, False
+        chain.append(child)
+        if _naive(child.completed_at) >= target_time:
+            return chain, True
+
+
+def protect_chains(db: Session, backups_to_delete: List[Backup]) -> List[Backup]:
+    """
+    Drop from a deletion list every backup a kept backup still depends on.
+    Protection propagates up the chain: a kept parent keeps its own parent.
+    """
+    delete_ids: Set[int] = {backup.id for backup in backups_to_delete}
+    changed = True
+    while changed and delete_ids:
+        changed = False
+        dependents = db.query(Backup).filter(Backup.parent_backup_id.in_(delete_ids)).all()
+        for child in dependents:
+            if child.id not in delete_ids and child.parent_backup_id in delete_ids:
+                delete_ids.discard(child.parent_backup_id)
+                logger.info(f"Backup {child.parent_backup_id} kept: backup {child.id} depends on it")
+                changed = True
+
+    # Children first, so no row is deleted while a row still points at it
+    deletable = [backup for backup in backups_to_delete if backup.id in delete_ids]
+    return sorted(deletable, key=lambda backup: backup.id, reverse=True)
+
+
+def has_dependents(db: Session, backup: Backup) -> bool:
+    return db.query(Backup).filter(Backup.parent_backup_id == backup.id).first() is not None
+
+
+def _naive(value: datetime) -> datetime:
+    """created_at may come back timezone aware depending on the backend"""
+    if value is None:
+        return datetime.min
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
@@ -0,0 +1,302 @@
+"""
+Chunked authenticated encryption of backup artifacts (AES-256-GCM).
+
+Every backup gets its own random data key, stored in the artifact header
+wrapped (AES-GCM) with a master key derived from ENCRYPTION_KEY. The
+plaintext is cut into ENCRYPTION_CHUNK_SIZE chunks encrypted independently,
+so artifacts of any size are encrypted and decrypted in constant memory,
+chunks are processed in parallel and any byte range can be decrypted
+without reading what comes before it.
+
+Layout:
+    header   MAGIC | chunk size (u32) | nonce prefix (7) | key nonce (12) | wrapped key (48)
+    chunks   ciphertext + 16 byte tag, every chunk but the last one full size
+
+The nonce of chunk i is nonce prefix | i (u32) | last flag (1 byte) and the
+header is authenticated with every chunk, so chunks cannot be reordered,
+dropped or truncated at a chunk boundary without failing decryption.
+"""
+import itertools
+import os
+import re
+import struct
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, Optional, Tuple
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from app.core.encryption import derive_key
+from app.utils.compression import DEFAULT_COMPRESSION_THREADS
+from app.utils.cpu_budget import cpu_budget
+
+MAGIC = b"BMCRYPT1"
+ENCRYPTED_EXTENSION = ".enc"
+
+# Plaintext bytes per encrypted chunk
+ENCRYPTION_CHUNK_SIZE = 1024 * 1024  # 1 MiB
+TAG_SIZE = 16
+
+HEADER = struct.Struct(">8sI7s12s48s")
+HEADER_SIZE = HEADER.size
+
+# HKDF purpose of the key wrapping the per-backup data keys
+KEY_WRAP_PURPOSE = b"BackupManager backup data key wrapping"
+
+# Encrypt new backups unless the database says otherwise ({"encryption": false})
+DEFAULT_ENCRYPTION = os.getenv("BACKUP_ENCRYPTION", "false").lower() == "true"
+
+
+def _chunk_nonce(prefix: bytes, index: int, last: bool) -> bytes:
+    return prefix + struct.pack(">IB", index, 1 if last else 0)
+
+
+def _master_key() -> AESGCM:
+    return AESGCM(derive_key(KEY_WRAP_PURPOSE))
+
+
+def parse_header(header: bytes) -> Tuple[int, bytes, AESGCM]:
+    """
+    Unwrap the data key of an encrypted artifact.
+    Returns: (chunk_size, nonce_prefix, cipher)
+    """
+    if len(header) < HEADER_SIZE:
+        raise ValueError("Not an encrypted backup: header too short")
+    magic, chunk_size, prefix, key_nonce, wrapped_key = HEADER.unpack(header[:HEADER_SIZE])
+    if magic != MAGIC:
+        raise ValueError("Not an encrypted backup")
+    try:
+        data_key = _master_key().decrypt(key_nonce, wrapped_key, MAGIC)
+    except InvalidTag:
+        raise ValueError("Backup was encrypted with a different ENCRYPTION_KEY")
+    return chunk_size, prefix, AESGCM(data_key)
+
+
+def is_encrypted_file(path: str) -> bool:
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+class ArtifactEncryptor:
+    """
+    Pipeline stage encrypting an artifact with a fresh data key.
+    Same shape as a Compressor: encrypt() returns the output available so
+    far, flush() the rest. Chunks are encrypted on a thread pool, sized by
+    the CPU budget when encryption starts, and emitted in order.
+    """
+
+    def __init__(self, threads: int = DEFAULT_COMPRESSION_THREADS,
+                 chunk_size: int = ENCRYPTION_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+        data_key = AESGCM.generate_key(bit_length=256)
+        self._prefix = os.urandom(7)
+        key_nonce = os.urandom(12)
+        wrapped_key = _master_key().encrypt(key_nonce, data_key, MAGIC)
+        self.header = HEADER.pack(MAGIC, chunk_size, self._prefix, key_nonce, wrapped_key)
+        self._cipher = AESGCM(data_key)
+
+        self._index = 0
+        self._header_sent = False
+        self.threads = threads
+        self._granted = 0
+        self._max_in_flight = 0
+        self._executor = None
+        self._pending = deque()
+        self._buffer = bytearray()
+
+    def _submit(self, block: bytes, last: bool):
+        if self._executor is None:
+            self._granted = cpu_budget.borrow(self.threads)
+            self._max_in_flight = self._granted * 2
+            self._executor = ThreadPoolExecutor(max_workers=self._granted, thread_name_prefix="encrypt")
+        nonce = _chunk_nonce(self._prefix, self._index, last)
+        self._index += 1
+        self._pending.append(self._executor.submit(self._cipher.encrypt, nonce, block, self.header))
+
+    def _collect(self, wait_all: bool = False) -> bytes:
+        """Return finished chunks in order; block on the oldest when too many are in flight"""
+        out = []
+        if not self._header_sent:
+            out.append(self.header)
+            self._header_sent = True
+        while self._pending:
+            head = self._pending[0]
+            if not (wait_all or head.done() or len(self._pending) >= self._max_in_flight):
+                break
+            out.append(head.result())
+            self._pending.popleft()
+        data = b"".join(out)
+        self.bytes_out += len(data)
+        return data
+
+    def encrypt(self, data: bytes) -> bytes:
+        self.bytes_in += len(data)
+        self._buffer += data
+        # Keep the tail back: only flush() knows which chunk is the last one
+        while len(self._buffer) > self.chunk_size:
+            self._submit(bytes(self._buffer[:self.chunk_size]), last=False)
+            del self._buffer[:self.chunk_size]
+        return self._collect()
+
+    def flush(self) -> bytes:
+        self._submit(bytes(self._buffer), last=True)
+        self._buffer = bytearray()
+        try:
+            return self._collect(wait_all=True)
+        finally:
+            self.close()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._granted:
+            cpu_budget.release(self._granted)
+            self._granted = 0
+
+
+def encrypt_chunks(chunks: Iterable[bytes], encryptor: ArtifactEncryptor) -> Iterator[bytes]:
+    """Pipeline stage: encrypt blocks as they stream through"""
+    try:
+        for chunk in chunks:
+            out = encryptor.encrypt(chunk)
+            if out:
+                yield out
+        yield encryptor.flush()
+    finally:
+        encryptor.close()
+
+
+def build_encryptor(options: dict) -> Optional[ArtifactEncryptor]:
+    """Encryption stage for a backup: `encryption` in connection_options overrides BACKUP_ENCRYPTION"""
+    if not options.get('encryption', DEFAULT_ENCRYPTION):
+        return None
+    return ArtifactEncryptor()
+
+
+def decrypt_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Sequential decryption of an encrypted artifact arriving as a stream"""
+    buffer = bytearray()
+    chunks = iter(chunks)
+    for chunk in chunks:
+        buffer += chunk
+        if len(buffer) >= HEADER_SIZE:
+            break
+    chunk_size, prefix, cipher = parse_header(bytes(buffer))
+    header = bytes(buffer[:HEADER_SIZE])
+    del buffer[:HEADER_SIZE]
+
+    stored_size = chunk_size + TAG_SIZE
+    index = 0
+    try:
+        # The first pass handles what arrived together with the header
+        for chunk in itertools.chain((b"",), chunks):
+            buffer += chunk
+            # A full chunk is only known not to be the last once more data follows it
+            while len(buffer) > stored_size:
+                yield cipher.decrypt(_chunk_nonce(prefix, index, False), bytes(buffer[:stored_size]), header)
+                del buffer[:stored_size]
+                index += 1
+        yield cipher.decrypt(_chunk_nonce(prefix, index, True), bytes(buffer), header)
+    except InvalidTag:
+        raise ValueError(f"Encrypted backup is corrupted or truncated (chunk {index})")
+
+
+class EncryptedFile:
+    """Random-access decryption of an encrypted artifact on disk"""
+
+    def __init__(self, path: str, threads: int = DEFAULT_COMPRESSION_THREADS):
+        self.path = path
+        self.threads = threads
+        self._fd = os.open(path, os.O_RDONLY)
+        try:
+            self.header = os.pread(self._fd, HEADER_SIZE, 0)
+            self.chunk_size, self._prefix, self._cipher = parse_header(self.header)
+            body_size = os.fstat(self._fd).st_size - HEADER_SIZE
+        except Exception:
+            os.close(self._fd)
+            raise
+
+        self._stored_size = self.chunk_size + TAG_SIZE
+        self.chunk_count = max((body_size + self._stored_size - 1) // self._stored_size, 1)
+        last_size = body_size - (self.chunk_count - 1) * self._stored_size - TAG_SIZE
+        if last_size < 0:
+            os.close(self._fd)
+            raise ValueError("Encrypted backup is truncated")
+        self.size = (self.chunk_count - 1) * self.chunk_size + last_size
+
+    def read_chunk(self, index: int) -> bytes:
+        offset = HEADER_SIZE + index * self._stored_size
+        data = os.pread(self._fd, self._stored_size, offset)
+        last = index == self.chunk_count - 1
+        try:
+            return self._cipher.decrypt(_chunk_nonce(self._prefix, index, last), data, self.header)
+        except InvalidTag:
+            raise ValueError(f"Encrypted backup is corrupted (chunk {index})")
+
+    def iter_range(self, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """Plaintext bytes [start, end), only the chunks covering the range are read"""
+        end = self.size if end is None else min(end, self.size)
+        if start >= end:
+            return
+        first = start // self.chunk_size
+        last = (end - 1) // self.chunk_size
+
+        threads = cpu_budget.borrow(self.threads)
+        try:
+            with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="decrypt") as executor:
+                pending = deque()
+                next_index = first
+                while pending or next_index <= last:
+                    while next_index <= last and len(pending) < threads * 2:
+                        pending.append((next_index, executor.submit(self.read_chunk, next_index)))
+                        next_index += 1
+                    index, future = pending.popleft()
+                    data = future.result()
+                    chunk_start = index * self.chunk_size
+                    yield data[max(start - chunk_start, 0):end - chunk_start]
+        finally:
+            cpu_budget.release(threads)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+def iter_decrypted_file(path: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+    """Generator owning an EncryptedFile for the duration of a (ranged) download"""
+    encrypted = EncryptedFile(path)
+    try:
+        yield from encrypted.iter_range(start, end)
+    finally:
+        encrypted.close()
+
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_byte_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Single HTTP byte range as [start, end), None for the whole content.
+    Raises ValueError for unsatisfiable or unsupported (multi-part) ranges.
+    """
+    if not range_header:
+        return None
+    match = RANGE_RE.match(range_header.strip())
+    if not match or not any(match.groups()):
+        raise ValueError(f"Unsupported range: {range_header}")
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last) + 1, size) if last else size
+    else:
+        # Suffix range: the last N bytes
+        start = max(size - int(last), 0)
+        end = size
+    if start >= end:
+        raise ValueError(f"Range not satisfiable: {range_header}")
+    return start, end
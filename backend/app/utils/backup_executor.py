@@ -6,15 +6,153 @@ import os
 import subprocess
 import shutil
 import json
-from datetime import datetime
+import threading
+import time
+import uuid
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
 from app.core.encryption import decrypt_password
+from app.utils.backup_encryption import ENCRYPTED_EXTENSION, ArtifactEncryptor, encrypt_chunks
+from app.utils.backup_pipeline import (
+    checksum_file,
+    copy_file_to_writers,
+    failed_result,
+    iter_file_chunks,
+    iter_stream_chunks,
+    iter_directory_tar,
+    open_destination_writers,
+    finalize_destinations,
+    FanOutWriter
+)
+from app.utils.command_output import StderrReader, run_command, track_process, untrack_process
+from app.utils.compression import (
+    COMPRESSION_NONE,
+    DEFAULT_COMPRESSION,
+    Compressor,
+    compress_chunks,
+    get_compressor
+)
+from app.utils.cpu_budget import cpu_budget
+from app.utils.database_connection import APP_DATABASE_ALIAS, resolve_sqlite_path
+from app.utils.redis_rdb import iter_rdb_snapshot
+from app.utils.staging import Reservation, staging
+
+# Dump modes: "streaming" pipes the dump tool's stdout straight into the
+# destinations, "staged" writes a temporary dump file first and copies it.
+DUMP_MODE_STREAMING = "streaming"
+DUMP_MODE_STAGED = "staged"
+# PostgreSQL only: parallel `pg_dump -F d -j N` into a staging directory,
+# streamed to the destinations as a single tar artifact
+DUMP_MODE_DIRECTORY = "directory"
+DEFAULT_DUMP_MODE = os.getenv("BACKUP_DUMP_MODE", DUMP_MODE_STREAMING)
+
+# Database types whose dump can be streamed (dump tool stdout, Redis replication socket)
+STREAMING_DB_TYPES = ('postgresql', 'mysql', 'mongodb', 'redis')
+
+# Shortest dump timeout; longer ones are derived from each database's estimate
+DUMP_TIMEOUT_SECONDS = int(os.getenv("BACKUP_DUMP_TIMEOUT_SECONDS", "3600"))
+
+# Staging area used when a dump has no reservation (first of BACKUP_STAGING_DIRS)
+STAGING_DIR = staging.default_dir
+
+# SQLite online backup: pages copied per step and pause between steps, so
+# writers of the live database only wait for one step at a time
+SQLITE_BACKUP_PAGES = int(os.getenv("BACKUP_SQLITE_PAGES", "1024"))
+SQLITE_BACKUP_SLEEP = float(os.getenv("BACKUP_SQLITE_SLEEP", "0.05"))
+
+
+def timed_out_message(what: str, timeout: float) -> str:
+    """Error message of a command killed after `timeout` seconds, e.g. "Backup timed out after 2 hours" """
+    minutes = max(int(timeout // 60), 1)
+    if minutes % 60 == 0:
+        hours = minutes // 60
+        amount = f"{hours} hour{'s' if hours > 1 else ''}"
+    else:
+        amount = f"{minutes} minute{'s' if minutes > 1 else ''}"
+    return f"{what} timed out after {amount}"
+
+
+def parse_connection_options(connection_options: str) -> dict:
+    """Parse the JSON connection_options of a database (invalid or empty -> {})"""
+    if not connection_options:
+        return {}
+    try:
+        options = json.loads(connection_options)
+        return options if isinstance(options, dict) else {}
+    except (json.JSONDecodeError, TypeError):
+        return {}
+
+
+def get_parallel_jobs(options: dict) -> int:
+    """Requested pg_dump worker count (`parallel_jobs` in connection_options), 1 if unset"""
+    try:
+        return max(int(options.get('parallel_jobs', 1)), 1)
+    except (TypeError, ValueError):
+        return 1
+
+
+def get_dump_extra_args(db_type: str, options: dict) -> List[str]:
+    """
+    Dump tool options derived from connection_options:
+    `parallel_collections` -> mongodump --numParallelCollections
+    """
+    args = []
+    if db_type.lower() == 'mongodb' and options.get('parallel_collections'):
+        try:
+            args.append(f"--numParallelCollections={max(int(options['parallel_collections']), 1)}")
+        except (TypeError, ValueError):
+            pass
+    return args
+
+
+def get_dump_mode(db_type: str, options: dict) -> str:
+    """
+    Pick the dump mode for a database.
+    `dump_mode` in connection_options overrides the BACKUP_DUMP_MODE default;
+    types without a stdout-capable dump tool always use the staged mode.
+    PostgreSQL databases with `parallel_jobs` > 1 use the directory mode.
+    """
+    if db_type.lower() == 'postgresql' and get_parallel_jobs(options) > 1:
+        return DUMP_MODE_DIRECTORY
+
+    mode = options.get('dump_mode', DEFAULT_DUMP_MODE)
+    if mode != DUMP_MODE_STREAMING or db_type.lower() not in STREAMING_DB_TYPES:
+        return DUMP_MODE_STAGED
+    return DUMP_MODE_STREAMING
+
+
+def build_compressor(db_type: str, options: dict, dump_mode: str,
+                     dedup: bool = False, backup_kind: str = None) -> Optional[Compressor]:
+    """
+    Build the compression stage for a backup from connection_options
+    (`compression`, `compression_level`, `compression_threads`).
+    Without an explicit codec, formats that are already compressed
+    (pg_dump custom format) are left alone, and so are backups going to
+    a dedup destination: compressed output shifts
+    after every change and would not deduplicate. PostgreSQL base backups
+    and WAL segments are raw files and do get compressed.
+    """
+    codec = options.get('compression')
+    if codec is None:
+        db_type = db_type.lower()
+        pg_dump_format = db_type == 'postgresql' and backup_kind not in ('base', 'wal')
+        if dedup or pg_dump_format:
+            codec = COMPRESSION_NONE
+        else:
+            codec = DEFAULT_COMPRESSION
+
+    return get_compressor(
+        codec,
+        level=options.get('compression_level'),
+        threads=options.get('compression_threads')
+    )
 
 
 def execute_postgres_backup(host: str, port: int, username: str, password: str,
-                            database_name: str, output_file: str) -> Tuple[bool, str]:
+                            database_name: str, output_file: str,
+                            progress: Callable = None,
+                            timeout: float = DUMP_TIMEOUT_SECONDS) -> Tuple[bool, str]:
     """Execute pg_dump for PostgreSQL backup"""
     try:
         env = os.environ.copy()
@@ -32,27 +170,58 @@ def execute_postgres_backup(host: str, port: int, username: str, password: str,
             database_name
         ]
 
-        result = subprocess.run(
-            cmd,
-            env=env,
-            capture_output=True,
-            text=True,
-            timeout=3600  # 1 hour timeout
-        )
+        returncode, stderr, timed_out = run_command(cmd, timeout, env, progress)
+
+        if timed_out:
+            return False, timed_out_message("Backup", timeout)
+        if returncode == 0:
+            return True, "Backup completed successfully"
+        else:
+            return False, stderr or "pg_dump failed"
+
+    except Exception as e:
+        return False, f"Backup failed: {str(e)}"
+
+
+def execute_postgres_directory_backup(host: str, port: int, username: str, password: str,
+                                      database_name: str, output_dir: str, jobs: int,
+                                      progress: Callable = None,
+                                      timeout: float = DUMP_TIMEOUT_SECONDS) -> Tuple[bool, str]:
+    """Execute a parallel directory-format pg_dump (one worker per table, up to `jobs`)"""
+    try:
+        env = os.environ.copy()
+        env['PGPASSWORD'] = password
+
+        cmd = [
+            'pg_dump',
+            '-h', host,
+            '-p', str(port),
+            '-U', username,
+            '-F', 'd',  # Directory format, required for parallel dumps
+            '-j', str(jobs),
+            '-b',  # Include blobs
+            '-v',  # Verbose
+            '-f', output_dir,
+            database_name
+        ]
+
+        returncode, stderr, timed_out = run_command(cmd, timeout, env, progress)
 
-        if result.returncode == 0:
+        if timed_out:
+            return False, timed_out_message("Backup", timeout)
+        if returncode == 0:
             return True, "Backup completed successfully"
         else:
-            return False, result.stderr or "pg_dump failed"
+            return False, stderr or "pg_dump failed"
 
-    except subprocess.TimeoutExpired:
-        return False, "Backup timed out after 1 hour"
     except Exception as e:
         return False, f"Backup failed: {str(e)}"
 
 
 def execute_mysql_backup(host: str, port: int, username: str, password: str,
-                         database_name: str, output_file: str) -> Tuple[bool, str]:
+                         database_name: str, output_file: str,
+                         extra_args: List[str] = None, progress: Callable = None,
+                         timeout: float = DUMP_TIMEOUT_SECONDS) -> Tuple[bool, str]:
     """Execute mysqldump for MySQL backup"""
     try:
         cmd = [
@@ -65,31 +234,30 @@ def execute_mysql_backup(host: str, port: int, username: str, password: str,
             '--routines',
             '--triggers',
             '--events',
+            '--verbose',  # Per-table lines on stderr, parsed for progress
             '--result-file', output_file,
+            *(extra_args or []),
             database_name
         ]
 
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=3600
-        )
+        returncode, stderr, timed_out = run_command(cmd, timeout, progress=progress)
 
-        if result.returncode == 0:
+        if timed_out:
+            return False, timed_out_message("Backup", timeout)
+        if returncode == 0:
             return True, "Backup completed successfully"
         else:
-            return False, result.stderr or "mysqldump failed"
+            return False, stderr or "mysqldump failed"
 
-    except subprocess.TimeoutExpired:
-        return False, "Backup timed out after 1 hour"
     except Exception as e:
         return False, f"Backup failed: {str(e)}"
 
 
 def execute_mongodb_backup(host: str, port: int, username: str, password: str,
-                           database_name: str, output_dir: str) -> Tuple[bool, str]:
-    """Execute mongodump for MongoDB backup"""
+                           database_name: str, output_file: str,
+                           extra_args: List[str] = None, progress: Callable = None,
+                           timeout: float = DUMP_TIMEOUT_SECONDS) -> Tuple[bool, str]:
+    """Execute mongodump for MongoDB backup (single archive file, no BSON tree)"""
     try:
         cmd = [
             'mongodump',
@@ -97,62 +265,133 @@ def execute_mongodb_backup(host: str, port: int, username: str, password: str,
             '--username', username,
             '--password', password,
             '--db', database_name,
-            '--out', output_dir
+            f'--archive={output_file}',
+            *(extra_args or [])
         ]
 
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=3600
-        )
+        returncode, stderr, timed_out = run_command(cmd, timeout, progress=progress)
 
-        if result.returncode == 0:
-            # Create tar archive
-            archive_path = f"{output_dir}.tar.gz"
-            shutil.make_archive(output_dir, 'gztar', output_dir)
-            shutil.rmtree(output_dir)
-            return True, f"Backup completed: {archive_path}"
+        if timed_out:
+            return False, timed_out_message("Backup", timeout)
+        if returncode == 0:
+            return True, "Backup completed successfully"
         else:
-            return False, result.stderr or "mongodump failed"
+            return False, stderr or "mongodump failed"
 
-    except subprocess.TimeoutExpired:
-        return False, "Backup timed out after 1 hour"
     except Exception as e:
         return False, f"Backup failed: {str(e)}"
 
 
+def execute_redis_backup(host: str, port: int, username: str, password: str,
+                         output_file: str) -> Tuple[bool, str]:
+    """Save an RDB snapshot received over the replication protocol"""
+    try:
+        with open(output_file, 'wb') as f:
+            for chunk in iter_rdb_snapshot(host, port, username, password):
+                f.write(chunk)
+        return True, "Backup completed successfully"
+    except Exception as e:
+        if os.path.exists(output_file):
+            os.remove(output_file)
+        return False, f"Backup failed: {str(e)}"
+
+
+def execute_sqlite_backup(file_path: str, output_file: str, pages: int = SQLITE_BACKUP_PAGES,
+                          sleep: float = SQLITE_BACKUP_SLEEP,
+                          progress: Callable = None) -> Tuple[bool, str]:
+    """
+    Copy a live SQLite database with the online backup API, `pages` pages per
+    step. The source is only locked during each step; a write from another
+    connection makes SQLite restart the copy.
+    progress(unit=..., done=..., total=...) is called after every step.
+    """
+    try:
+        import sqlite3
+
+        if file_path == APP_DATABASE_ALIAS:
+            # Our own database is written while the backup runs (progress,
+            # other tasks): copy it in a single step instead of restarting forever
+            pages = -1
+            progress = None
+
+        file_path = resolve_sqlite_path(file_path)
+        if not os.path.exists(file_path):
+            return False, f"Database file not found: {file_path}"
+
+        def _on_step(status, remaining, total):
+            if progress:
+                progress(unit="pages", done=total - remaining, total=total)
+            if remaining and sleep > 0:
+                time.sleep(sleep)  # Let writers in between steps
+
+        source = sqlite3.connect(f"file:{file_path}?mode=ro", uri=True, timeout=30)
+        target = sqlite3.connect(output_file)
+        try:
+            source.backup(target, pages=pages, progress=_on_step, sleep=sleep)
+        finally:
+            target.close()
+            source.close()
+        return True, "Backup completed successfully"
+
+    except Exception as e:
+        if os.path.exists(output_file):
+            os.remove(output_file)
+        return False, f"Backup failed: {str(e)}"
+
+
 def create_database_dump(db_type: str, host: str, port: int, username: str,
                         password_encrypted: str, database_name: str,
-                        backup_name: str) -> Tuple[bool, str, str]:
+                        backup_name: str, extra_args: List[str] = None,
+                        options: dict = None, progress: Callable = None,
+                        reservation: Reservation = None,
+                        timeout: float = DUMP_TIMEOUT_SECONDS) -> Tuple[bool, str, str]:
     """
     Create a database dump file.
+    extra_args are appended to the dump tool's options (MySQL, MongoDB).
+    options are the database's connection_options (SQLite step settings);
+    progress receives progress updates where the executor reports them.
+    The dump is written in the staging area of `reservation` when given
+    and the dump tool is killed after `timeout` seconds.
     Returns: (success, file_path, error_message)
     """
     # Create temp directory for dumps
-    temp_dir = "/tmp/backups"
+    temp_dir = reservation.path if reservation else STAGING_DIR
     os.makedirs(temp_dir, exist_ok=True)
 
     # Decrypt password
     password = decrypt_password(password_encrypted) if password_encrypted else ""
 
     # Add unique identifier to avoid conflicts between concurrent backups
-    import uuid
     unique_id = str(uuid.uuid4())[:8]
     output_file = os.path.join(temp_dir, f"{backup_name}_{unique_id}.dump")
+    if reservation:
+        reservation.track(output_file)
 
     try:
         if db_type.lower() == 'postgresql':
             success, message = execute_postgres_backup(
-                host, port, username, password, database_name, output_file
+                host, port, username, password, database_name, output_file, progress, timeout
             )
         elif db_type.lower() == 'mysql':
             success, message = execute_mysql_backup(
-                host, port, username, password, database_name, output_file
+                host, port, username, password, database_name, output_file, extra_args, progress, timeout
             )
         elif db_type.lower() == 'mongodb':
             success, message = execute_mongodb_backup(
-                host, port, username, password, database_name, output_file
+                host, port, username, password, database_name, output_file, extra_args, progress, timeout
+            )
+        elif db_type.lower() == 'redis':
+            success, message = execute_redis_backup(
+                host, port, username, password, output_file
+            )
+        elif db_type.lower() == 'sqlite':
+            # For SQLite, the 'host' field contains the file path
+            options = options or {}
+            success, message = execute_sqlite_backup(
+                host, output_file,
+                pages=int(options.get('sqlite_backup_pages', SQLITE_BACKUP_PAGES)),
+                sleep=float(options.get('sqlite_backup_sleep', SQLITE_BACKUP_SLEEP)),
+                progress=progress
             )
         else:
             return False, "", f"Unsupported database type: {db_type}"
@@ -166,82 +405,373 @@ def create_database_dump(db_type: str, host: str, port: int, username: str,
         return False, "", f"Dump creation failed: {str(e)}"
 
 
+def build_stream_command(db_type: str, host: str, port: int, username: str, password: str,
+                         database_name: str, extra_args: List[str] = None) -> Tuple[List[str], dict]:
+    """
+    Build the dump command writing the backup to stdout.
+    extra_args are appended to the dump tool's options.
+    Returns: (cmd, env)
+    """
+    env = os.environ.copy()
+    db_type = db_type.lower()
+
+    if db_type == 'postgresql':
+        env['PGPASSWORD'] = password
+        cmd = [
+            'pg_dump',
+            '-h', host,
+            '-p', str(port),
+            '-U', username,
+            '-F', 'c',  # Custom format
+            '-b',  # Include blobs
+            '-v',  # Verbose
+            database_name
+        ]
+    elif db_type == 'mysql':
+        cmd = [
+            'mysqldump',
+            '-h', host,
+            '-P', str(port),
+            '-u', username,
+            f'-p{password}',
+            '--single-transaction',
+            '--routines',
+            '--triggers',
+            '--events',
+            '--verbose',  # Per-table lines on stderr, parsed for progress
+            database_name
+        ]
+    elif db_type == 'mongodb':
+        cmd = [
+            'mongodump',
+            '--host', f"{host}:{port}",
+            '--username', username,
+            '--password', password,
+            '--db', database_name,
+            '--archive'  # No value: archive is written to stdout
+        ]
+    else:
+        raise ValueError(f"Streaming not supported for database type: {db_type}")
+
+    if extra_args:
+        # Options go before the trailing database name argument
+        position = len(cmd) - 1 if db_type in ('postgresql', 'mysql') else len(cmd)
+        cmd[position:position] = extra_args
+
+    return cmd, env
+
+
+def stream_database_dump(db_type: str, host: str, port: int, username: str,
+                         password_encrypted: str, database_name: str, backup_name: str,
+                         destinations: List, project_name: str, target_database_name: str,
+                         compressor: Compressor = None, extra_args: List[str] = None,
+                         tap: Callable[[Iterable[bytes]], Iterable[bytes]] = None,
+                         encryptor: ArtifactEncryptor = None, progress: Callable = None,
+                         timeout: float = DUMP_TIMEOUT_SECONDS) -> Tuple[bool, Dict[str, dict], int, str]:
+    """
+    Run the dump tool with stdout piped straight into every destination.
+    No staging file is written: each destination receives `<file>.partial`,
+    renamed to the final name only if the dump exits successfully.
+    tap is an optional stage seeing the raw dump before compression.
+    Returns: (success, destination_results, bytes_streamed, message)
+    bytes_streamed is the artifact size, i.e. after compression and encryption.
+    """
+    password = decrypt_password(password_encrypted) if password_encrypted else ""
+    unique_id = str(uuid.uuid4())[:8]
+    extension = ".rdb" if db_type.lower() == 'redis' else ".dump"
+    filename = f"{backup_name}_{unique_id}{extension}"
+    if compressor:
+        filename += compressor.extension
+
+    if db_type.lower() == 'redis':
+        # No dump tool: the snapshot is read from the replication socket
+        return stream_chunks_to_destinations(
+            lambda: iter_rdb_snapshot(host, port, username, password),
+            filename, destinations, project_name, target_database_name, compressor, encryptor, progress
+        )
+
+    try:
+        cmd, env = build_stream_command(db_type, host, port, username, password, database_name, extra_args)
+    except ValueError as e:
+        return False, {}, 0, str(e)
+
+    return stream_command_output(cmd, env, filename, destinations, project_name,
+                                 target_database_name, compressor, tap, encryptor, progress, timeout)
+
+
+def stream_command_output(cmd: List[str], env: dict, filename: str, destinations: List,
+                          project_name: str, target_database_name: str,
+                          compressor: Compressor = None,
+                          tap: Callable[[Iterable[bytes]], Iterable[bytes]] = None,
+                          encryptor: ArtifactEncryptor = None, progress: Callable = None,
+                          timeout: float = DUMP_TIMEOUT_SECONDS) -> Tuple[bool, Dict[str, dict], int, str]:
+    """
+    Run a command writing a backup artifact to stdout and stream it into
+    every destination as `filename` (plus the encryption extension).
+    Returns: (success, destination_results, bytes_streamed, message)
+    """
+    if encryptor:
+        filename += ENCRYPTED_EXTENSION
+    writers, results = open_destination_writers(destinations, project_name, target_database_name, filename)
+    if not writers:
+        return False, results, 0, "No writable destination available"
+
+    process = None
+    timed_out = threading.Event()
+
+    try:
+        process = subprocess.Popen(cmd, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        track_process(process)
+
+        # Drain stderr concurrently so a verbose dump cannot block on a full pipe
+        stderr_reader = StderrReader(process.stderr, progress).start()
+
+        def _kill_on_timeout():
+            timed_out.set()
+            process.kill()
+
+        watchdog = threading.Timer(timeout, _kill_on_timeout)
+        watchdog.start()
+        try:
+            chunks = iter_stream_chunks(process.stdout)
+            if tap:
+                chunks = tap(chunks)
+            if compressor:
+                chunks = compress_chunks(chunks, compressor)
+            if encryptor:
+                chunks = encrypt_chunks(chunks, encryptor)
+            fanout = FanOutWriter(writers)
+            bytes_streamed = fanout.run(chunks, progress)
+            if all(writer.failed for writer in writers):
+                # Nothing left to write to: stop the dump instead of draining it
+                process.kill()
+            returncode = process.wait()
+        finally:
+            watchdog.cancel()
+        stderr_text = stderr_reader.join()
+        if timed_out.is_set():
+            message = timed_out_message("Backup", timeout)
+            success = False
+        elif returncode != 0:
+            message = stderr_text or f"{cmd[0]} failed"
+            success = False
+        else:
+            message = "Backup completed successfully"
+            success = True
+
+        results.update(finalize_destinations(writers, success, message, fanout.checksum))
+        return success, results, bytes_streamed, message
+
+    except Exception as e:
+        if process and process.poll() is None:
+            process.kill()
+        message = f"Backup failed: {str(e)}"
+        results.update(finalize_destinations(writers, False, message))
+        return False, results, 0, message
+    finally:
+        if process:
+            untrack_process(process)
+
+
+def stream_postgres_directory_dump(host: str, port: int, username: str, password_encrypted: str,
+                                   database_name: str, backup_name: str, destinations: List,
+                                   project_name: str, target_database_name: str, jobs: int,
+                                   compressor: Compressor = None,
+                                   encryptor: ArtifactEncryptor = None,
+                                   progress: Callable = None,
+                                   reservation: Reservation = None,
+                                   timeout: float = DUMP_TIMEOUT_SECONDS) -> Tuple[bool, Dict[str, dict], int, str]:
+    """
+    Parallel PostgreSQL dump: `pg_dump -F d -j N` into a staging directory
+    (in the staging area of `reservation` when given), then packed on the
+    fly into a single tar artifact fanned out to every destination.
+    The worker count is capped by the global CPU budget.
+    Restore with: tar -xf <file>.tar && pg_restore -j N -d <db> <directory>
+    Returns: (success, destination_results, bytes_streamed, message)
+    """
+    password = decrypt_password(password_encrypted) if password_encrypted else ""
+    unique_id = str(uuid.uuid4())[:8]
+    dump_name = f"{backup_name}_{unique_id}"
+    staging_dir = reservation.path if reservation else STAGING_DIR
+    output_dir = os.path.join(staging_dir, f"{dump_name}.dir")
+    if reservation:
+        reservation.track(output_dir)
+    filename = f"{dump_name}.tar"
+    if compressor:
+        filename += compressor.extension
+
+    os.makedirs(staging_dir, exist_ok=True)
+    try:
+        with cpu_budget.reserve(jobs) as granted_jobs:
+            success, message = execute_postgres_directory_backup(
+                host, port, username, password, database_name, output_dir, granted_jobs, progress, timeout
+            )
+        if not success:
+            return False, {}, 0, message
+
+        success, results, bytes_streamed, error = stream_chunks_to_destinations(
+            lambda: iter_directory_tar(output_dir, arcname=dump_name),
+            filename, destinations, project_name, target_database_name, compressor, encryptor, progress
+        )
+        if not success:
+            return False, results, 0, f"Packing dump directory failed: {error}"
+        return True, results, bytes_streamed, message
+
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+
+def stream_chunks_to_destinations(make_chunks: Callable[[], Iterable[bytes]], filename: str,
+                                  destinations: List, project_name: str, target_database_name: str,
+                                  compressor: Compressor = None,
+                                  encryptor: ArtifactEncryptor = None,
+                                  progress: Callable = None) -> Tuple[bool, Dict[str, dict], int, str]:
+    """
+    Fan an artifact produced in-process out to every destination.
+    make_chunks is only called once at least one destination could be opened.
+    Returns: (success, destination_results, bytes_streamed, message)
+    """
+    if encryptor:
+        filename += ENCRYPTED_EXTENSION
+    writers, results = open_destination_writers(destinations, project_name, target_database_name, filename)
+    if not writers:
+        return False, results, 0, "No writable destination available"
+
+    try:
+        chunks = make_chunks()
+        if compressor:
+            chunks = compress_chunks(chunks, compressor)
+        if encryptor:
+            chunks = encrypt_chunks(chunks, encryptor)
+        fanout = FanOutWriter(writers)
+        bytes_streamed = fanout.run(chunks, progress)
+    except Exception as e:
+        message = str(e)
+        results.update(finalize_destinations(writers, False, message))
+        return False, results, 0, message
+
+    results.update(finalize_destinations(writers, True, checksum=fanout.checksum))
+    return True, results, bytes_streamed, "Backup completed successfully"
+
+
 def copy_to_destinations(source_file: str, destinations: List,
-                        project_name: str, database_name: str) -> Dict[str, dict]:
+                        project_name: str, database_name: str,
+                        compressor: Compressor = None,
+                        encryptor: ArtifactEncryptor = None,
+                        resume: bool = False, progress: Callable = None) -> Dict[str, dict]:
     """
     Copy backup file to all enabled destinations.
-    Returns: {destination_path: {success, file_path, size_mb, error}}
+    The source is read once (compressed and encrypted on the way when the
+    stages are given) and written to every destination concurrently.
+    When the file is stored as it is, plain destinations get a reflink or
+    in-kernel copy instead (recorded as copy_method).
+    Unencrypted copies are checkpointed; with resume, destinations whose
+    checkpoint matches this source and codec continue from it.
+    Returns: {destination_path: {success, file_path, size_mb, error, duration_seconds, throughput_mb_s, checksum}}
     """
-    results = {}
-    timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
     filename = os.path.basename(source_file)
+    if compressor:
+        filename += compressor.extension
+    if encryptor:
+        filename += ENCRYPTED_EXTENSION
 
-    for destination in destinations:
-        dest_path = destination.path
+    try:
+        source_size = os.path.getsize(source_file)
+    except OSError as e:
+        return {destination.path: failed_result(str(e)) for destination in destinations}
+
+    writers, results = open_destination_writers(
+        destinations, project_name, database_name, filename, required_bytes=source_size,
+        keep_partial=resume
+    )
+    if not writers:
+        return results
+
+    _setup_checkpoints(writers, source_file, compressor, encryptor, resume)
+
+    # Without a transforming stage the artifact is the file itself
+    if compressor or encryptor:
+        copied = []
+    else:
+        copied = [writer for writer in writers if writer.supports_copy]
+    streamed = [writer for writer in writers if writer not in copied]
 
-        try:
-            # Create directory structure: {dest_path}/{project_name}/{database_name}/
-            target_dir = os.path.join(dest_path, project_name, database_name)
-            os.makedirs(target_dir, exist_ok=True)
-
-            # Target file path
-            target_file = os.path.join(target_dir, filename)
-
-            # Check if destination is writable
-            if not os.access(target_dir, os.W_OK):
-                results[dest_path] = {
-                    "success": False,
-                    "file_path": None,
-                    "size_mb": None,
-                    "error": f"Destination not writable: {dest_path}"
-                }
-                continue
-
-            # Check available space
-            stat = shutil.disk_usage(target_dir)
-            source_size = os.path.getsize(source_file)
-            if stat.free < source_size * 1.1:  # Need 10% extra space
-                results[dest_path] = {
-                    "success": False,
-                    "file_path": None,
-                    "size_mb": None,
-                    "error": f"Insufficient space at {dest_path}"
-                }
-                continue
-
-            # Copy file
-            shutil.copy2(source_file, target_file)
-
-            # Verify copy
-            if os.path.exists(target_file):
-                file_size = os.path.getsize(target_file)
-                size_mb = round(file_size / (1024 * 1024), 2)
-
-                results[dest_path] = {
-                    "success": True,
-                    "file_path": target_file,
-                    "size_mb": size_mb,
-                    "error": None
-                }
-            else:
-                results[dest_path] = {
-                    "success": False,
-                    "file_path": None,
-                    "size_mb": None,
-                    "error": "File copy verification failed"
-                }
-
-        except Exception as e:
-            results[dest_path] = {
-                "success": False,
-                "file_path": None,
-                "size_mb": None,
-                "error": str(e)
-            }
+    artifact_size = 0
+    checksum = None
+    try:
+        if copied:
+            # Hashed on the way unless the streamed copies compute the checksum anyway
+            checksum = copy_file_to_writers(source_file, copied, progress, with_checksum=not streamed)
+            artifact_size = source_size
+        if streamed:
+            chunks = iter_file_chunks(source_file)
+            if compressor:
+                chunks = compress_chunks(chunks, compressor)
+            if encryptor:
+                chunks = encrypt_chunks(chunks, encryptor)
+            fanout = FanOutWriter(streamed)
+            artifact_size = fanout.run(chunks, progress)
+            checksum = fanout.checksum
+        elif checksum is None:
+            # The hashing copy failed: hash the source on its own
+            checksum = checksum_file(source_file)
+        success, error = True, None
+    except Exception as e:
+        success, error = False, f"Reading {source_file} failed: {str(e)}"
+
+    results.update(finalize_destinations(writers, success, error, checksum))
+
+    # The copy must contain the whole artifact
+    for writer in writers:
+        result = results[writer.dest_path]
+        if result["success"] and writer.bytes_written != artifact_size:
+            os.remove(result["file_path"])
+            results[writer.dest_path] = failed_result("File copy verification failed")
 
     return results
 
 
+def _setup_checkpoints(writers: List, source_file: str, compressor: Optional[Compressor],
+                       encryptor: Optional[ArtifactEncryptor], resume: bool):
+    """
+    Enable checkpoints on the writers of a staged copy and, when resuming,
+    continue every partial file whose checkpoint was written from the same
+    bytes: same source file, same codec and codec parameters (level, block size).
+    Encrypted copies are not checkpointed and always start over under the
+    encryptor's fresh data key: continuing under an earlier run's key would
+    reuse its nonces for different plaintext if the source was rewritten,
+    which its size and mtime cannot rule out.
+    """
+    resumable = [writer for writer in writers if writer.supports_resume]
+    if encryptor:
+        if resume:
+            for writer in resumable:
+                writer.resume(0)  # Partial file of an earlier run: encrypted again from the start
+        return
+
+    stat = os.stat(source_file)
+    info = {
+        "source_size": stat.st_size,
+        "source_mtime_ns": stat.st_mtime_ns,
+        "compression": compressor.parameters if compressor else None
+    }
+    for writer in resumable:
+        checkpoint = writer.load_checkpoint() if resume else None
+        writer.enable_checkpoints(info)
+        if checkpoint and all(checkpoint.get(key) == value for key, value in info.items()):
+            writer.resume(checkpoint["offset"])
+        elif resume:
+            writer.resume(0)  # Partial file of another artifact: start over
+
+
+def get_backup_checksum(destination_results: Dict[str, dict]) -> Optional[str]:
+    """Checksum of the artifact, as recorded by the destinations that stored it"""
+    for result in (destination_results or {}).values():
+        if result and result.get('success') and result.get('checksum'):
+            return result['checksum']
+    return None
+
+
 def determine_backup_status(destination_results: Dict[str, dict]) -> str:
     """
     Determine overall backup status based on destination results.
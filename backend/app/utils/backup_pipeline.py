@@ -0,0 +1,658 @@
+"""
+Streaming backup pipeline.
+Moves dump bytes from a producer (dump process stdout or a staged file)
+straight into every enabled destination, writing each target as a
+`.partial` file that is atomically renamed once the dump succeeded.
+Copies of staged files also checkpoint their progress next to the partial
+file, so a failed or interrupted copy can resume where it stopped.
+"""
+import os
+import json
+import hashlib
+import queue
+import shutil
+import tarfile
+import threading
+import time
+import logging
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.utils.dedup_store import (
+    CHUNK_STORE_DIR,
+    MANIFEST_SUFFIX,
+    PARTIAL_MANIFEST_INTERVAL,
+    STORAGE_MODE_DEDUP,
+    ChunkStore,
+    ContentDefinedChunker,
+    write_manifest
+)
+from app.utils.fast_copy import COPY_BLOCK_SIZE, fast_copy
+from app.utils.throttle import GLOBAL_RATE_LIMIT_BPS, Throttle
+
+logger = logging.getLogger(__name__)
+
+# Size of the blocks read from the producer and handed to the destinations
+CHUNK_SIZE = 1024 * 1024  # 1 MiB
+
+PARTIAL_SUFFIX = ".partial"
+CHECKPOINT_SUFFIX = ".checkpoint"
+
+# Bytes written between two checkpoints of a resumable copy
+CHECKPOINT_INTERVAL = int(os.getenv("BACKUP_CHECKPOINT_INTERVAL_MB", "64")) * 1024 * 1024
+
+# Fan-out: how many blocks the fastest destination may run ahead of the
+# slowest one, and how long a destination may make no progress before it
+# is cut off (the other destinations keep going).
+FANOUT_BUFFER_CHUNKS = int(os.getenv("BACKUP_FANOUT_BUFFER_CHUNKS", "8"))
+DESTINATION_STALL_TIMEOUT = int(os.getenv("BACKUP_DESTINATION_STALL_TIMEOUT", "300"))
+
+# Digest of the artifact, computed on the fly while it is fanned out
+# (sha256 or blake2b), stored as "<algorithm>:<hex>"
+CHECKSUM_ALGORITHMS = ("sha256", "blake2b")
+CHECKSUM_ALGORITHM = os.getenv("BACKUP_CHECKSUM_ALGORITHM", "sha256")
+
+
+def new_checksum(algorithm: str = CHECKSUM_ALGORITHM):
+    """Incremental hasher for the backup checksum"""
+    if algorithm not in CHECKSUM_ALGORITHMS:
+        raise ValueError(f"Unsupported checksum algorithm: {algorithm}")
+    return hashlib.new(algorithm)
+
+
+def format_checksum(hasher) -> str:
+    return f"{hasher.name}:{hasher.hexdigest()}"
+
+
+def checksum_file(file_path: str, algorithm: str = CHECKSUM_ALGORITHM) -> str:
+    """Checksum of a file on disk, for artifacts that were not fanned out block by block"""
+    hasher = new_checksum(algorithm)
+    for chunk in iter_file_chunks(file_path):
+        hasher.update(chunk)
+    return format_checksum(hasher)
+
+
+def compute_checksum(chunks: Iterable[bytes], checksum: str) -> Optional[str]:
+    """
+    Digest of a stored artifact with the algorithm of an existing checksum
+    ("<algorithm>:<hex>"), to compare against it. None for unknown algorithms.
+    """
+    algorithm = checksum.split(":", 1)[0]
+    if algorithm not in CHECKSUM_ALGORITHMS:
+        return None
+    hasher = hashlib.new(algorithm)
+    for chunk in chunks:
+        hasher.update(chunk)
+    return format_checksum(hasher)
+
+
+def iter_stream_chunks(stream: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield blocks from a binary stream until EOF"""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def iter_file_chunks(file_path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield blocks from a file on disk"""
+    with open(file_path, 'rb') as f:
+        yield from iter_stream_chunks(f, chunk_size)
+
+
+class _QueueWriter:
+    """File-like sink handing every write to a bounded queue (consumer side of iter_directory_tar)"""
+
+    def __init__(self, blocks: queue.Queue, stop: threading.Event):
+        self._blocks = blocks
+        self._stop = stop
+
+    def write(self, data: bytes) -> int:
+        while True:
+            if self._stop.is_set():
+                raise IOError("Tar stream consumer stopped")
+            try:
+                self._blocks.put(bytes(data), timeout=1)
+                return len(data)
+            except queue.Full:
+                continue
+
+
+def iter_directory_tar(directory: str, arcname: str, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Yield an uncompressed tar stream of a directory, built on the fly.
+    The archive is never written to disk: a producer thread packs the
+    directory into a bounded queue that this generator drains.
+    """
+    return iter_files_tar([(directory, arcname)], chunk_size)
+
+
+def iter_files_tar(members: List[Tuple[str, str]], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Same as iter_directory_tar for a list of (path, arcname) entries"""
+    blocks = queue.Queue(maxsize=FANOUT_BUFFER_CHUNKS)
+    stop = threading.Event()
+    done = object()
+
+    def _produce():
+        try:
+            with tarfile.open(fileobj=_QueueWriter(blocks, stop), mode='w|', bufsize=chunk_size) as tar:
+                for path, arcname in members:
+                    tar.add(path, arcname=arcname)
+            blocks.put(done)
+        except BaseException as e:
+            if not stop.is_set():
+                blocks.put(e)
+
+    producer = threading.Thread(target=_produce, daemon=True, name="tar-stream")
+    producer.start()
+    try:
+        while True:
+            item = blocks.get()
+            if item is done:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        producer.join(timeout=5)
+
+
+def failed_result(error: str) -> dict:
+    """Destination result entry for a destination that did not receive the backup"""
+    return {
+        "success": False,
+        "file_path": None,
+        "size_mb": None,
+        "error": error
+    }
+
+
+class DestinationWriter:
+    """
+    Writes one backup artifact into a single destination.
+    Data goes to `<target>.partial`; commit() fsyncs it and renames it to the
+    final name, so a crashed or failed run never leaves a file at the final path.
+
+    With checkpoints enabled, the partial file is fsynced every
+    CHECKPOINT_INTERVAL bytes and the durable offset is recorded in
+    `<target>.partial.checkpoint`; on failure both are kept so a later run
+    producing the same bytes can resume() from there.
+    """
+
+    # Whether copy_from() can fill the target straight from a file on disk
+    supports_copy = True
+    # Whether the partial file can be checkpointed and resumed
+    supports_resume = True
+
+    def __init__(self, dest_path: str, target_file: str, throttle: Throttle = None):
+        self.dest_path = dest_path
+        self.target_file = target_file
+        self.throttle = throttle or Throttle()
+        self.partial_file = target_file + PARTIAL_SUFFIX
+        self.bytes_written = 0
+        self.error = None
+        self.stalled = False
+        self.started_at = None
+        self.copy_method = None
+        self.checkpoint_file = self.partial_file + CHECKPOINT_SUFFIX
+        self.checkpoint_info = None
+        self.resumed_from = 0
+        self._skip = 0
+        self._last_checkpoint = 0
+        self._fh = None
+
+    def open(self, keep_partial: bool = False):
+        """Open the partial file; keep_partial leaves an earlier run's data for resume()"""
+        if keep_partial and os.path.exists(self.partial_file):
+            self._fh = open(self.partial_file, 'r+b')
+        else:
+            self._fh = open(self.partial_file, 'wb')
+        self.started_at = time.monotonic()
+
+    def enable_checkpoints(self, info: dict):
+        """Checkpoint progress; info identifies the bytes being written (source, stages)"""
+        self.checkpoint_info = info
+
+    def load_checkpoint(self) -> Optional[dict]:
+        """Checkpoint left by an earlier run, None if there is none or it is unusable"""
+        try:
+            with open(self.checkpoint_file) as f:
+                checkpoint = json.load(f)
+            if os.path.getsize(self.partial_file) < checkpoint["offset"]:
+                return None
+            return checkpoint
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def resume(self, offset: int):
+        """
+        Continue from the first `offset` bytes of the partial file: the
+        producer is replayed from the start and the bytes up to offset are
+        skipped instead of written again.
+        """
+        self._fh.truncate(offset)
+        self._fh.seek(offset)
+        self._skip = offset
+        self.resumed_from = offset
+        self._last_checkpoint = offset
+
+    def _save_checkpoint(self):
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        checkpoint = dict(self.checkpoint_info, offset=self.bytes_written, updated_at=time.time())
+        temp_file = self.checkpoint_file + ".tmp"
+        with open(temp_file, 'w') as f:
+            json.dump(checkpoint, f)
+        os.replace(temp_file, self.checkpoint_file)
+        self._last_checkpoint = self.bytes_written
+
+    def _maybe_checkpoint(self):
+        if self.checkpoint_info is not None and self.bytes_written - self._last_checkpoint >= CHECKPOINT_INTERVAL:
+            self._save_checkpoint()
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None
+
+    def write(self, chunk: bytes):
+        """Write a block; errors are recorded instead of raised so other destinations keep going"""
+        if self.failed:
+            return
+        try:
+            if self._skip:
+                # Already in the partial file from an earlier run
+                skipped = min(self._skip, len(chunk))
+                self._skip -= skipped
+                self.bytes_written += skipped
+                chunk = chunk[skipped:]
+                if not chunk:
+                    return
+            self._write(chunk)
+            self.bytes_written += len(chunk)
+            self._maybe_checkpoint()
+        except Exception as e:
+            self.abort(str(e))
+
+    def copy_from(self, source_path: str, hasher=None):
+        """
+        Fill the partial file with a copy of a file on disk (reflink or
+        in-kernel copy when possible); a hasher is fed the copied content.
+        """
+        if self.failed:
+            return
+
+        def _progress(copied: int):
+            # In-kernel copies are throttled after the fact, block by block
+            self.throttle.wait(copied - self.bytes_written)
+            self.bytes_written = copied
+            self._maybe_checkpoint()
+
+        try:
+            with open(source_path, 'rb') as source:
+                self.bytes_written = self.resumed_from
+                self.copy_method = fast_copy(
+                    source, self._fh, self.resumed_from, _progress,
+                    block_size=min(COPY_BLOCK_SIZE, self.throttle.block_size or COPY_BLOCK_SIZE),
+                    hasher=hasher
+                )
+            self._skip = 0
+            self.bytes_written = os.path.getsize(self.partial_file)
+        except Exception as e:
+            self.abort(str(e))
+
+    def commit(self) -> dict:
+        """Flush, fsync and atomically move the partial file to its final name"""
+        if self.failed:
+            return self.abort(self.error)
+        try:
+            self._finish()
+        except Exception as e:
+            return self.abort(str(e))
+        return self._result()
+
+    def cut_off(self, error: str):
+        """Give up on a destination whose write is blocked (e.g. a hung NFS mount)"""
+        self.stalled = True
+        if self.error is None:
+            self.error = error
+
+    def abort(self, error: str) -> dict:
+        """Discard the partial file (kept when checkpointed) and remember why"""
+        if self.error is None:
+            self.error = error
+        if self.checkpoint_info is not None and os.path.exists(self.checkpoint_file):
+            self._close_quietly()
+            logger.info(f"Keeping {self.partial_file} for a resumed copy")
+            return failed_result(self.error)
+        try:
+            self._discard()
+        except Exception as e:
+            logger.error(f"Failed to remove partial file {self.partial_file}: {str(e)}")
+        return failed_result(self.error)
+
+    def _close_quietly(self):
+        # A stalled writer may still be blocked inside write(): leave its handle alone
+        if self._fh and not self._fh.closed and not self.stalled:
+            try:
+                self._fh.close()
+            except OSError:
+                pass
+
+    def _write(self, chunk: bytes):
+        self.throttle.wait(len(chunk))
+        self._fh.write(chunk)
+
+    def _finish(self):
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        self._fh.close()
+        os.replace(self.partial_file, self.target_file)
+        self._remove_checkpoint()
+
+    def _discard(self):
+        self._close_quietly()
+        if os.path.exists(self.partial_file):
+            os.remove(self.partial_file)
+        self._remove_checkpoint()
+
+    def _remove_checkpoint(self):
+        if os.path.exists(self.checkpoint_file):
+            os.remove(self.checkpoint_file)
+
+    def status(self) -> dict:
+        """Live progress of this destination"""
+        return dict(self.throttle.status(), bytes_written=self.bytes_written, failed=self.failed)
+
+    def _result(self) -> dict:
+        elapsed = max(time.monotonic() - self.started_at, 0.001)
+        size_mb = self.bytes_written / (1024 * 1024)
+        result = {
+            "success": True,
+            "file_path": self.target_file,
+            "size_mb": round(size_mb, 2),
+            "error": None,
+            "duration_seconds": round(elapsed, 2),
+            "throughput_mb_s": round(size_mb / elapsed, 2)
+        }
+        if self.copy_method:
+            result["copy_method"] = self.copy_method
+        if self.resumed_from:
+            result["resumed_from_mb"] = round(self.resumed_from / (1024 * 1024), 2)
+        return result
+
+
+class DedupDestinationWriter(DestinationWriter):
+    """
+    Writer for destinations in dedup storage mode.
+    The artifact is cut into content-defined chunks stored once under
+    `<destination>/.chunks`; the backup itself is a small manifest listing
+    its chunks, written as `.partial` and renamed on commit like a plain file.
+    While chunks are stored the partial manifest is saved every
+    PARTIAL_MANIFEST_INTERVAL seconds, so the garbage collector keeps the
+    chunks of a long-running backup.
+    """
+
+    supports_copy = False  # Needs the bytes to chunk them
+    supports_resume = False  # Stored chunks are kept anyway and deduplicate the rerun
+
+    def __init__(self, dest_path: str, target_file: str, throttle: Throttle = None):
+        super().__init__(dest_path, target_file + MANIFEST_SUFFIX, throttle)
+        self.filename = os.path.basename(target_file)
+        self.store = ChunkStore(os.path.join(dest_path, CHUNK_STORE_DIR))
+        self.chunker = ContentDefinedChunker()
+        self.chunks = []
+        self.stored_bytes = 0
+        self._manifest_saved_at = 0
+
+    def open(self, keep_partial: bool = False):
+        self.store.ensure()
+        self.started_at = time.monotonic()
+        self._save_manifest()
+
+    def _save_manifest(self):
+        """Atomically (re)write the partial manifest with the chunks stored so far"""
+        temp_file = self.partial_file + ".tmp"
+        write_manifest(temp_file, self.filename, self.store.root, self.chunks)
+        os.replace(temp_file, self.partial_file)
+        self._manifest_saved_at = time.monotonic()
+
+    def _store(self, chunks: List[bytes]):
+        for chunk in chunks:
+            digest, stored = self.store.put(chunk)
+            self.chunks.append([digest, len(chunk)])
+            self.stored_bytes += stored
+            if stored:
+                self.throttle.wait(stored)  # Only new chunks are written
+        if chunks and time.monotonic() - self._manifest_saved_at >= PARTIAL_MANIFEST_INTERVAL:
+            self._save_manifest()
+
+    def _write(self, chunk: bytes):
+        self._store(self.chunker.feed(chunk))
+
+    def _finish(self):
+        self._store(self.chunker.finish())
+        self._save_manifest()
+        os.replace(self.partial_file, self.target_file)
+
+    def _discard(self):
+        # Chunks already stored stay behind until the next garbage collection
+        if os.path.exists(self.partial_file):
+            os.remove(self.partial_file)
+
+    def _result(self) -> dict:
+        result = super()._result()
+        result["storage_mode"] = STORAGE_MODE_DEDUP
+        result["stored_mb"] = round(self.stored_bytes / (1024 * 1024), 2)
+        return result
+
+
+def open_destination_writers(destinations: List, project_name: str, database_name: str,
+                             filename: str, required_bytes: int = None, keep_partial: bool = False
+                             ) -> Tuple[List[DestinationWriter], Dict[str, dict]]:
+    """
+    Prepare a writer for every destination.
+    When required_bytes is known, destinations without room for it are skipped
+    (except dedup destinations: they only store the chunks they lack).
+    keep_partial leaves partial files of an earlier run in place for resume().
+    Returns: (writers, results) where results holds the destinations that
+    could not be opened, keyed by destination path. Opened destinations get a
+    None placeholder so the final results keep the configured order.
+    """
+    writers = []
+    results = {}
+
+    for destination in destinations:
+        dest_path = destination.path
+        dedup = getattr(destination, 'storage_mode', None) == STORAGE_MODE_DEDUP
+        try:
+            # Same layout as the staged copy: {dest_path}/{project_name}/{database_name}/
+            target_dir = os.path.join(dest_path, project_name, database_name)
+            os.makedirs(target_dir, exist_ok=True)
+
+            if not os.access(target_dir, os.W_OK):
+                results[dest_path] = failed_result(f"Destination not writable: {dest_path}")
+                continue
+
+            if required_bytes is not None and not dedup:
+                stat = shutil.disk_usage(target_dir)
+                if stat.free < required_bytes * 1.1:  # Need 10% extra space
+                    results[dest_path] = failed_result(f"Insufficient space at {dest_path}")
+                    continue
+
+            target_file = os.path.join(target_dir, filename)
+            throttle = Throttle(
+                getattr(destination, 'rate_limit_bps', None),
+                getattr(destination, 'burst_bytes', None)
+            )
+            if dedup:
+                writer = DedupDestinationWriter(dest_path, target_file, throttle)
+            else:
+                writer = DestinationWriter(dest_path, target_file, throttle)
+            writer.open(keep_partial)
+            writers.append(writer)
+            results[dest_path] = None
+
+        except Exception as e:
+            results[dest_path] = failed_result(str(e))
+
+    return writers, results
+
+
+def writers_progress(writers: List[DestinationWriter], total: int) -> dict:
+    """Progress fields of a running fan-out or copy: bytes produced and each destination's rate"""
+    return {
+        "bytes": total,
+        "destinations": {writer.dest_path: writer.status() for writer in writers},
+        "global_rate_limit_bps": GLOBAL_RATE_LIMIT_BPS or None
+    }
+
+
+def copy_file_to_writers(source_file: str, writers: List[DestinationWriter],
+                         progress: Callable = None, with_checksum: bool = True) -> Optional[str]:
+    """
+    Fill every writer with a copy of a file on disk, one thread per filesystem.
+    Destinations on the source's filesystem copy from the source (a reflink
+    when supported); on any other filesystem the first destination copies
+    from the source and the next ones clone that first copy, so a shared
+    btrfs/XFS filesystem receives the data only once.
+    progress(**fields) receives writers_progress() while the copies run.
+    With with_checksum, the first copy from the source also computes its
+    checksum, returned (None if that copy failed).
+    """
+    source_size = os.path.getsize(source_file)
+    source_device = os.stat(source_file).st_dev
+    by_device = {}
+    for writer in writers:
+        device = os.stat(os.path.dirname(writer.partial_file)).st_dev
+        by_device.setdefault(device, []).append(writer)
+
+    hasher = new_checksum()
+    hashing_writer = writers[0] if with_checksum else None
+
+    def _copy_group(device: int, group: List[DestinationWriter]):
+        origin = source_file
+        for writer in group:
+            writer.started_at = time.monotonic()
+            writer.copy_from(origin, hasher if writer is hashing_writer else None)
+            if origin == source_file and device != source_device and not writer.failed:
+                origin = writer.partial_file
+
+    threads = [
+        threading.Thread(target=_copy_group, args=(device, group), daemon=True, name="fast-copy")
+        for device, group in by_device.items()
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        while thread.is_alive():
+            thread.join(timeout=1)
+            if progress:
+                progress(**writers_progress(writers, source_size))
+
+    if hashing_writer is None or hashing_writer.failed:
+        return None
+    return format_checksum(hasher)
+
+
+class FanOutWriter:
+    """
+    Reads the producer once and writes every block to all destinations at the
+    same time, one thread per destination.
+
+    Each destination has a bounded queue of FANOUT_BUFFER_CHUNKS blocks; the
+    blocks are shared between the queues, so memory stays bounded by the
+    distance between the fastest and the slowest destination. A destination
+    that accepts nothing for DESTINATION_STALL_TIMEOUT seconds is cut off.
+
+    The producer thread also hashes every block once: `checksum` holds the
+    digest of the whole artifact after run().
+    """
+
+    def __init__(self, writers: List[DestinationWriter], buffer_chunks: int = FANOUT_BUFFER_CHUNKS,
+                 stall_timeout: int = DESTINATION_STALL_TIMEOUT):
+        self.writers = writers
+        self.buffer_chunks = buffer_chunks
+        self.stall_timeout = stall_timeout
+        self.checksum = None
+        self._lanes = []
+
+    def _drain(self, writer: DestinationWriter, lane: queue.Queue):
+        while True:
+            chunk = lane.get()
+            if chunk is None:
+                break
+            writer.write(chunk)  # No-op once the writer failed, the lane just drains
+
+    def _stall_message(self, writer: DestinationWriter) -> str:
+        return f"Destination stalled for more than {self.stall_timeout}s: {writer.dest_path}"
+
+    def run(self, chunks: Iterable[bytes], progress: Callable = None) -> int:
+        """
+        Distribute all blocks; stops early when no destination is left.
+        progress(**fields) receives writers_progress() after every block.
+        Returns the number of bytes consumed from the producer.
+        """
+        for writer in self.writers:
+            lane = queue.Queue(maxsize=self.buffer_chunks)
+            thread = threading.Thread(target=self._drain, args=(writer, lane), daemon=True)
+            thread.start()
+            self._lanes.append((writer, lane, thread))
+
+        total = 0
+        hasher = new_checksum()
+        try:
+            for chunk in chunks:
+                total += len(chunk)
+                hasher.update(chunk)
+                for writer, lane, _ in self._lanes:
+                    if writer.failed:
+                        continue
+                    try:
+                        lane.put(chunk, timeout=self.stall_timeout)
+                    except queue.Full:
+                        logger.warning(self._stall_message(writer))
+                        writer.cut_off(self._stall_message(writer))
+                if all(writer.failed for writer in self.writers):
+                    break
+                if progress:
+                    progress(**writers_progress(self.writers, total))
+        finally:
+            self._close_lanes()
+
+        self.checksum = format_checksum(hasher)
+        return total
+
+    def _close_lanes(self):
+        for writer, lane, _ in self._lanes:
+            try:
+                if writer.stalled:
+                    lane.put_nowait(None)
+                else:
+                    lane.put(None, timeout=self.stall_timeout)
+            except queue.Full:
+                writer.cut_off(self._stall_message(writer))
+
+        for writer, _, thread in self._lanes:
+            if writer.stalled:
+                continue
+            thread.join(timeout=self.stall_timeout)
+            if thread.is_alive():
+                writer.cut_off(self._stall_message(writer))
+
+
+def finalize_destinations(writers: List[DestinationWriter], success: bool,
+                          error: str = None, checksum: str = None) -> Dict[str, dict]:
+    """
+    Commit every writer when the producer succeeded, otherwise discard the partial files.
+    checksum (from FanOutWriter) is recorded on every committed destination.
+    """
+    results = {}
+    for writer in writers:
+        if success:
+            results[writer.dest_path] = writer.commit()
+            if results[writer.dest_path]["success"]:
+                results[writer.dest_path]["checksum"] = checksum
+        else:
+            results[writer.dest_path] = writer.abort(error or "Dump failed")
+    return results
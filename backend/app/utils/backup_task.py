@@ -7,14 +7,43 @@ import logging
 from datetime import datetime
 
 from app.core.database import SessionLocal
-from app.models.backup import Backup, BackupStatus
+from app.models.backup import Backup, BackupKind, BackupStatus
+from app.models.backup_job import BackupJob, JobStatus
 from app.models.database import Database
 from app.models.database_destination import DatabaseDestination
 from app.utils.backup_executor import (
+    DUMP_MODE_STREAMING,
+    DUMP_MODE_DIRECTORY,
+    DUMP_TIMEOUT_SECONDS,
+    parse_connection_options,
+    get_dump_mode,
+    get_dump_extra_args,
+    get_parallel_jobs,
+    build_compressor,
     create_database_dump,
+    stream_database_dump,
+    stream_postgres_directory_dump,
     copy_to_destinations,
+    get_backup_checksum,
     determine_backup_status
 )
+from app.utils.backup_encryption import ArtifactEncryptor, build_encryptor
+from app.utils.change_detection import DEFAULT_SKIP_IF_UNCHANGED, find_unchanged_reference, get_fingerprint
+from app.utils.backup_chain import load_metadata, plan_incremental_backup, supports_incremental
+from app.utils.compression import get_compressor
+from app.utils.dedup_store import STORAGE_MODE_DEDUP
+from app.utils.estimator import ESTIMATED_KINDS, check_destination_space, estimate_backup, staging_bytes
+from app.utils.mysql_binlog import (
+    SOURCE_DATA_OPTION,
+    BinlogCoordinatesTap,
+    read_file_coordinates,
+    archive_binlog_increment
+)
+from app.utils.mongo_oplog import get_oplog_position, archive_oplog_increment
+from app.utils.redis_rdb import get_rdb_stats
+from app.utils.pg_wal import get_slot_name, stream_base_backup, archive_wal_increment
+from app.utils.progress import ProgressReporter
+from app.utils.staging import reclaim_orphaned_staging, staging
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +51,8 @@ logger = logging.getLogger(__name__)
 def execute_backup_task(backup_id: int, database_id: int):
     """Background task to execute the backup"""
     db = SessionLocal()
+    backup = None
+    reservation = None
     try:
         logger.info(f"Starting backup task for backup_id={backup_id}, database_id={database_id}")
         
@@ -37,6 +68,7 @@ def execute_backup_task(backup_id: int, database_id: int):
         backup.started_at = datetime.utcnow()
         db.commit()
         logger.info(f"Backup {backup_id} status updated to IN_PROGRESS")
+        progress = ProgressReporter(backup_id)
 
         # Get enabled destinations
         destinations = db.query(DatabaseDestination).filter(
@@ -44,42 +76,257 @@ def execute_backup_task(backup_id: int, database_id: int):
             DatabaseDestination.enabled == True
         ).all()
 
-        # Step 1: Create database dump
-        logger.info(f"Creating database dump for {database.name}...")
-        success, dump_file, error_msg = create_database_dump(
-            db_type=database.db_type.value,
+        project_name = database.group.name if database.group else "default"
+        db_type = database.db_type.value
+        options = parse_connection_options(database.connection_options)
+        dump_mode = get_dump_mode(db_type, options)
+
+        # Incremental requests extend the database's current chain or start a new one
+        chain_root = False
+        if backup.backup_kind == BackupKind.INCREMENTAL.value:
+            if not supports_incremental(db_type):
+                _fail_backup(db, backup, f"Incremental backups are not supported for {db_type}")
+                return
+            kind, parent = plan_incremental_backup(db, backup, db_type, options)
+            backup.backup_kind = kind
+            backup.parent_backup_id = parent.id if parent else None
+            chain_root = parent is None
+            db.commit()
+            logger.info(f"Backup {backup_id} planned as {kind} (parent: {backup.parent_backup_id})")
+
+        compressor = build_compressor(
+            db_type, options, dump_mode,
+            dedup=any(dest.storage_mode == STORAGE_MODE_DEDUP for dest in destinations),
+            backup_kind=backup.backup_kind
+        )
+        encryptor = build_encryptor(options)
+
+        # Read-mostly databases: no new dump when nothing was written since the last backup
+        if (backup.backup_kind == BackupKind.FULL.value and not chain_root
+                and options.get('skip_if_unchanged', DEFAULT_SKIP_IF_UNCHANGED)):
+            backup.fingerprint = get_fingerprint(
+                db_type, database.host, database.port, database.username,
+                database.password_encrypted, database.database_name
+            )
+            db.commit()
+            if backup.fingerprint:
+                reference = find_unchanged_reference(
+                    db, backup, backup.fingerprint, destinations,
+                    compressor.codec if compressor else None, encryptor is not None
+                )
+                if reference:
+                    _record_unchanged(db, backup, reference)
+                    return
+
+        # Dumps are sized before they start: staging space, destination space, timeout
+        estimate = None
+        preflight_results = {}
+        dump_timeout = DUMP_TIMEOUT_SECONDS
+        if backup.backup_kind in ESTIMATED_KINDS:
+            estimate = estimate_backup(db, database, compressor.codec if compressor else None, backup.backup_kind)
+            backup.estimate = json.dumps(estimate)
+            db.commit()
+            dump_timeout = estimate["timeout_seconds"]
+            if estimate["artifact_bytes"]:
+                preflight_results = check_destination_space(destinations, estimate["artifact_bytes"])
+                destinations = [dest for dest in destinations if dest.path not in preflight_results]
+                if not destinations:
+                    _fail_backup(db, backup, "No destination has room for the estimated "
+                                             f"{estimate['artifact_bytes'] // (1024 * 1024)} MB", preflight_results)
+                    return
+
+        stream_args = dict(
             host=database.host,
             port=database.port,
             username=database.username,
             password_encrypted=database.password_encrypted,
             database_name=database.database_name,
-            backup_name=backup.name
+            backup_name=backup.name,
+            destinations=destinations,
+            project_name=project_name,
+            target_database_name=database.name,
+            compressor=compressor,
+            encryptor=encryptor,
+            progress=progress.update
         )
+        metadata = None
+        dump_file = None
 
-        if not success:
-            logger.error(f"Dump creation failed for backup {backup_id}: {error_msg}")
-            backup.status = BackupStatus.FAILED
-            backup.error_message = error_msg
-            backup.completed_at = datetime.utcnow()
+        # Dump tool options; MySQL chain roots also record their binlog coordinates
+        dump_args = {"extra_args": get_dump_extra_args(db_type, options)}
+        binlog_tap = None
+        if chain_root and db_type == 'mysql':
+            binlog_tap = BinlogCoordinatesTap()
+            dump_args["extra_args"].append(SOURCE_DATA_OPTION)
+
+        # MongoDB chain roots record the oplog position before the dump starts:
+        # replaying entries the dump already contains is harmless
+        oplog_position = None
+        if chain_root and db_type == 'mongodb':
+            found, oplog_position, error_msg = get_oplog_position(
+                database.host, database.port, database.username, database.password_encrypted
+            )
+            if not found:
+                _fail_backup(db, backup, error_msg)
+                return
+
+        # Staged and directory dumps hold their estimated size in a staging area
+        chain_kinds = (BackupKind.BASE.value, BackupKind.WAL.value, BackupKind.BINLOG.value, BackupKind.OPLOG.value)
+        if backup.backup_kind not in chain_kinds and dump_mode != DUMP_MODE_STREAMING:
+            try:
+                reservation = staging.reserve(
+                    staging_bytes(estimate),
+                    label=f"backup {backup_id}",
+                    on_wait=lambda **fields: progress.update(force=True, waiting_for="staging", **fields)
+                )
+            except RuntimeError as e:
+                _fail_backup(db, backup, str(e))
+                return
+            if progress.state.get("waiting_for"):
+                progress.update(force=True, waiting_for=None, queue_position=None)
+
+        if backup.backup_kind in (BackupKind.BASE.value, BackupKind.WAL.value):
+            # Steps 1+2: Base backup or WAL increment, streamed to all destinations
+            logger.info(f"Running PostgreSQL {backup.backup_kind} backup for {database.name}...")
+            slot_name = get_slot_name(database.id)
+            if backup.backup_kind == BackupKind.BASE.value:
+                success, destination_results, bytes_streamed, error_msg, metadata = stream_base_backup(
+                    slot_name=slot_name, timeout=dump_timeout, **stream_args
+                )
+            else:
+                parent_metadata = load_metadata(backup.parent)
+                success, destination_results, bytes_streamed, error_msg, metadata = archive_wal_increment(
+                    slot_name=slot_name,
+                    last_segment=parent_metadata.get("last_segment"),
+                    start_lsn=parent_metadata.get("start_lsn"),
+                    timeout=dump_timeout,
+                    **stream_args
+                )
+        elif backup.backup_kind == BackupKind.BINLOG.value:
+            # Steps 1+2: Binlog files since the previous link, streamed to all destinations
+            logger.info(f"Archiving MySQL binlog for {database.name}...")
+            parent_metadata = load_metadata(backup.parent)
+            success, destination_results, bytes_streamed, error_msg, metadata = archive_binlog_increment(
+                start_file=parent_metadata.get("binlog_file"),
+                start_position=parent_metadata.get("binlog_position", 0),
+                timeout=dump_timeout,
+                **stream_args
+            )
+        elif backup.backup_kind == BackupKind.OPLOG.value:
+            # Steps 1+2: Oplog entries since the previous link, streamed to all destinations
+            logger.info(f"Archiving MongoDB oplog for {database.name}...")
+            success, destination_results, bytes_streamed, error_msg, metadata = archive_oplog_increment(
+                start_position=load_metadata(backup.parent).get("oplog_ts"),
+                **stream_args
+            )
+        elif dump_mode in (DUMP_MODE_STREAMING, DUMP_MODE_DIRECTORY):
+            # Steps 1+2: Stream the dump straight into all destinations
+            logger.info(f"Streaming {dump_mode} dump for {database.name} to {len(destinations)} destination(s)...")
+            if dump_mode == DUMP_MODE_DIRECTORY:
+                success, destination_results, bytes_streamed, error_msg = stream_postgres_directory_dump(
+                    jobs=get_parallel_jobs(options), reservation=reservation, timeout=dump_timeout, **stream_args
+                )
+            else:
+                success, destination_results, bytes_streamed, error_msg = stream_database_dump(
+                    db_type=db_type, tap=binlog_tap, timeout=dump_timeout, **dump_args, **stream_args
+                )
+                if binlog_tap:
+                    metadata = binlog_tap.coordinates
+        else:
+            # Step 1: Create database dump
+            logger.info(f"Creating database dump for {database.name}...")
+            success, dump_file, error_msg = create_database_dump(
+                db_type=db_type,
+                host=database.host,
+                port=database.port,
+                username=database.username,
+                password_encrypted=database.password_encrypted,
+                database_name=database.database_name,
+                backup_name=backup.name,
+                options=options,
+                progress=progress.update,
+                reservation=reservation,
+                timeout=dump_timeout,
+                **dump_args
+            )
+
+            if not success:
+                logger.error(f"Dump creation failed for backup {backup_id}: {error_msg}")
+                _fail_backup(db, backup, error_msg)
+                return
+
+            logger.info(f"Dump created successfully: {dump_file}")
+            if progress.state:
+                progress.update(force=True)
+
+            # Staged dump recorded on the backup: kept for a retry if a copy fails
+            backup.file_path = dump_file
             db.commit()
+            # Step 2: Copy to all destinations
+            destination_results = copy_to_destinations(
+                source_file=dump_file,
+                destinations=destinations,
+                project_name=project_name,
+                database_name=database.name,
+                compressor=compressor,
+                encryptor=encryptor,
+                progress=progress.update
+            )
+
+            # Artifact size as stored at the destinations
+            if encryptor:
+                bytes_streamed = encryptor.bytes_out
+            else:
+                bytes_streamed = compressor.bytes_out if compressor else os.path.getsize(dump_file)
+            if binlog_tap:
+                metadata = read_file_coordinates(dump_file)
+
+        # Destinations skipped by the preflight check count as failed copies
+        if preflight_results:
+            destination_results = dict(preflight_results, **destination_results)
+
+        if not success:
+            logger.error(f"Backup {backup_id} failed: {error_msg}")
+            _fail_backup(db, backup, error_msg, destination_results, metadata)
             return
 
-        logger.info(f"Dump created successfully: {dump_file}")
-        # Get file size
-        file_size = os.path.getsize(dump_file)
-        backup.file_size = file_size
+        if progress.state:
+            progress.update(force=True)
+        backup.file_size = bytes_streamed
+        backup.checksum = get_backup_checksum(destination_results)
+        if oplog_position:
+            metadata = {"oplog_ts": oplog_position}
 
-        # Step 2: Copy to all destinations
-        project_name = database.group.name if database.group else "default"
-        destination_results = copy_to_destinations(
-            source_file=dump_file,
-            destinations=destinations,
-            project_name=project_name,
-            database_name=database.name
-        )
+        # Redis: record the snapshot size and what the fork cost the server
+        if db_type == 'redis':
+            if compressor:
+                rdb_size = compressor.bytes_in
+            else:
+                rdb_size = encryptor.bytes_in if encryptor else bytes_streamed
+            metadata = {"rdb_size": rdb_size}
+            try:
+                metadata.update(get_rdb_stats(
+                    database.host, database.port, database.username, database.password_encrypted
+                ))
+            except Exception as e:
+                logger.warning(f"Could not read Redis persistence stats for backup {backup_id}: {str(e)}")
+        if metadata is not None:
+            backup.backup_metadata = json.dumps(metadata)
+        elif binlog_tap:
+            logger.warning(f"No binlog coordinates in dump of backup {backup_id}: it cannot start a chain")
+
+        # Record the compression actually applied
+        backup.is_compressed = compressor is not None
+        backup.compression_type = compressor.codec if compressor else None
+        backup.compression_ratio = compressor.ratio if compressor else None
+        backup.is_encrypted = encryptor is not None
 
         # Step 3: Determine final status
-        final_status = determine_backup_status(destination_results)
+        if not destination_results and dump_file is None:
+            # Nothing new to archive since the previous link (idle database)
+            final_status = 'completed'
+        else:
+            final_status = determine_backup_status(destination_results)
         backup.status = BackupStatus[final_status.upper()]
         backup.destination_results = json.dumps(destination_results)
         backup.completed_at = datetime.utcnow()
@@ -88,15 +335,12 @@ def execute_backup_task(backup_id: int, database_id: int):
             duration = (backup.completed_at - backup.started_at).total_seconds()
             backup.duration_seconds = int(duration)
 
-        # Cleanup temporary dump file
-        try:
-            if os.path.exists(dump_file):
-                os.remove(dump_file)
-                logger.info(f"Cleaned up temporary dump file: {dump_file}")
+        # Cleanup temporary dump file (staged mode only), unless a retry can resume from it
+        if dump_file:
+            if final_status == 'completed':
+                _remove_staged_dump(backup)
             else:
-                logger.warning(f"Temporary dump file not found for cleanup: {dump_file}")
-        except Exception as e:
-            logger.error(f"Failed to cleanup temporary dump file {dump_file}: {str(e)}")
+                logger.info(f"Keeping {dump_file} for a retry of backup {backup.id}")
 
         db.commit()
         logger.info(f"Backup {backup.id} completed with status: {final_status}")
@@ -105,7 +349,168 @@ def execute_backup_task(backup_id: int, database_id: int):
         if backup:
             backup.status = BackupStatus.FAILED
             backup.error_message = f"Backup execution failed: {str(e)}"
+            backup.parent_backup_id = None
             backup.completed_at = datetime.utcnow()
             db.commit()
     finally:
+        if reservation:
+            reservation.release()
         db.close()
+
+
+def _record_unchanged(db, backup: Backup, reference: Backup):
+    """Complete a backup as a reference to an identical earlier one"""
+    backup.backup_kind = BackupKind.UNCHANGED.value
+    backup.parent_backup_id = reference.id
+    backup.file_size = 0
+    backup.checksum = reference.checksum
+    backup.is_compressed = reference.is_compressed
+    backup.compression_type = reference.compression_type
+    backup.is_encrypted = reference.is_encrypted
+    backup.status = BackupStatus.COMPLETED
+    backup.completed_at = datetime.utcnow()
+    if backup.started_at:
+        backup.duration_seconds = int((backup.completed_at - backup.started_at).total_seconds())
+    db.commit()
+    logger.info(f"Backup {backup.id} unchanged: references backup {reference.id}")
+
+
+def _remove_staged_dump(backup: Backup):
+    dump_file = backup.file_path
+    try:
+        if os.path.exists(dump_file):
+            os.remove(dump_file)
+            logger.info(f"Cleaned up temporary dump file: {dump_file}")
+        else:
+            logger.warning(f"Temporary dump file not found for cleanup: {dump_file}")
+    except Exception as e:
+        logger.error(f"Failed to cleanup temporary dump file {dump_file}: {str(e)}")
+    backup.file_path = None
+
+
+def retry_backup_task(backup_id: int):
+    """
+    Copy the staged dump of a failed or partial backup again to the
+    destinations that did not receive it. Copies resume from their last
+    checkpoint when the partial file is still there.
+    """
+    db = SessionLocal()
+    backup = None
+    try:
+        backup = db.query(Backup).filter(Backup.id == backup_id).first()
+        if not backup or not backup.file_path or not os.path.exists(backup.file_path):
+            logger.error(f"Backup {backup_id} has no staged dump to retry from")
+            return
+        database = backup.database
+
+        previous_results = json.loads(backup.destination_results) if backup.destination_results else {}
+        done = {path for path, result in previous_results.items() if result and result.get('success')}
+        destinations = [
+            dest for dest in db.query(DatabaseDestination).filter(
+                DatabaseDestination.database_id == database.id,
+                DatabaseDestination.enabled == True
+            ).all()
+            if dest.path not in done
+        ]
+
+        backup.status = BackupStatus.IN_PROGRESS
+        backup.error_message = None
+        db.commit()
+        logger.info(f"Retrying backup {backup_id} to {len(destinations)} destination(s)")
+
+        # Same stages as the original run, or the artifacts would not match
+        options = parse_connection_options(database.connection_options)
+        compressor = get_compressor(
+            backup.compression_type if backup.is_compressed else None,
+            level=options.get('compression_level'),
+            threads=options.get('compression_threads')
+        )
+        encryptor = ArtifactEncryptor() if backup.is_encrypted else None
+
+        results = copy_to_destinations(
+            source_file=backup.file_path,
+            destinations=destinations,
+            project_name=database.group.name if database.group else "default",
+            database_name=database.name,
+            compressor=compressor,
+            encryptor=encryptor,
+            resume=True,
+            progress=ProgressReporter(backup_id).update
+        )
+        destination_results = dict(previous_results, **results)
+
+        final_status = determine_backup_status(destination_results)
+        backup.status = BackupStatus[final_status.upper()]
+        backup.destination_results = json.dumps(destination_results)
+        backup.checksum = backup.checksum or get_backup_checksum(destination_results)
+        if final_status != 'completed':
+            failed = [path for path, result in destination_results.items() if not result.get('success')]
+            backup.error_message = f"Copy failed for: {', '.join(failed)}"
+        else:
+            _remove_staged_dump(backup)
+        backup.completed_at = datetime.utcnow()
+        db.commit()
+        logger.info(f"Retry of backup {backup_id} finished with status: {final_status}")
+
+    except Exception as e:
+        if backup:
+            backup.status = BackupStatus.FAILED
+            backup.error_message = f"Backup retry failed: {str(e)}"
+            db.commit()
+    finally:
+        db.close()
+
+
+def fail_interrupted_backups():
+    """
+    Backups still running when their process stopped will never finish:
+    mark them failed at startup so they can be retried. Backups with a
+    queued or running job are left to the job queue.
+    """
+    db = SessionLocal()
+    try:
+        active_jobs = db.query(BackupJob.backup_id).filter(
+            BackupJob.status.in_((JobStatus.QUEUED.value, JobStatus.RUNNING.value))
+        )
+        interrupted = db.query(Backup).filter(
+            Backup.status == BackupStatus.IN_PROGRESS,
+            Backup.id.notin_(active_jobs)
+        ).all()
+        for backup in interrupted:
+            backup.status = BackupStatus.FAILED
+            backup.error_message = "Interrupted by a restart"
+            backup.parent_backup_id = None
+            backup.completed_at = datetime.utcnow()
+        db.commit()
+        if interrupted:
+            logger.warning(f"Marked {len(interrupted)} interrupted backup(s) as failed")
+    finally:
+        db.close()
+
+
+def reclaim_staging_space():
+    """
+    Remove staging leftovers of crashed runs at startup, keeping the staged
+    dumps that failed or partial backups can still be retried from.
+    """
+    db = SessionLocal()
+    try:
+        keep = [path for (path,) in db.query(Backup.file_path).filter(Backup.file_path.isnot(None))]
+    finally:
+        db.close()
+    reclaim_orphaned_staging(keep)
+
+
+def _fail_backup(db, backup: Backup, error_msg: str, destination_results: dict = None, metadata: dict = None):
+    """
+    Mark a backup as failed. A failed link is detached from its chain so it
+    never keeps the backups before it from expiring.
+    """
+    backup.status = BackupStatus.FAILED
+    backup.error_message = error_msg
+    backup.destination_results = json.dumps(destination_results) if destination_results else None
+    if metadata:
+        backup.backup_metadata = json.dumps(metadata)
+    backup.parent_backup_id = None
+    backup.completed_at = datetime.utcnow()
+    db.commit()
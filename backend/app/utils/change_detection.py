@@ -0,0 +1,208 @@
+"""
+Skip-if-unchanged: a cheap probe run before a full dump.
+
+Each engine gets a fingerprint of its write activity, saved with the
+backup (Backup.fingerprint). When the fingerprint matches the one of the
+last successful backup, nothing was written since: the run is recorded
+as an "unchanged" backup referencing the backup holding the artifact
+(parent_backup_id) instead of dumping the same data again.
+
+Probes err on the side of dumping: anything they cannot see as unchanged
+(restarts, counter resets, writes to other databases of the server) gives
+a new fingerprint.
+"""
+import os
+import json
+import hashlib
+import logging
+from typing import List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.encryption import decrypt_password
+from app.models.backup import Backup, BackupKind, BackupStatus
+from app.utils.database_connection import resolve_sqlite_path
+from app.utils.mongo_oplog import connect as connect_mongodb
+
+logger = logging.getLogger(__name__)
+
+# Probe before full dumps unless the database says otherwise ({"skip_if_unchanged": true})
+DEFAULT_SKIP_IF_UNCHANGED = os.getenv("BACKUP_SKIP_IF_UNCHANGED", "false").lower() == "true"
+
+
+def _digest(rows) -> str:
+    return hashlib.sha256(repr(rows).encode()).hexdigest()
+
+
+def _postgres_fingerprint(host, port, username, password, database_name) -> str:
+    """
+    Tuple counters of the database (catalog changes included). Counters
+    are reset with the statistics, which changes stats_reset.
+    """
+    try:
+        import psycopg2
+    except ImportError:
+        raise RuntimeError("psycopg2 library not installed. Install with: pip install psycopg2-binary")
+    connection = psycopg2.connect(host=host, port=port, user=username, password=password,
+                                  database=database_name, connect_timeout=5)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT tup_inserted, tup_updated, tup_deleted, stats_reset, pg_postmaster_start_time() "
+                "FROM pg_stat_database WHERE datname = current_database()"
+            )
+            inserted, updated, deleted, stats_reset, started = cursor.fetchone()
+        return f"pg:{inserted}:{updated}:{deleted}:{stats_reset}:{started}"
+    finally:
+        connection.close()
+
+
+def _mysql_fingerprint(host, port, username, password, database_name) -> str:
+    """
+    The executed GTID set when GTIDs are on (server wide: writes to other
+    databases count as changes), else CHECKSUM TABLE of every table plus
+    the definitions of the other schema objects. CHECKSUM TABLE reads the
+    tables but transfers and writes nothing.
+    """
+    try:
+        import pymysql
+    except ImportError:
+        raise RuntimeError("PyMySQL library not installed. Install with: pip install pymysql")
+    connection = pymysql.connect(host=host, port=port, user=username, password=password,
+                                 database=database_name, connect_timeout=5)
+    try:
+        with connection.cursor() as cursor:
+            try:
+                cursor.execute("SELECT @@GLOBAL.gtid_mode, @@GLOBAL.gtid_executed")
+                gtid_mode, gtid_executed = cursor.fetchone()
+                if gtid_mode == "ON" and gtid_executed:
+                    return f"mysql-gtid:{_digest(gtid_executed)}"
+            except pymysql.MySQLError:
+                pass  # MariaDB or GTIDs unavailable
+
+            cursor.execute(
+                "SELECT table_name, table_type, create_time FROM information_schema.tables "
+                "WHERE table_schema = %s ORDER BY table_name", (database_name,)
+            )
+            tables = cursor.fetchall()
+            cursor.execute(
+                "SELECT routine_name, last_altered FROM information_schema.routines "
+                "WHERE routine_schema = %s ORDER BY routine_name", (database_name,)
+            )
+            routines = cursor.fetchall()
+            cursor.execute(
+                "SELECT trigger_name, action_statement FROM information_schema.triggers "
+                "WHERE trigger_schema = %s ORDER BY trigger_name", (database_name,)
+            )
+            triggers = cursor.fetchall()
+
+            base_tables = [name for name, table_type, _ in tables if table_type == "BASE TABLE"]
+            checksums = ()
+            if base_tables:
+                quoted = ", ".join(
+                    f"`{database_name.replace('`', '``')}`.`{name.replace('`', '``')}`" for name in base_tables
+                )
+                cursor.execute(f"CHECKSUM TABLE {quoted}")
+                checksums = cursor.fetchall()
+        return f"mysql-checksum:{_digest((tables, routines, triggers, checksums))}"
+    finally:
+        connection.close()
+
+
+def _mongodb_fingerprint(host, port, username, password, database_name) -> str:
+    """
+    Newest write in the oplog on replica sets (server wide, no-op entries
+    excluded), else dbHash of the database (reads every collection).
+    """
+    client = connect_mongodb(host, port, username, password)
+    try:
+        oplog = client["local"]["oplog.rs"]
+        try:
+            for entry in oplog.find({"op": {"$ne": "n"}}, {"ts": 1}).sort("$natural", -1).limit(1):
+                return f"mongodb-oplog:{entry['ts'].time}:{entry['ts'].inc}"
+        except Exception:
+            pass  # Standalone server: no oplog
+        return f"mongodb-dbhash:{client[database_name].command('dbHash')['md5']}"
+    finally:
+        client.close()
+
+
+def _redis_fingerprint(host, port, username, password, database_name) -> str:
+    """Changes since the last save, the last save time and the server run id"""
+    try:
+        import redis
+    except ImportError:
+        raise RuntimeError("redis library not installed. Install with: pip install redis")
+    client = redis.Redis(host=host, port=port, username=username or None, password=password or None,
+                         socket_timeout=10)
+    try:
+        info = client.info("persistence")
+        run_id = client.info("server").get("run_id")
+        return (f"redis:{run_id}:{info.get('rdb_last_save_time')}:"
+                f"{info.get('rdb_changes_since_last_save')}")
+    finally:
+        client.close()
+
+
+def _sqlite_fingerprint(host, port, username, password, database_name) -> str:
+    """Size and modification time of the database file and its WAL"""
+    path = resolve_sqlite_path(host)
+    parts = []
+    for name in (path, f"{path}-wal"):
+        if os.path.exists(name):
+            stat = os.stat(name)
+            parts.append(f"{stat.st_size}:{stat.st_mtime_ns}")
+    return f"sqlite:{':'.join(parts)}"
+
+
+FINGERPRINT_PROBES = {
+    "postgresql": _postgres_fingerprint,
+    "mysql": _mysql_fingerprint,
+    "mongodb": _mongodb_fingerprint,
+    "redis": _redis_fingerprint,
+    "sqlite": _sqlite_fingerprint
+}
+
+
+def get_fingerprint(db_type: str, host: str, port: int, username: str,
+                    password_encrypted: str, database_name: str) -> Optional[str]:
+    """Fingerprint of the database's current state, None if it cannot be probed"""
+    probe = FINGERPRINT_PROBES.get(db_type.lower())
+    if not probe:
+        return None
+    password = decrypt_password(password_encrypted) if password_encrypted else ""
+    try:
+        return probe(host, port, username, password, database_name)
+    except Exception as e:
+        logger.warning(f"Change probe of {database_name} ({db_type}) failed, dumping it: {str(e)}")
+        return None
+
+
+def find_unchanged_reference(db: Session, backup: Backup, fingerprint: str, destinations: List,
+                             codec: Optional[str], encrypted: bool) -> Optional[Backup]:
+    """
+    The backup holding the same data, if the database is unchanged since
+    the last successful backup and that backup was stored the same way
+    (codec, encryption) on every destination of this run.
+    """
+    last = db.query(Backup).filter(
+        Backup.database_id == backup.database_id,
+        Backup.status == BackupStatus.COMPLETED,
+        Backup.backup_kind.in_((BackupKind.FULL.value, BackupKind.UNCHANGED.value)),
+        Backup.id != backup.id
+    ).order_by(Backup.id.desc()).first()
+    if not last or last.fingerprint != fingerprint:
+        return None
+
+    # Unchanged backups reference the backup with the artifact, never each other
+    reference = last.parent if last.backup_kind == BackupKind.UNCHANGED.value else last
+    if not reference or reference.status != BackupStatus.COMPLETED:
+        return None
+    if reference.compression_type != codec or bool(reference.is_encrypted) != encrypted:
+        return None
+
+    results = json.loads(reference.destination_results) if reference.destination_results else {}
+    stored = {path for path, result in results.items() if result and result.get("success")}
+    if any(dest.path not in stored for dest in destinations):
+        return None
+    return reference
@@ -0,0 +1,145 @@
+"""
+Bounded capture of dump tool stderr.
+Verbose dumps (pg_dump -v, mysqldump --verbose) print a line per table; on
+large schemas that is far too much to buffer. stderr is read line by line
+as it arrives, only the tail is kept (for the error message of a failed
+dump) and "table dumped" lines are turned into progress updates, so memory
+stays the same whatever the verbosity.
+"""
+import os
+import re
+import subprocess
+import threading
+from collections import deque
+from typing import BinaryIO, Callable, List, Optional, Tuple
+
+# stderr kept for the error message of a failed command
+STDERR_TAIL_BYTES = int(os.getenv("BACKUP_STDERR_TAIL_KB", "64")) * 1024
+
+# Longer lines are split (and kept) in pieces of this size
+MAX_LINE_BYTES = 4096
+
+# Dump tool processes running in this process, killed when the workers stop
+_running_processes = set()
+_running_lock = threading.Lock()
+
+# One line per table (or collection) dumped, with its name
+TABLE_DUMPED_PATTERNS = (
+    re.compile(rb'dumping contents of table "?([^"\s]+)"?'),  # pg_dump -v
+    re.compile(rb'Retrieving table structure for table (\S+?)\.\.\.'),  # mysqldump --verbose
+    re.compile(rb'done dumping (\S+)'),  # mongodump
+)
+
+
+class StderrTail:
+    """Ring buffer of the last lines of a stream, at most max_bytes in total"""
+
+    def __init__(self, max_bytes: int = STDERR_TAIL_BYTES):
+        self.max_bytes = max_bytes
+        self._lines = deque()
+        self._size = 0
+        self.dropped = 0
+
+    def add(self, line: bytes):
+        self._lines.append(line)
+        self._size += len(line)
+        while self._size > self.max_bytes and len(self._lines) > 1:
+            self._size -= len(self._lines.popleft())
+            self.dropped += 1
+
+    def text(self) -> str:
+        text = b"".join(self._lines).decode(errors='replace').strip()
+        if self.dropped and text:
+            text = f"[{self.dropped} earlier lines omitted]\n{text}"
+        return text
+
+
+def parse_table_dumped(line: bytes) -> Optional[str]:
+    """Name of the table a dump tool reports as dumped on this line, if any"""
+    for pattern in TABLE_DUMPED_PATTERNS:
+        match = pattern.search(line)
+        if match:
+            return match.group(1).decode(errors='replace').strip('`')
+    return None
+
+
+class StderrReader:
+    """
+    Thread draining a process's stderr into a StderrTail, so a verbose
+    command never blocks on a full pipe.
+    progress(unit="tables", done=..., table=...) is called for every table dumped.
+    """
+
+    def __init__(self, stream: BinaryIO, progress: Callable = None,
+                 max_bytes: int = STDERR_TAIL_BYTES):
+        self.stream = stream
+        self.progress = progress
+        self.tail = StderrTail(max_bytes)
+        self.tables_dumped = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> "StderrReader":
+        self._thread.start()
+        return self
+
+    def _run(self):
+        for line in iter(lambda: self.stream.readline(MAX_LINE_BYTES), b""):
+            self.tail.add(line)
+            table = parse_table_dumped(line)
+            if table is None:
+                continue
+            self.tables_dumped += 1
+            if self.progress:
+                self.progress(unit="tables", done=self.tables_dumped, table=table)
+
+    def join(self, timeout: float = 5) -> str:
+        """Wait for the end of the stream, returns the captured tail"""
+        self._thread.join(timeout=timeout)
+        return self.tail.text()
+
+
+def track_process(process: subprocess.Popen):
+    with _running_lock:
+        _running_processes.add(process)
+
+
+def untrack_process(process: subprocess.Popen):
+    with _running_lock:
+        _running_processes.discard(process)
+
+
+def kill_running_commands() -> int:
+    """Kill every dump tool process still running (worker shutdown); returns how many"""
+    with _running_lock:
+        processes = [process for process in _running_processes if process.poll() is None]
+    for process in processes:
+        try:
+            process.kill()
+        except OSError:
+            pass  # Exited meanwhile
+    return len(processes)
+
+
+def run_command(cmd: List[str], timeout: float, env: dict = None,
+                progress: Callable = None) -> Tuple[int, str, bool]:
+    """
+    Run a command writing its output to files, capturing only the tail of stderr.
+    Returns: (returncode, stderr_tail, timed_out)
+    """
+    process = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    track_process(process)
+    reader = StderrReader(process.stderr, progress).start()
+    try:
+        returncode = process.wait(timeout=timeout)
+        timed_out = False
+    except subprocess.TimeoutExpired:
+        process.kill()
+        returncode = process.wait()
+        timed_out = True
+    finally:
+        if process.poll() is None:
+            process.kill()
+        untrack_process(process)
+    stderr = reader.join()
+    process.stderr.close()
+    return returncode, stderr, timed_out
@@ -0,0 +1,282 @@
+"""
+Streaming compression stage for the backup pipeline.
+Each compressor takes blocks as they come out of the dump and returns the
+compressed bytes available so far, so dumps of any size are compressed in
+constant memory on their way to the destinations.
+Parallel codecs (pgzip, zstd) borrow their threads from the shared CPU
+budget while they run, without waiting for it.
+"""
+import bz2
+import lzma
+import os
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, Optional
+
+from app.utils.cpu_budget import WORKER_SHARE, cpu_budget
+
+COMPRESSION_NONE = "none"
+
+# Codec name -> file extension appended to the backup file
+CODEC_EXTENSIONS = {
+    "gzip": ".gz",
+    "pgzip": ".gz",  # Parallel block gzip, standard multi-member gzip output
+    "bzip2": ".bz2",
+    "xz": ".xz",
+    "zstd": ".zst",
+}
+
+DEFAULT_COMPRESSION = os.getenv("BACKUP_COMPRESSION", "pgzip")
+# Threads a parallel codec (or the encryption stage) asks the CPU budget for;
+# it gets what is free, at least one
+DEFAULT_COMPRESSION_THREADS = int(os.getenv("BACKUP_COMPRESSION_THREADS", "0")) or WORKER_SHARE
+
+# Input block size for the parallel gzip codec
+PGZIP_BLOCK_SIZE = 4 * 1024 * 1024  # 4 MiB
+
+# gzip container for zlib (16 + max window bits)
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+class Compressor:
+    """Base class: tracks bytes in/out around the codec specific _compress/_flush"""
+
+    codec = COMPRESSION_NONE
+
+    def __init__(self, level: int = None, threads: int = 1):
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.level = level
+        self.threads = threads
+        self._granted = 0
+
+    @property
+    def parameters(self) -> dict:
+        """Everything the compressed bytes depend on (resumed copies must match it)"""
+        return {"codec": self.codec, "level": self.level}
+
+    @property
+    def extension(self) -> str:
+        return CODEC_EXTENSIONS.get(self.codec, "")
+
+    @property
+    def ratio(self) -> Optional[float]:
+        """Uncompressed / compressed size, None until something was written"""
+        if not self.bytes_out:
+            return None
+        return round(self.bytes_in / self.bytes_out, 2)
+
+    def compress(self, data: bytes) -> bytes:
+        self.bytes_in += len(data)
+        out = self._compress(data)
+        self.bytes_out += len(out)
+        return out
+
+    def flush(self) -> bytes:
+        out = self._flush()
+        self.bytes_out += len(out)
+        return out
+
+    def close(self):
+        """Release resources held by the codec (safe to call more than once)"""
+        self._release_threads()
+
+    def _reserve_threads(self) -> int:
+        """Borrow the codec's threads from the CPU budget on first use; close() gives them back"""
+        if not self._granted:
+            self._granted = cpu_budget.borrow(self.threads)
+        return self._granted
+
+    def _release_threads(self):
+        if self._granted:
+            cpu_budget.release(self._granted)
+            self._granted = 0
+
+    def _compress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+    def _flush(self) -> bytes:
+        raise NotImplementedError
+
+
+class GzipCompressor(Compressor):
+    codec = "gzip"
+
+    def __init__(self, level: int = 6):
+        super().__init__(level)
+        self._obj = zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+
+    def _compress(self, data: bytes) -> bytes:
+        return self._obj.compress(data)
+
+    def _flush(self) -> bytes:
+        return self._obj.flush()
+
+
+class Bzip2Compressor(Compressor):
+    codec = "bzip2"
+
+    def __init__(self, level: int = 9):
+        super().__init__(level)
+        self._obj = bz2.BZ2Compressor(level)
+
+    def _compress(self, data: bytes) -> bytes:
+        return self._obj.compress(data)
+
+    def _flush(self) -> bytes:
+        return self._obj.flush()
+
+
+class XzCompressor(Compressor):
+    codec = "xz"
+
+    def __init__(self, level: int = 6):
+        super().__init__(level)
+        self._obj = lzma.LZMACompressor(preset=level)
+
+    def _compress(self, data: bytes) -> bytes:
+        return self._obj.compress(data)
+
+    def _flush(self) -> bytes:
+        return self._obj.flush()
+
+
+def _gzip_block(data: bytes, level: int) -> bytes:
+    """Compress one block into a complete gzip member (zlib releases the GIL)"""
+    obj = zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+    return obj.compress(data) + obj.flush()
+
+
+class ParallelGzipCompressor(Compressor):
+    """
+    Block-parallel gzip.
+    Input is cut into PGZIP_BLOCK_SIZE blocks compressed on a thread pool;
+    each block becomes a gzip member and members are emitted in order.
+    Concatenated members are a standard gzip file (gzip -d, zcat, Python gzip).
+    """
+
+    codec = "pgzip"
+
+    def __init__(self, level: int = 6, threads: int = DEFAULT_COMPRESSION_THREADS,
+                 block_size: int = PGZIP_BLOCK_SIZE):
+        super().__init__(level, threads)
+        self.block_size = block_size
+        self._max_in_flight = 0
+        self._executor = None
+        self._pending = deque()
+        self._buffer = bytearray()
+
+    @property
+    def parameters(self) -> dict:
+        # Members are cut every block_size bytes; the thread count does not change the output
+        return dict(super().parameters, block_size=self.block_size)
+
+    def _submit(self, block: bytes):
+        if self._executor is None:
+            granted = self._reserve_threads()
+            self._max_in_flight = granted * 2
+            self._executor = ThreadPoolExecutor(max_workers=granted, thread_name_prefix="pgzip")
+        self._pending.append(self._executor.submit(_gzip_block, block, self.level))
+
+    def _collect(self, wait_all: bool = False) -> bytes:
+        """Return finished blocks in order; block on the oldest when too many are in flight"""
+        out = []
+        while self._pending:
+            head = self._pending[0]
+            if not (wait_all or head.done() or len(self._pending) >= self._max_in_flight):
+                break
+            out.append(head.result())
+            self._pending.popleft()
+        return b"".join(out)
+
+    def _compress(self, data: bytes) -> bytes:
+        self._buffer += data
+        while len(self._buffer) >= self.block_size:
+            self._submit(bytes(self._buffer[:self.block_size]))
+            del self._buffer[:self.block_size]
+        return self._collect()
+
+    def _flush(self) -> bytes:
+        if self._buffer or not (self._pending or self.bytes_out):
+            # Always emit at least one member so an empty dump is still valid gzip
+            self._submit(bytes(self._buffer))
+            self._buffer = bytearray()
+        try:
+            return self._collect(wait_all=True)
+        finally:
+            self.close()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        super().close()
+
+
+class ZstdCompressor(Compressor):
+    """zstd via the `zstandard` package, with native multi-threading"""
+
+    codec = "zstd"
+
+    def __init__(self, level: int = 3, threads: int = DEFAULT_COMPRESSION_THREADS):
+        super().__init__(level, threads)
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError("zstandard library not installed. Install with: pip install zstandard")
+        self._zstandard = zstandard
+        self._obj = None
+
+    def _compressobj(self):
+        if self._obj is None:
+            self._obj = self._zstandard.ZstdCompressor(
+                level=self.level, threads=self._reserve_threads()
+            ).compressobj()
+        return self._obj
+
+    def _compress(self, data: bytes) -> bytes:
+        return self._compressobj().compress(data)
+
+    def _flush(self) -> bytes:
+        try:
+            return self._compressobj().flush()
+        finally:
+            self.close()
+
+
+def get_compressor(codec: str, level: int = None, threads: int = None) -> Optional[Compressor]:
+    """
+    Build a compressor for a codec name.
+    Returns None for "none"; raises ValueError for unknown codecs.
+    """
+    codec = (codec or COMPRESSION_NONE).lower()
+    threads = threads or DEFAULT_COMPRESSION_THREADS
+    kwargs = {"level": level} if level is not None else {}
+
+    if codec == COMPRESSION_NONE:
+        return None
+    if codec == "gzip":
+        return GzipCompressor(**kwargs)
+    if codec == "pgzip":
+        return ParallelGzipCompressor(threads=threads, **kwargs)
+    if codec == "bzip2":
+        return Bzip2Compressor(**kwargs)
+    if codec == "xz":
+        return XzCompressor(**kwargs)
+    if codec == "zstd":
+        return ZstdCompressor(threads=threads, **kwargs)
+    raise ValueError(f"Unsupported compression codec: {codec}")
+
+
+def compress_chunks(chunks: Iterable[bytes], compressor: Compressor) -> Iterator[bytes]:
+    """Pipeline stage: compress blocks as they stream through"""
+    try:
+        for chunk in chunks:
+            out = compressor.compress(chunk)
+            if out:
+                yield out
+        out = compressor.flush()
+        if out:
+            yield out
+    finally:
+        compressor.close()
@@ -0,0 +1,68 @@
+"""
+Global CPU budget shared by parallel dump, compression and encryption workers.
+Parallel dumps (pg_dump -j N) wait for worker slots of one budget, and the
+pipeline stages (pgzip, zstd, encryption) borrow what is free, so that
+several backups running at once cannot saturate the BackupManager host.
+"""
+import os
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Iterator
+
+logger = logging.getLogger(__name__)
+
+CPU_BUDGET = int(os.getenv("BACKUP_CPU_BUDGET", "0")) or (os.cpu_count() or 1)
+
+# Default share of one backup: the budget split between the BACKUP_WORKERS running at once
+WORKER_SHARE = max(CPU_BUDGET // max(int(os.getenv("BACKUP_WORKERS", "4")), 1), 1)
+
+
+class CpuBudget:
+    """Counting budget: grants up to the requested slots, waits while none are free"""
+
+    def __init__(self, total: int):
+        self.total = max(total, 1)
+        self.in_use = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, requested: int) -> int:
+        """Block until at least one slot is free; returns the number of slots granted"""
+        requested = max(1, min(requested, self.total))
+        with self._cond:
+            while self.in_use >= self.total:
+                self._cond.wait()
+            granted = min(requested, self.total - self.in_use)
+            self.in_use += granted
+            return granted
+
+    def borrow(self, requested: int) -> int:
+        """
+        Take up to the requested slots without waiting; returns the number granted.
+        At least one is always granted (even over the budget): pipeline stages
+        of a running dump must not stall behind other backups.
+        """
+        requested = max(1, min(requested, self.total))
+        with self._cond:
+            granted = max(min(requested, self.total - self.in_use), 1)
+            self.in_use += granted
+            return granted
+
+    def release(self, granted: int):
+        with self._cond:
+            self.in_use = max(self.in_use - granted, 0)
+            self._cond.notify_all()
+
+    @contextmanager
+    def reserve(self, requested: int) -> Iterator[int]:
+        """Context manager around acquire/release yielding the granted slots"""
+        granted = self.acquire(requested)
+        if granted < requested:
+            logger.info(f"CPU budget: granted {granted}/{requested} workers ({self.in_use}/{self.total} in use)")
+        try:
+            yield granted
+        finally:
+            self.release(granted)
+
+
+cpu_budget = CpuBudget(CPU_BUDGET)
@@ -90,11 +90,34 @@ def test_mongodb_connection(host: str, port: int, username: str, password: str,
         return False, f"Connection failed: {str(e)}"
 
 
+# SQLite "host" alias for BackupManager's own database
+APP_DATABASE_ALIAS = "@app"
+
+
+def resolve_sqlite_path(file_path: str) -> str:
+    """
+    SQLite database path from the host field.
+    "@app" resolves to the file behind DATABASE_URL (ValueError if that is not SQLite).
+    """
+    if file_path != APP_DATABASE_ALIAS:
+        return file_path
+
+    from sqlalchemy.engine import make_url
+    from app.core.database import DATABASE_URL
+
+    url = make_url(DATABASE_URL)
+    if url.get_backend_name() != 'sqlite' or not url.database or url.database == ':memory:':
+        raise ValueError("BackupManager's own database is not a SQLite file")
+    return os.path.abspath(url.database)
+
+
 def test_sqlite_connection(file_path: str) -> Tuple[bool, str]:
     """Test SQLite connection"""
     try:
         import sqlite3
-        
+
+        file_path = resolve_sqlite_path(file_path)
+
         # Check if file exists
         if not os.path.exists(file_path):
             return False, f"Database file not found: {file_path}"
@@ -0,0 +1,294 @@
+"""
+Content-addressed chunk store for deduplicated backup destinations.
+Artifacts are split with a content-defined chunker, every distinct chunk is
+stored once under `<destination>/.chunks/<aa>/<sha256>`, and each backup is
+a small JSON manifest listing its chunks in order. A backup still being
+written keeps its chunk list so far in a partial manifest, refreshed while
+data flows, which the garbage collector honors too.
+"""
+import hashlib
+import json
+import os
+import random
+import time
+import uuid
+import logging
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+STORAGE_MODE_FILE = "file"
+STORAGE_MODE_DEDUP = "dedup"
+STORAGE_MODES = (STORAGE_MODE_FILE, STORAGE_MODE_DEDUP)
+
+CHUNK_STORE_DIR = ".chunks"
+MANIFEST_SUFFIX = ".manifest.json"
+PARTIAL_MANIFEST_SUFFIX = MANIFEST_SUFFIX + ".partial"
+MANIFEST_VERSION = 1
+
+# Chunk sizes: cuts are searched from CDC_MIN_SIZE on (average ~ min + 64 KiB)
+# and forced at CDC_MAX_SIZE
+CDC_MIN_SIZE = 512 * 1024
+CDC_MAX_SIZE = 8 * 1024 * 1024
+
+# Unreferenced chunks younger than this are kept: they may belong to a
+# backup whose manifest is not written yet. Partial manifests older than
+# this belong to abandoned writes and protect nothing.
+GC_GRACE_SECONDS = int(os.getenv("BACKUP_DEDUP_GC_GRACE_SECONDS", "3600"))
+
+# Seconds between two saves of a partial manifest while chunks are stored
+PARTIAL_MANIFEST_INTERVAL = max(min(60, GC_GRACE_SECONDS // 4), 1)
+
+# Rolling hash parameters. Fixed seed: boundaries must be identical across
+# runs and hosts for chunks to deduplicate.
+_rng = random.Random(0x5EED)
+_BYTE_TABLE = bytes(_rng.getrandbits(8) for _ in range(256))
+_HASH_MULTIPLIER = _rng.getrandbits(128) | 1
+_HASH_WINDOW = 16  # Bytes covered by the multiplier
+_BOUNDARY = b"\x00\x00"  # ~1/65536 chance per position
+
+
+class ContentDefinedChunker:
+    """
+    Splits a byte stream into content-defined chunks, so an insertion or
+    deletion only changes the chunks around it.
+
+    The rolling hash is a polynomial hash over the last 16 bytes (each byte
+    first mapped through a random table). Multiplying the whole buffer, read
+    as a little-endian integer, by the 16-byte multiplier computes it for
+    every position in one C-level operation; byte i of the product only
+    depends on the input up to i. A chunk ends after two consecutive zero
+    hash bytes once min_size is reached, or at max_size.
+    """
+
+    def __init__(self, min_size: int = CDC_MIN_SIZE, max_size: int = CDC_MAX_SIZE):
+        self.min_size = min_size
+        self.max_size = max_size
+        self._buffer = bytearray()
+        self._next_scan = min(min_size * 2, max_size)
+
+    def feed(self, data: bytes) -> List[bytes]:
+        """Add data; returns the chunks completed by it"""
+        self._buffer += data
+        chunks = []
+        while len(self._buffer) >= self._next_scan:
+            cut = self._find_cut(force=False)
+            if cut is None:
+                # Rescan once the buffer doubled: total hashing stays <= 2x the chunk
+                self._next_scan = min(len(self._buffer) * 2, self.max_size)
+                break
+            chunks.append(self._take(cut))
+        return chunks
+
+    def finish(self) -> List[bytes]:
+        """Flush the remaining data as the last chunk(s)"""
+        chunks = []
+        while self._buffer:
+            chunks.append(self._take(self._find_cut(force=True)))
+        return chunks
+
+    def _find_cut(self, force: bool) -> Optional[int]:
+        end = min(len(self._buffer), self.max_size)
+        if end > self.min_size + len(_BOUNDARY):
+            window = self._buffer[:end].translate(_BYTE_TABLE)
+            digest = (int.from_bytes(window, 'little') * _HASH_MULTIPLIER).to_bytes(
+                end + _HASH_WINDOW + 1, 'little'
+            )
+            i = digest.find(_BOUNDARY, self.min_size, end)
+            if i != -1:
+                return i + len(_BOUNDARY)
+        if end == self.max_size or force:
+            return end
+        return None
+
+    def _take(self, cut: int) -> bytes:
+        chunk = bytes(self._buffer[:cut])
+        del self._buffer[:cut]
+        self._next_scan = min(self.min_size * 2, self.max_size)
+        return chunk
+
+
+class ChunkStore:
+    """Content-addressed chunk directory: <root>/<first two hex digits>/<sha256>"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def ensure(self):
+        os.makedirs(self.root, exist_ok=True)
+
+    def chunk_path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def put(self, chunk: bytes) -> Tuple[str, int]:
+        """
+        Store a chunk unless it is already present.
+        Returns: (sha256 hex digest, bytes actually written)
+        """
+        digest = hashlib.sha256(chunk).hexdigest()
+        path = self.chunk_path(digest)
+        if os.path.exists(path):
+            # Refresh mtime so a concurrent garbage collection keeps it
+            os.utime(path)
+            return digest, 0
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp.{uuid.uuid4().hex[:8]}"
+        with open(tmp_path, 'wb') as f:
+            f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return digest, len(chunk)
+
+    def get(self, digest: str) -> bytes:
+        """Read a chunk back, checking it against its address"""
+        with open(self.chunk_path(digest), 'rb') as f:
+            chunk = f.read()
+        if hashlib.sha256(chunk).hexdigest() != digest:
+            raise IOError(f"Chunk {digest} is corrupted")
+        return chunk
+
+
+def write_manifest(path: str, filename: str, store_root: str, chunks: List[list]):
+    """Write a manifest (fsynced) listing the chunks of one artifact in order"""
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "filename": filename,
+        "size": sum(size for _, size in chunks),
+        "chunk_store": store_root,
+        "created_at": datetime.utcnow().isoformat(),
+        "chunks": chunks
+    }
+    with open(path, 'w') as f:
+        json.dump(manifest, f)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def is_manifest(path: str) -> bool:
+    return bool(path) and path.endswith(MANIFEST_SUFFIX)
+
+
+def is_partial_manifest(path: str) -> bool:
+    return bool(path) and path.endswith(PARTIAL_MANIFEST_SUFFIX)
+
+
+def read_manifest(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def iter_manifest_data(path: str) -> Iterator[bytes]:
+    """Reassemble an artifact from its manifest, chunk by chunk"""
+    manifest = read_manifest(path)
+    store = ChunkStore(manifest["chunk_store"])
+    for digest, _ in manifest["chunks"]:
+        yield store.get(digest)
+
+
+def restore_from_manifest(path: str, output_file: str) -> int:
+    """Write the reassembled artifact to output_file; returns its size"""
+    size = 0
+    with open(output_file, 'wb') as f:
+        for chunk in iter_manifest_data(path):
+            f.write(chunk)
+            size += len(chunk)
+    return size
+
+
+def missing_chunks(path: str) -> List[str]:
+    """Digests listed in a manifest that are not in its chunk store"""
+    manifest = read_manifest(path)
+    store = ChunkStore(manifest["chunk_store"])
+    return [digest for digest, _ in manifest["chunks"] if not os.path.exists(store.chunk_path(digest))]
+
+
+def remove_backup_file(file_path: str) -> Optional[str]:
+    """
+    Delete a backup file from a destination.
+    For manifests, returns the chunk store root so the caller can run
+    collect_garbage() once all deletions are done.
+    """
+    store_root = None
+    if is_manifest(file_path):
+        try:
+            store_root = read_manifest(file_path).get("chunk_store")
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not read manifest {file_path}: {str(e)}")
+    os.remove(file_path)
+    return store_root
+
+
+def count_chunk_references(store_root: str, grace_seconds: int = GC_GRACE_SECONDS) -> Dict[str, int]:
+    """
+    Reference count of every chunk, from all manifests under the destination
+    and from the partial manifests of writes still in progress (saved within
+    grace_seconds).
+    """
+    refs = {}
+    dest_root = os.path.dirname(store_root)
+    cutoff = time.time() - grace_seconds
+    for dirpath, dirnames, filenames in os.walk(dest_root):
+        if os.path.abspath(dirpath) == os.path.abspath(store_root):
+            dirnames[:] = []
+            continue
+        for name in filenames:
+            manifest_path = os.path.join(dirpath, name)
+            if is_partial_manifest(name):
+                try:
+                    if os.stat(manifest_path).st_mtime <= cutoff:
+                        continue  # Abandoned write
+                except OSError:
+                    pass
+                if not os.path.exists(manifest_path):
+                    # Committed since the listing (or discarded): read the final manifest
+                    manifest_path = manifest_path[:-len(".partial")]
+                    if not os.path.exists(manifest_path):
+                        continue
+            elif not is_manifest(name):
+                continue
+            try:
+                manifest = read_manifest(manifest_path)
+            except (OSError, ValueError) as e:
+                # An unreadable manifest could reference anything: do not collect
+                raise IOError(f"Unreadable manifest {manifest_path}: {str(e)}")
+            if os.path.abspath(manifest.get("chunk_store", "")) != os.path.abspath(store_root):
+                continue
+            for digest, _ in manifest["chunks"]:
+                refs[digest] = refs.get(digest, 0) + 1
+    return refs
+
+
+def collect_garbage(store_root: str, grace_seconds: int = GC_GRACE_SECONDS) -> Tuple[int, int]:
+    """
+    Delete chunks no manifest references any more.
+    Returns: (chunks_deleted, bytes_freed)
+    """
+    if not os.path.isdir(store_root):
+        return 0, 0
+
+    refs = count_chunk_references(store_root, grace_seconds)
+    cutoff = time.time() - grace_seconds
+    deleted = 0
+    freed = 0
+
+    for dirpath, _, filenames in os.walk(store_root):
+        for name in filenames:
+            digest = name.split(".tmp.")[0]
+            if refs.get(digest):
+                continue
+            path = os.path.join(dirpath, name)
+            try:
+                stat = os.stat(path)
+                if stat.st_mtime > cutoff:
+                    continue
+                os.remove(path)
+                deleted += 1
+                freed += stat.st_size
+            except OSError as e:
+                logger.error(f"Error deleting chunk {path}: {str(e)}")
+
+    logger.info(f"Chunk GC in {store_root}: {deleted} chunks deleted, {freed} bytes freed")
+    return deleted, freed
@@ -0,0 +1,269 @@
+"""
+Size and duration estimates of a backup, made before it runs.
+
+Two sources are combined:
+- engine statistics: pg_database_size, information_schema table sizes
+  (MySQL), dbStats (MongoDB), INFO memory (Redis), the file size (SQLite);
+  only snapshots (full dumps, base backups) are sized from them;
+- the database's own history: previous backups of the same kind give the
+  ratio of dump size to engine size, the compression ratio and the dump
+  throughput. WAL and binlog increments are estimated from it alone.
+
+The estimate (stored as Backup.estimate) sizes the staging reservation,
+the preflight space check of the destinations and the dump timeout.
+"""
+import os
+import json
+import shutil
+import logging
+import statistics
+from typing import Dict, List, Optional
+
+from app.core.encryption import decrypt_password
+from app.models.backup import Backup, BackupKind, BackupStatus
+from app.utils.backup_executor import DUMP_TIMEOUT_SECONDS
+from app.utils.backup_pipeline import failed_result
+from app.utils.database_connection import resolve_sqlite_path
+from app.utils.dedup_store import STORAGE_MODE_DEDUP
+from app.utils.mongo_oplog import connect
+
+logger = logging.getLogger(__name__)
+
+# Previous backups of the same kind taken into account
+ESTIMATE_HISTORY = 10
+
+# Headroom on estimated sizes (staging reservations, destination space)
+SIZE_MARGIN = 1.25
+
+# Staging space reserved when nothing is known about a database
+DEFAULT_DUMP_BYTES = int(os.getenv("BACKUP_STAGING_DEFAULT_ESTIMATE_MB", "1024")) * 1024 * 1024
+
+# Dumps may take this many times their estimated duration before they are killed;
+# without history they are assumed to run at least at the minimum throughput.
+# DUMP_TIMEOUT_SECONDS is the floor, BACKUP_MAX_DUMP_TIMEOUT_HOURS the ceiling.
+TIMEOUT_FACTOR = float(os.getenv("BACKUP_TIMEOUT_FACTOR", "3"))
+MIN_DUMP_THROUGHPUT_BPS = float(os.getenv("BACKUP_MIN_DUMP_THROUGHPUT_MBPS", "5")) * 1024 * 1024
+MAX_DUMP_TIMEOUT_SECONDS = int(float(os.getenv("BACKUP_MAX_DUMP_TIMEOUT_HOURS", "24")) * 3600)
+
+# Dump size / engine size before any history: pg_dump's custom format is
+# compressed, MySQL and MongoDB dumps are close to the data size, RDB
+# files are more compact than the memory they describe
+DEFAULT_DUMP_FACTORS = {
+    "postgresql": 0.3,
+    "mysql": 1.0,
+    "mongodb": 1.0,
+    "redis": 0.5,
+    "sqlite": 1.0
+}
+
+# pg_basebackup copies the data files as they are
+BASE_DUMP_FACTOR = 1.0
+
+# Kinds whose size follows the engine statistics; increments follow the write rate
+ENGINE_SIZED_KINDS = (BackupKind.FULL.value, BackupKind.BASE.value)
+
+# Kinds run by an external tool under the estimated timeout (oplog increments are read in-process)
+ESTIMATED_KINDS = ENGINE_SIZED_KINDS + (BackupKind.WAL.value, BackupKind.BINLOG.value)
+
+
+def _postgres_size(host, port, username, password, database_name) -> int:
+    try:
+        import psycopg2
+    except ImportError:
+        raise RuntimeError("psycopg2 library not installed. Install with: pip install psycopg2-binary")
+    connection = psycopg2.connect(host=host, port=port, user=username, password=password,
+                                  database=database_name, connect_timeout=5)
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_database_size(current_database())")
+            return int(cursor.fetchone()[0])
+    finally:
+        connection.close()
+
+
+def _mysql_size(host, port, username, password, database_name) -> int:
+    try:
+        import pymysql
+    except ImportError:
+        raise RuntimeError("PyMySQL library not installed. Install with: pip install pymysql")
+    connection = pymysql.connect(host=host, port=port, user=username, password=password,
+                                 database=database_name, connect_timeout=5)
+    try:
+        with connection.cursor() as cursor:
+            # Indexes are rebuilt on restore, not dumped
+            cursor.execute(
+                "SELECT COALESCE(SUM(data_length), 0) FROM information_schema.tables WHERE table_schema = %s",
+                (database_name,)
+            )
+            return int(cursor.fetchone()[0])
+    finally:
+        connection.close()
+
+
+def _mongodb_size(host, port, username, password, database_name) -> int:
+    client = connect(host, port, username, password)
+    try:
+        # dataSize: uncompressed BSON, what mongodump writes
+        return int(client[database_name].command("dbStats")["dataSize"])
+    finally:
+        client.close()
+
+
+def _redis_size(host, port, username, password, database_name) -> int:
+    try:
+        import redis
+    except ImportError:
+        raise RuntimeError("redis library not installed. Install with: pip install redis")
+    client = redis.Redis(host=host, port=port, username=username or None, password=password or None,
+                         socket_timeout=10)
+    try:
+        info = client.info("memory")
+        return int(info.get("used_memory_dataset") or info["used_memory"])
+    finally:
+        client.close()
+
+
+def _sqlite_size(host, port, username, password, database_name) -> int:
+    return os.path.getsize(resolve_sqlite_path(host))
+
+
+ENGINE_SIZE_READERS = {
+    "postgresql": _postgres_size,
+    "mysql": _mysql_size,
+    "mongodb": _mongodb_size,
+    "redis": _redis_size,
+    "sqlite": _sqlite_size
+}
+
+
+def get_engine_size(db_type: str, host: str, port: int, username: str,
+                    password_encrypted: str, database_name: str) -> Optional[int]:
+    """Size of the data as reported by the engine, None if it cannot be read"""
+    reader = ENGINE_SIZE_READERS.get(db_type.lower())
+    if not reader:
+        return None
+    password = decrypt_password(password_encrypted) if password_encrypted else ""
+    try:
+        return reader(host, port, username, password, database_name)
+    except Exception as e:
+        logger.warning(f"Could not read the size of {database_name} from {db_type}: {str(e)}")
+        return None
+
+
+def _dump_size(backup: Backup) -> int:
+    """Dump size of a past backup: its stored size without the compression"""
+    return int(backup.file_size * (backup.compression_ratio or 1))
+
+
+def _median(values: List[float]) -> Optional[float]:
+    return statistics.median(values) if values else None
+
+
+def dump_timeout(duration_seconds: Optional[float], dump_bytes: Optional[int]) -> int:
+    """Timeout of a dump expected to take duration_seconds (or to write dump_bytes)"""
+    if duration_seconds is None and dump_bytes:
+        duration_seconds = dump_bytes / MIN_DUMP_THROUGHPUT_BPS
+    if not duration_seconds:
+        return DUMP_TIMEOUT_SECONDS
+    return int(min(max(duration_seconds * TIMEOUT_FACTOR, DUMP_TIMEOUT_SECONDS), MAX_DUMP_TIMEOUT_SECONDS))
+
+
+def estimate_backup(db, database, codec: Optional[str], backup_kind: str = BackupKind.FULL.value) -> dict:
+    """
+    Predict the next backup of a database of `backup_kind`, compressed with `codec`.
+    Returns a dict with engine_bytes, dump_bytes, compression_ratio,
+    artifact_bytes, duration_seconds, timeout_seconds and history (the
+    number of past backups used). Unknown values are None.
+    """
+    db_type = database.db_type.value
+    engine_bytes = None
+    if backup_kind in ENGINE_SIZED_KINDS:
+        engine_bytes = get_engine_size(
+            db_type, database.host, database.port, database.username,
+            database.password_encrypted, database.database_name
+        )
+
+    history = db.query(Backup).filter(
+        Backup.database_id == database.id,
+        Backup.status == BackupStatus.COMPLETED,
+        Backup.backup_kind == backup_kind,
+        Backup.file_size.isnot(None)
+    ).order_by(Backup.completed_at.desc()).limit(ESTIMATE_HISTORY).all()
+
+    # How the dump compares to what the engine reports, as measured last times
+    factors = []
+    for backup in history:
+        previous = json.loads(backup.estimate) if backup.estimate else {}
+        if previous.get("engine_bytes"):
+            factors.append(_dump_size(backup) / previous["engine_bytes"])
+    if engine_bytes is not None:
+        default_factor = BASE_DUMP_FACTOR if backup_kind == BackupKind.BASE.value else DEFAULT_DUMP_FACTORS.get(db_type, 1.0)
+        factor = _median(factors) or default_factor
+        dump_bytes = int(engine_bytes * factor)
+    elif history:
+        dump_bytes = _dump_size(history[0])
+    else:
+        dump_bytes = None
+
+    if codec:
+        compression_ratio = _median([
+            backup.compression_ratio for backup in history
+            if backup.compression_type == codec and backup.compression_ratio
+        ])
+    else:
+        compression_ratio = 1.0
+    artifact_bytes = None
+    if dump_bytes is not None:
+        # Unknown ratio: assume incompressible, the safe side for space checks
+        artifact_bytes = int(dump_bytes / (compression_ratio or 1.0))
+
+    throughput = _median([_dump_size(backup) / backup.duration_seconds
+                          for backup in history if backup.duration_seconds])
+    duration_seconds = None
+    if dump_bytes is not None and throughput:
+        duration_seconds = int(dump_bytes / throughput)
+
+    return {
+        "engine_bytes": engine_bytes,
+        "dump_bytes": dump_bytes,
+        "compression_ratio": compression_ratio,
+        "artifact_bytes": artifact_bytes,
+        "duration_seconds": duration_seconds,
+        "timeout_seconds": dump_timeout(duration_seconds, dump_bytes),
+        "history": len(history)
+    }
+
+
+def staging_bytes(estimate: Optional[dict]) -> int:
+    """Staging space to reserve for a dump with this estimate"""
+    if estimate and estimate.get("dump_bytes"):
+        return int(estimate["dump_bytes"] * SIZE_MARGIN)
+    return DEFAULT_DUMP_BYTES
+
+
+def check_destination_space(destinations: List, required_bytes: int) -> Dict[str, dict]:
+    """
+    Preflight check, before the dump starts: destinations without room
+    for the estimated artifact (plus the margin). Dedup destinations are not
+    checked: they only store the chunks they lack, unknown before the dump.
+    Returns: {destination_path: failed result} for the destinations to skip
+    """
+    required = int(required_bytes * SIZE_MARGIN)
+    results = {}
+    for destination in destinations:
+        if getattr(destination, 'storage_mode', None) == STORAGE_MODE_DEDUP:
+            continue
+        # The backup directories may not exist yet: check the closest existing parent
+        path = os.path.abspath(destination.path)
+        while not os.path.exists(path) and os.path.dirname(path) != path:
+            path = os.path.dirname(path)
+        try:
+            free = shutil.disk_usage(path).free
+        except OSError:
+            continue  # Unreachable destinations fail when they are opened
+        if free < required:
+            results[destination.path] = failed_result(
+                f"Insufficient space at {destination.path}: {required // (1024 * 1024)} MB needed, "
+                f"{free // (1024 * 1024)} MB free"
+            )
+    return results
@@ -0,0 +1,144 @@
+"""
+File copies that avoid moving bytes through user space when possible.
+Tried in order: a reflink (FICLONE, btrfs/XFS: no data is copied at all),
+an in-kernel copy_file_range (server-side copy on NFS 4.2, also same
+filesystem), sendfile, and a plain buffered copy as the last resort.
+A copy can also feed a hasher: blocks copied in the kernel are read back
+right after, while the page cache still holds them, so the source is only
+read from storage once.
+"""
+import errno
+import os
+import logging
+from typing import BinaryIO, Callable, Optional
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+COPY_METHOD_REFLINK = "reflink"
+COPY_METHOD_COPY_FILE_RANGE = "copy_file_range"
+COPY_METHOD_SENDFILE = "sendfile"
+COPY_METHOD_BUFFERED = "buffered"
+
+# ioctl request of FICLONE (linux/fs.h)
+FICLONE = 0x40049409
+
+# Bytes per copy_file_range / sendfile call
+COPY_BLOCK_SIZE = 64 * 1024 * 1024  # 64 MiB
+
+# Bytes per read when hashing what was copied
+HASH_READ_SIZE = 8 * 1024 * 1024  # 8 MiB
+
+# Errors meaning "this method is not available here", not "the copy failed"
+_UNSUPPORTED_ERRNOS = {
+    errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.ENOTTY,
+    errno.EOPNOTSUPP, errno.ENOTSUP, errno.EBADF, errno.EPERM
+}
+
+
+def _unsupported(error: OSError) -> bool:
+    return error.errno in _UNSUPPORTED_ERRNOS
+
+
+def _try_reflink(src: BinaryIO, dst: BinaryIO) -> bool:
+    if fcntl is None:
+        return False
+    try:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        return True
+    except OSError as e:
+        if _unsupported(e):
+            return False
+        raise
+
+
+def _hash_range(src: BinaryIO, hasher, start: int, end: Optional[int] = None):
+    """Feed src[start:end] (to EOF when end is None) to the hasher"""
+    position = start
+    while end is None or position < end:
+        size = HASH_READ_SIZE if end is None else min(HASH_READ_SIZE, end - position)
+        block = os.pread(src.fileno(), size, position)
+        if not block:
+            break
+        hasher.update(block)
+        position += len(block)
+
+
+def _copy_in_kernel(copy_block, src: BinaryIO, dst: BinaryIO, offset: int,
+                    progress: Callable[[int], None] = None, hasher=None) -> bool:
+    """
+    Loop a copy_file_range/sendfile style call from offset until EOF.
+    Returns False if the call is not supported before anything was copied.
+    """
+    copied = offset
+    while True:
+        try:
+            count = copy_block(src.fileno(), dst.fileno(), copied)
+        except OSError as e:
+            if copied == offset and _unsupported(e):
+                return False
+            raise
+        if count == 0:
+            return True
+        if hasher is not None:
+            _hash_range(src, hasher, copied, copied + count)
+        copied += count
+        if progress:
+            progress(copied)
+
+
+def fast_copy(src: BinaryIO, dst: BinaryIO, offset: int = 0,
+              progress: Callable[[int], None] = None, block_size: int = COPY_BLOCK_SIZE,
+              hasher=None) -> str:
+    """
+    Copy src into dst (both opened in binary mode) with the cheapest method
+    that works. dst must hold exactly the first `offset` bytes of src, with
+    its position at offset (resumed copies). progress(bytes_copied) is
+    called after every block of up to block_size bytes. A hasher is fed
+    the whole content of src, the part before offset included.
+    Returns the method used.
+    """
+    dst.flush()
+
+    if offset == 0 and _try_reflink(src, dst):
+        if hasher is not None:
+            _hash_range(src, hasher, 0)  # Nothing was read by the clone
+        return COPY_METHOD_REFLINK
+
+    if hasher is not None and offset:
+        _hash_range(src, hasher, 0, offset)
+
+    if hasattr(os, "copy_file_range"):
+        def _copy_file_range(fd_in, fd_out, position):
+            return os.copy_file_range(fd_in, fd_out, block_size, position, position)
+
+        if _copy_in_kernel(_copy_file_range, src, dst, offset, progress, hasher):
+            return COPY_METHOD_COPY_FILE_RANGE
+
+    if hasattr(os, "sendfile"):
+        def _sendfile(fd_in, fd_out, position):
+            return os.sendfile(fd_out, fd_in, position, block_size)
+
+        if _copy_in_kernel(_sendfile, src, dst, offset, progress, hasher):
+            return COPY_METHOD_SENDFILE
+
+    # Nothing was written so far: copy the rest in user space
+    src.seek(offset)
+    dst.seek(offset)
+    dst.truncate()
+    copied = offset
+    while True:
+        block = src.read(block_size)
+        if not block:
+            break
+        dst.write(block)
+        if hasher is not None:
+            hasher.update(block)
+        copied += len(block)
+        if progress:
+            progress(copied)
+    return COPY_METHOD_BUFFERED
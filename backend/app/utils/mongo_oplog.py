@@ -0,0 +1,175 @@
+"""
+MongoDB incremental backups from the oplog (replica sets only).
+The chain root is a regular full mongodump; the newest oplog timestamp is
+read just before it starts. Each increment reads the oplog entries of the
+database after the previous link's timestamp and ships them as a BSON
+stream, the format mongorestore replays.
+
+Restore: mongorestore the full dump, then for each slice in order
+`mongorestore --oplogReplay --oplogFile=<slice>.bson <empty dump dir>`
+(add --oplogLimit=<t>:<i> to stop at a point in time).
+"""
+import re
+import uuid
+import logging
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from app.core.encryption import decrypt_password
+from app.utils.backup_executor import stream_chunks_to_destinations
+from app.utils.backup_pipeline import CHUNK_SIZE
+from app.utils.backup_encryption import ArtifactEncryptor
+from app.utils.compression import Compressor
+
+logger = logging.getLogger(__name__)
+
+OPLOG_DATABASE = "local"
+OPLOG_COLLECTION = "oplog.rs"
+
+
+def connect(host: str, port: int, username: str, password: str):
+    try:
+        from pymongo import MongoClient
+    except ImportError:
+        raise RuntimeError("pymongo library not installed. Install with: pip install pymongo")
+
+    kwargs = {"serverSelectionTimeoutMS": 10000}
+    if username and password:
+        kwargs.update(username=username, password=password, authSource="admin")
+    return MongoClient(host=host, port=port, **kwargs)
+
+
+def _oplog(client):
+    from bson.codec_options import CodecOptions
+    from bson.raw_bson import RawBSONDocument
+
+    # Raw documents: entries are shipped as they are stored, never re-encoded
+    return client[OPLOG_DATABASE].get_collection(
+        OPLOG_COLLECTION, codec_options=CodecOptions(document_class=RawBSONDocument)
+    )
+
+
+def _ts_to_dict(ts) -> dict:
+    return {"t": ts.time, "i": ts.inc}
+
+
+def _ts_from_dict(value: dict):
+    from bson.timestamp import Timestamp
+    return Timestamp(value["t"], value["i"])
+
+
+def _edge_ts(client, newest: bool):
+    """Timestamp of the newest (or oldest) oplog entry, None on an empty oplog"""
+    entry = _oplog(client).find({}, {"ts": 1}).sort("$natural", -1 if newest else 1).limit(1)
+    for doc in entry:
+        return doc["ts"]
+    return None
+
+
+def get_oplog_position(host: str, port: int, username: str, password_encrypted: str,
+                       client=None) -> Tuple[bool, Optional[dict], str]:
+    """
+    Newest oplog timestamp, recorded by chain roots before the dump starts.
+    Returns: (success, {"t": ..., "i": ...}, message)
+    """
+    password = decrypt_password(password_encrypted) if password_encrypted else ""
+    own_client = client is None
+    try:
+        if own_client:
+            client = connect(host, port, username, password)
+        ts = _edge_ts(client, newest=True)
+        if ts is None:
+            return False, None, "Oplog is empty: MongoDB incremental backups need a replica set"
+        return True, _ts_to_dict(ts), "ok"
+    except Exception as e:
+        return False, None, f"Oplog not available (MongoDB incremental backups need a replica set): {str(e)}"
+    finally:
+        if own_client and client is not None:
+            client.close()
+
+
+def build_oplog_filter(database_name: str, start_ts, end_ts) -> dict:
+    """Entries of one database in (start_ts, end_ts], including its transactions"""
+    namespace = {"$regex": f"^{re.escape(database_name)}\\."}
+    return {
+        "ts": {"$gt": start_ts, "$lte": end_ts},
+        "$or": [
+            {"ns": namespace},
+            {"ns": "admin.$cmd", "o.applyOps.ns": namespace}
+        ]
+    }
+
+
+def iter_oplog_slice(cursor, stats: dict, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Concatenate raw oplog entries (a .bson stream) into pipeline blocks"""
+    buffer = bytearray()
+    for entry in cursor:
+        buffer += entry.raw
+        stats["entry_count"] += 1
+        if len(buffer) >= chunk_size:
+            yield bytes(buffer)
+            buffer = bytearray()
+    if buffer:
+        yield bytes(buffer)
+
+
+def archive_oplog_increment(host: str, port: int, username: str, password_encrypted: str,
+                            database_name: str, backup_name: str, destinations: List,
+                            project_name: str, target_database_name: str, start_position: dict,
+                            compressor: Compressor = None,
+                            encryptor: ArtifactEncryptor = None,
+                            progress: Callable = None,
+                            client=None) -> Tuple[bool, Dict[str, dict], int, str, dict]:
+    """
+    Ship the oplog entries of the database written after start_position.
+    A client can be passed in (e.g. for a local single-node replica set).
+    An idle database yields no entry: success with empty results.
+    Returns: (success, destination_results, bytes_streamed, message, metadata)
+    metadata["restart_chain"] is set when the chain cannot be continued.
+    """
+    if not start_position:
+        return False, {}, 0, "Previous backup has no oplog position, a new full dump is needed", \
+            {"restart_chain": True}
+
+    password = decrypt_password(password_encrypted) if password_encrypted else ""
+    own_client = client is None
+    try:
+        if own_client:
+            client = connect(host, port, username, password)
+        start_ts = _ts_from_dict(start_position)
+
+        # The oplog is a capped collection: a gap means entries were lost
+        oldest = _edge_ts(client, newest=False)
+        if oldest is None or oldest > start_ts:
+            return False, {}, 0, "Oplog rolled over since the previous backup, a new full dump is needed", \
+                {"restart_chain": True}
+
+        end_ts = _edge_ts(client, newest=True)
+        oplog_filter = build_oplog_filter(database_name, start_ts, end_ts)
+        if _oplog(client).find_one(oplog_filter, {"ts": 1}) is None:
+            metadata = {"oplog_ts": _ts_to_dict(end_ts), "entry_count": 0}
+            return True, {}, 0, "No new oplog entries since the previous backup", metadata
+
+        unique_id = str(uuid.uuid4())[:8]
+        filename = f"{backup_name}_{unique_id}.oplog.bson"
+        if compressor:
+            filename += compressor.extension
+
+        stats = {"entry_count": 0}
+        success, results, bytes_streamed, message = stream_chunks_to_destinations(
+            lambda: iter_oplog_slice(_oplog(client).find(oplog_filter).sort("$natural", 1), stats),
+            filename, destinations, project_name, target_database_name, compressor, encryptor, progress
+        )
+        metadata = {
+            "start_ts": start_position,
+            "end_ts": _ts_to_dict(end_ts),
+            # Archived up to here: the next link starts after this point
+            "oplog_ts": _ts_to_dict(end_ts),
+            "entry_count": stats["entry_count"]
+        }
+        return success, results, bytes_streamed, message, metadata
+
+    except Exception as e:
+        return False, {}, 0, f"Oplog backup failed: {str(e)}", {}
+    finally:
+        if own_client and client is not None:
+            client.close()
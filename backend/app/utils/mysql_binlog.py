@@ -0,0 +1,217 @@
+"""
+MySQL incremental backups from the binary log.
+The chain root is a regular full mysqldump taken with --source-data=2, which
+writes the binlog coordinates matching the dump's snapshot as a comment at
+the top of the dump. Each increment rotates the binlog, downloads the
+closed binlog files since the previous link with
+`mysqlbinlog --read-from-remote-server --raw` and ships them as one tar.
+
+Restore: load the full dump, then replay the chain with
+`mysqlbinlog --start-position=<start_position> <files...> | mysql`, adding
+--stop-datetime for a point in time.
+"""
+import os
+import re
+import shutil
+import uuid
+import logging
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.core.encryption import decrypt_password
+from app.utils.backup_executor import (
+    DUMP_TIMEOUT_SECONDS,
+    timed_out_message,
+    STAGING_DIR,
+    stream_chunks_to_destinations
+)
+from app.utils.backup_pipeline import iter_files_tar
+from app.utils.backup_encryption import ArtifactEncryptor
+from app.utils.command_output import run_command
+from app.utils.compression import Compressor
+
+logger = logging.getLogger(__name__)
+
+# mysqldump option recording the binlog coordinates as a comment
+# (MariaDB and MySQL < 8.0.26: --master-data=2)
+SOURCE_DATA_OPTION = os.getenv("BACKUP_MYSQL_SOURCE_DATA_OPTION", "--source-data=2")
+
+# The coordinates comment sits in the dump header
+COORDINATES_SCAN_BYTES = 1024 * 1024
+
+COORDINATES_RE = re.compile(
+    rb"CHANGE (?:MASTER|REPLICATION SOURCE) TO (?:MASTER|SOURCE)_LOG_FILE='([^']+)',\s*"
+    rb"(?:MASTER|SOURCE)_LOG_POS=(\d+)"
+)
+
+# Every binlog file starts with a 4 byte magic number
+BINLOG_HEADER_SIZE = 4
+
+
+def parse_binlog_coordinates(data: bytes) -> Optional[dict]:
+    """Binlog coordinates from a dump header, None if not found"""
+    match = COORDINATES_RE.search(data)
+    if not match:
+        return None
+    return {
+        "binlog_file": match.group(1).decode(),
+        "binlog_position": int(match.group(2))
+    }
+
+
+def read_file_coordinates(dump_file: str) -> Optional[dict]:
+    with open(dump_file, 'rb') as f:
+        return parse_binlog_coordinates(f.read(COORDINATES_SCAN_BYTES))
+
+
+class BinlogCoordinatesTap:
+    """Pipeline stage picking the binlog coordinates out of a streaming dump"""
+
+    def __init__(self):
+        self.coordinates = None
+        self._head = bytearray()
+
+    def __call__(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        for chunk in chunks:
+            if self.coordinates is None and len(self._head) < COORDINATES_SCAN_BYTES:
+                self._head += chunk[:COORDINATES_SCAN_BYTES]
+                self.coordinates = parse_binlog_coordinates(bytes(self._head))
+                if self.coordinates is not None:
+                    self._head = bytearray()
+            yield chunk
+
+
+def _connect(host: str, port: int, username: str, password: str, database_name: str):
+    try:
+        import pymysql
+    except ImportError:
+        raise RuntimeError("PyMySQL library not installed. Install with: pip install pymysql")
+
+    return pymysql.connect(
+        host=host,
+        port=port,
+        user=username,
+        password=password,
+        database=database_name,
+        connect_timeout=10
+    )
+
+
+def list_binary_logs(connection, rotate: bool = True) -> List[Tuple[str, int]]:
+    """
+    Binlog files on the server, oldest first, as (name, size).
+    With rotate, the current file is closed first (FLUSH BINARY LOGS) so
+    everything written so far is in a closed file.
+    """
+    with connection.cursor() as cursor:
+        if rotate:
+            try:
+                cursor.execute("FLUSH BINARY LOGS")
+            except Exception as e:
+                # Missing RELOAD privilege: the open file is archived by a later run
+                logger.warning(f"FLUSH BINARY LOGS failed: {str(e)}")
+        cursor.execute("SHOW BINARY LOGS")
+        return [(row[0], int(row[1])) for row in cursor.fetchall()]
+
+
+def select_binlog_files(logs: List[Tuple[str, int]], start_file: str,
+                        start_position: int) -> Tuple[Optional[List[Tuple[str, int]]], int]:
+    """
+    Closed binlog files holding the events after (start_file, start_position).
+    The last file on the server is still being written and is left out.
+    Returns: (files, position to replay the first file from); files is None
+    when start_file was purged and the chain cannot be continued.
+    """
+    names = [name for name, _ in logs]
+    if start_file not in names:
+        return None, 0
+
+    closed = logs[:-1]
+    files = closed[names.index(start_file):]
+    if files and files[0][0] == start_file and start_position >= files[0][1]:
+        # Already archived up to its end
+        files = files[1:]
+        start_position = BINLOG_HEADER_SIZE
+    return files, max(start_position, BINLOG_HEADER_SIZE)
+
+
+def archive_binlog_increment(host: str, port: int, username: str, password_encrypted: str,
+                             database_name: str, backup_name: str, destinations: List,
+                             project_name: str, target_database_name: str,
+                             start_file: str, start_position: int,
+                             compressor: Compressor = None,
+                             encryptor: ArtifactEncryptor = None,
+                             progress: Callable = None,
+                             timeout: float = DUMP_TIMEOUT_SECONDS) -> Tuple[bool, Dict[str, dict], int, str, dict]:
+    """
+    Ship the binlog files written since (start_file, start_position) as one tar.
+    An idle server yields no file: success with empty results.
+    Returns: (success, destination_results, bytes_streamed, message, metadata)
+    metadata["restart_chain"] is set when the chain cannot be continued.
+    """
+    password = decrypt_password(password_encrypted) if password_encrypted else ""
+
+    try:
+        connection = _connect(host, port, username, password, database_name)
+        try:
+            logs = list_binary_logs(connection)
+        finally:
+            connection.close()
+    except Exception as e:
+        return False, {}, 0, f"Binlog listing failed: {str(e)}", {}
+
+    files, replay_position = select_binlog_files(logs, start_file, start_position)
+    if files is None:
+        return False, {}, 0, f"Binlog {start_file} was purged from the server, a new full dump is needed", \
+            {"restart_chain": True}
+
+    if not files:
+        metadata = {"binlog_file": start_file, "binlog_position": start_position, "files": []}
+        return True, {}, 0, "No new binlog since the previous backup", metadata
+
+    unique_id = str(uuid.uuid4())[:8]
+    work_dir = os.path.join(STAGING_DIR, f"{backup_name}_{unique_id}.binlog")
+    os.makedirs(work_dir, exist_ok=True)
+
+    cmd = [
+        'mysqlbinlog',
+        '--read-from-remote-server',
+        '--host', host,
+        '--port', str(port),
+        '--user', username,
+        f'--password={password}',
+        '--raw',  # Binlog files as they are on the server
+        f'--result-file={work_dir}{os.sep}',  # Prefix: one file per binlog
+        *[name for name, _ in files]
+    ]
+
+    try:
+        returncode, stderr, timed_out = run_command(cmd, timeout)
+        if timed_out:
+            return False, {}, 0, timed_out_message("Binlog download", timeout), {}
+        if returncode != 0:
+            return False, {}, 0, stderr or "mysqlbinlog failed", {}
+
+        filename = f"{backup_name}_{unique_id}.binlog.tar"
+        if compressor:
+            filename += compressor.extension
+
+        members = [(os.path.join(work_dir, name), name) for name, _ in files]
+        success, results, bytes_streamed, message = stream_chunks_to_destinations(
+            lambda: iter_files_tar(members),
+            filename, destinations, project_name, target_database_name, compressor, encryptor, progress
+        )
+
+        metadata = {
+            "start_file": files[0][0],
+            "start_position": replay_position,
+            "files": [name for name, _ in files],
+            # Archived up to here: the next link starts at this point
+            "binlog_file": files[-1][0],
+            "binlog_position": files[-1][1]
+        }
+        return success, results, bytes_streamed, message, metadata
+
+    except Exception as e:
+        return False, {}, 0, f"Binlog backup failed: {str(e)}", {}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
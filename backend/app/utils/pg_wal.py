@@ -0,0 +1,285 @@
+"""
+PostgreSQL continuous archiving: base backups plus WAL increments.
+A chain starts with a `pg_basebackup` of the cluster, streamed as a tar
+into the destinations. A physical replication slot created at the same
+time makes the server retain every WAL segment from that point on; each
+increment then collects the segments written since the previous link with
+`pg_receivewal` and ships them as one small tar.
+
+The position of a chain lives in its backups' metadata, not on the worker:
+every increment receives into a fresh staging directory, seeded with an
+empty `.partial` file for the first segment not archived yet (the one
+holding the base backup's start LSN, then the one after the previous
+link's last segment). pg_receivewal starts at that file on every server
+version; on an empty directory, releases before 15 would start at the
+current position and leave a gap after the base backup.
+
+The role needs the REPLICATION attribute (and a replication entry in
+pg_hba.conf). Restore: extract the base tar, then the WAL tars of the chain
+into a directory used by restore_command.
+"""
+import os
+import re
+import shutil
+import uuid
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.core.encryption import decrypt_password
+from app.utils.backup_executor import (
+    DUMP_TIMEOUT_SECONDS,
+    timed_out_message,
+    STAGING_DIR,
+    stream_command_output,
+    stream_chunks_to_destinations
+)
+from app.utils.backup_pipeline import iter_files_tar
+from app.utils.backup_encryption import ArtifactEncryptor
+from app.utils.command_output import run_command
+from app.utils.compression import Compressor
+
+logger = logging.getLogger(__name__)
+
+WAL_SEGMENT_RE = re.compile(r"^[0-9A-F]{24}$")
+WAL_HISTORY_RE = re.compile(r"^[0-9A-F]{8}\.history$")
+
+
+def get_slot_name(database_id: int) -> str:
+    """Replication slot of a database's WAL chain"""
+    return f"backupmanager_db_{database_id}"
+
+
+def _connect(host: str, port: int, username: str, password: str, database_name: str):
+    try:
+        import psycopg2
+    except ImportError:
+        raise RuntimeError("psycopg2 library not installed. Install with: pip install psycopg2-binary")
+
+    connection = psycopg2.connect(
+        host=host,
+        port=port,
+        user=username,
+        password=password,
+        database=database_name,
+        connect_timeout=10
+    )
+    connection.autocommit = True
+    return connection
+
+
+def reset_replication_slot(connection, slot_name: str) -> str:
+    """
+    (Re)create the physical slot of a new chain, reserving WAL immediately.
+    Returns the LSN from which WAL is retained.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_replication_slots WHERE slot_name = %s", (slot_name,))
+        if cursor.fetchone():
+            cursor.execute("SELECT pg_drop_replication_slot(%s)", (slot_name,))
+        cursor.execute("SELECT lsn FROM pg_create_physical_replication_slot(%s, true)", (slot_name,))
+        return str(cursor.fetchone()[0])
+
+
+def slot_exists(connection, slot_name: str) -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_replication_slots WHERE slot_name = %s", (slot_name,))
+        return cursor.fetchone() is not None
+
+
+def switch_wal(connection) -> str:
+    """
+    Close the current WAL segment so everything written so far can be
+    archived. Returns the current LSN, used as the end position of the run.
+    """
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute("SELECT pg_switch_wal()")
+        except Exception as e:
+            # Not allowed (missing privilege, standby): the open segment is
+            # simply archived by a later run
+            logger.warning(f"pg_switch_wal() failed: {str(e)}")
+        cursor.execute("SELECT pg_current_wal_lsn()")
+        return str(cursor.fetchone()[0])
+
+
+def get_start_segment(connection, last_segment: Optional[str], start_lsn: Optional[str]) -> Tuple[str, int]:
+    """
+    First WAL segment a chain has not archived yet: the one after
+    last_segment, or (first increment) the one holding the base backup's
+    start LSN. Returns: (segment file name, wal_segment_size in bytes)
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_size_bytes(current_setting('wal_segment_size'))")
+        segment_size = int(cursor.fetchone()[0])
+        if last_segment:
+            return next_segment_name(last_segment, segment_size), segment_size
+        cursor.execute("SELECT file_name FROM pg_walfile_name_offset(%s::pg_lsn)", (start_lsn,))
+        return cursor.fetchone()[0], segment_size
+
+
+def next_segment_name(segment: str, segment_size: int) -> str:
+    """Name of the WAL segment following `segment` on the same timeline"""
+    timeline, log, seg = int(segment[:8], 16), int(segment[8:16], 16), int(segment[16:], 16)
+    per_log = 0x100000000 // segment_size
+    segno = log * per_log + seg + 1
+    return f"{timeline:08X}{segno // per_log:08X}{segno % per_log:08X}"
+
+
+def list_wal_files(wal_dir: str) -> Tuple[List[str], List[str]]:
+    """Completed WAL segments and timeline history files in a directory, sorted"""
+    if not os.path.isdir(wal_dir):
+        return [], []
+    names = sorted(os.listdir(wal_dir))
+    segments = [name for name in names if WAL_SEGMENT_RE.match(name)]
+    histories = [name for name in names if WAL_HISTORY_RE.match(name)]
+    return segments, histories
+
+
+def stream_base_backup(host: str, port: int, username: str, password_encrypted: str,
+                       database_name: str, backup_name: str, destinations: List,
+                       project_name: str, target_database_name: str, slot_name: str,
+                       compressor: Compressor = None,
+                       encryptor: ArtifactEncryptor = None,
+                       progress: Callable = None,
+                       timeout: float = DUMP_TIMEOUT_SECONDS) -> Tuple[bool, Dict[str, dict], int, str, dict]:
+    """
+    Start a new chain: reset the replication slot, then stream
+    `pg_basebackup -F t -X fetch` (whole cluster) into the destinations.
+    Returns: (success, destination_results, bytes_streamed, message, metadata)
+    """
+    password = decrypt_password(password_encrypted) if password_encrypted else ""
+
+    try:
+        connection = _connect(host, port, username, password, database_name)
+        try:
+            start_lsn = reset_replication_slot(connection, slot_name)
+        finally:
+            connection.close()
+    except Exception as e:
+        return False, {}, 0, f"Replication slot setup failed: {str(e)}", {}
+
+    unique_id = str(uuid.uuid4())[:8]
+    filename = f"{backup_name}_{unique_id}.base.tar"
+    if compressor:
+        filename += compressor.extension
+
+    env = os.environ.copy()
+    env['PGPASSWORD'] = password
+    cmd = [
+        'pg_basebackup',
+        '-h', host,
+        '-p', str(port),
+        '-U', username,
+        '-D', '-',  # Tar written to stdout
+        '-F', 't',
+        '-X', 'fetch',  # WAL needed for consistency goes into the tar
+        '-c', 'fast',
+        '-v'
+    ]
+
+    success, results, bytes_streamed, message = stream_command_output(
+        cmd, env, filename, destinations, project_name, target_database_name, compressor,
+        encryptor=encryptor, progress=progress, timeout=timeout
+    )
+    metadata = {
+        "slot_name": slot_name,
+        "start_lsn": start_lsn,
+        "last_segment": None
+    }
+    return success, results, bytes_streamed, message, metadata
+
+
+def archive_wal_increment(host: str, port: int, username: str, password_encrypted: str,
+                          database_name: str, backup_name: str, destinations: List,
+                          project_name: str, target_database_name: str, slot_name: str,
+                          last_segment: Optional[str],
+                          start_lsn: Optional[str] = None,
+                          compressor: Compressor = None,
+                          encryptor: ArtifactEncryptor = None,
+                          progress: Callable = None,
+                          timeout: float = DUMP_TIMEOUT_SECONDS) -> Tuple[bool, Dict[str, dict], int, str, dict]:
+    """
+    Receive the WAL written since the previous link through the slot and
+    ship the completed segments after last_segment as one tar.
+    start_lsn (the base backup's) positions the first increment of a chain.
+    An idle database yields no segment: success with empty results.
+    Returns: (success, destination_results, bytes_streamed, message, metadata)
+    metadata["restart_chain"] is set when the chain cannot be continued.
+    """
+    if not last_segment and not start_lsn:
+        return False, {}, 0, "WAL chain has no start position, a new base backup is needed", \
+            {"restart_chain": True}
+    password = decrypt_password(password_encrypted) if password_encrypted else ""
+
+    try:
+        connection = _connect(host, port, username, password, database_name)
+        try:
+            if not slot_exists(connection, slot_name):
+                return False, {}, 0, f"Replication slot {slot_name} is missing, a new base backup is needed", \
+                    {"restart_chain": True}
+            start_segment, segment_size = get_start_segment(connection, last_segment, start_lsn)
+            end_lsn = switch_wal(connection)
+        finally:
+            connection.close()
+    except Exception as e:
+        return False, {}, 0, f"WAL position lookup failed: {str(e)}", {}
+
+    unique_id = str(uuid.uuid4())[:8]
+    wal_dir = os.path.join(STAGING_DIR, f"{backup_name}_{unique_id}.wal")
+    os.makedirs(wal_dir, exist_ok=True)
+    try:
+        # pg_receivewal starts at the beginning of a full-size .partial segment
+        with open(os.path.join(wal_dir, f"{start_segment}.partial"), 'wb') as f:
+            f.truncate(segment_size)
+
+        env = os.environ.copy()
+        env['PGPASSWORD'] = password
+        cmd = [
+            'pg_receivewal',
+            '-h', host,
+            '-p', str(port),
+            '-U', username,
+            '-D', wal_dir,
+            '-S', slot_name,
+            '-E', end_lsn,  # Stop once everything up to now is received
+            '--synchronous',  # Flush and confirm to the slot as WAL arrives
+            '-n'  # No reconnect loop
+        ]
+
+        try:
+            returncode, stderr, timed_out = run_command(cmd, timeout, env)
+            if timed_out:
+                return False, {}, 0, timed_out_message("WAL archiving", timeout), {}
+            if returncode != 0:
+                return False, {}, 0, stderr or "pg_receivewal failed", {}
+        except Exception as e:
+            return False, {}, 0, f"WAL archiving failed: {str(e)}", {}
+
+        segments, histories = list_wal_files(wal_dir)
+        new_segments = [name for name in segments if last_segment is None or name > last_segment]
+
+        metadata = {
+            "slot_name": slot_name,
+            "start_lsn": start_lsn,
+            "end_lsn": end_lsn,
+            "first_segment": new_segments[0] if new_segments else None,
+            "last_segment": new_segments[-1] if new_segments else last_segment,
+            "segment_count": len(new_segments)
+        }
+        if not new_segments:
+            return True, {}, 0, "No new WAL since the previous backup", metadata
+
+        filename = f"{backup_name}_{unique_id}.wal.tar"
+        if compressor:
+            filename += compressor.extension
+
+        members = [(os.path.join(wal_dir, name), name) for name in histories + new_segments]
+        success, results, bytes_streamed, message = stream_chunks_to_destinations(
+            lambda: iter_files_tar(members),
+            filename, destinations, project_name, target_database_name, compressor,
+            encryptor=encryptor, progress=progress
+        )
+        return success, results, bytes_streamed, message, metadata
+    finally:
+        # Nothing is kept on the worker: the next increment may run on another node
+        shutil.rmtree(wal_dir, ignore_errors=True)
@@ -0,0 +1,55 @@
+"""
+Live progress of a running backup, stored as JSON in Backup.progress.
+Executors call update() as often as they like; writes to the database are
+throttled and go through a dedicated session so they never interfere with
+the backup task's own transaction.
+"""
+import json
+import time
+import threading
+import logging
+from datetime import datetime
+
+from app.core.database import SessionLocal
+from app.models.backup import Backup
+
+logger = logging.getLogger(__name__)
+
+# Minimum seconds between two progress writes
+PROGRESS_INTERVAL = 2.0
+
+
+class ProgressReporter:
+    """Throttled writer of Backup.progress (thread safe)"""
+
+    def __init__(self, backup_id: int, interval: float = PROGRESS_INTERVAL):
+        self.backup_id = backup_id
+        self.interval = interval
+        self.state = {}
+        self._last_write = 0.0
+        self._lock = threading.Lock()
+
+    def update(self, force: bool = False, **fields):
+        """Merge fields into the progress state, persisted at most every `interval` seconds"""
+        with self._lock:
+            self.state.update(fields)
+            now = time.monotonic()
+            if not force and now - self._last_write < self.interval:
+                return
+            self._last_write = now
+            state = dict(self.state, updated_at=datetime.utcnow().isoformat())
+        self._write(state)
+
+    def _write(self, state: dict):
+        db = SessionLocal()
+        try:
+            db.query(Backup).filter(Backup.id == self.backup_id).update(
+                {Backup.progress: json.dumps(state)}, synchronize_session=False
+            )
+            db.commit()
+        except Exception as e:
+            # Progress is informative only: never fail a backup over it
+            logger.warning(f"Could not record progress of backup {self.backup_id}: {str(e)}")
+            db.rollback()
+        finally:
+            db.close()
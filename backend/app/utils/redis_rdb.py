@@ -0,0 +1,193 @@
+"""
+Redis RDB snapshots over the replication protocol, like `redis-cli --rdb`.
+BackupManager connects as a replica, asks for the RDB only and reads the
+snapshot from the socket. With `repl-diskless-sync yes` on the server the
+forked child writes straight to the socket, so no dump.rdb is written on
+the server's disk. Servers set to disk-based sync are refused unless
+BACKUP_REDIS_ALLOW_DISK_SYNC=true, since each snapshot would then also be
+saved to their disk first.
+"""
+import os
+import socket
+import logging
+from typing import Iterator, Optional
+
+from app.core.encryption import decrypt_password
+from app.utils.backup_pipeline import CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+# While the snapshot is being prepared the server sends a newline every
+# second; this only fires on a dead connection
+REDIS_SOCKET_TIMEOUT = 60
+
+# Diskless transfers end with this many random bytes announced in $EOF:<mark>
+EOF_MARK_SIZE = 40
+
+# Accept snapshots of servers with `repl-diskless-sync no` (they write dump.rdb first)
+REDIS_ALLOW_DISK_SYNC = os.getenv("BACKUP_REDIS_ALLOW_DISK_SYNC", "false").lower() == "true"
+
+
+def _encode_command(*args) -> bytes:
+    """RESP array of bulk strings"""
+    parts = [f"*{len(args)}\r\n".encode()]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode()
+        parts.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+    return b"".join(parts)
+
+
+class _Reader:
+    """Buffered reads on the replication socket"""
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.buffer = bytearray()
+
+    def _fill(self):
+        data = self.sock.recv(CHUNK_SIZE)
+        if not data:
+            raise IOError("Connection closed by the Redis server")
+        self.buffer += data
+
+    def read_line(self) -> bytes:
+        while b"\n" not in self.buffer:
+            self._fill()
+        line, _, rest = bytes(self.buffer).partition(b"\n")
+        self.buffer = bytearray(rest)
+        return line.rstrip(b"\r")
+
+    def read_some(self, limit: int) -> bytes:
+        if not self.buffer:
+            self._fill()
+        data = bytes(self.buffer[:limit])
+        del self.buffer[:limit]
+        return data
+
+
+def _command(sock: socket.socket, reader: _Reader, *args) -> bytes:
+    sock.sendall(_encode_command(*args))
+    reply = reader.read_line()
+    if reply.startswith(b"-"):
+        raise IOError(f"{args[0]} failed: {reply[1:].decode(errors='replace')}")
+    return reply
+
+
+def _config_get(sock: socket.socket, reader: _Reader, name: str) -> Optional[str]:
+    """Value of a server setting, None if unknown or CONFIG is not allowed"""
+    sock.sendall(_encode_command("CONFIG", "GET", name))
+    reply = reader.read_line()
+    if not reply.startswith(b"*"):
+        return None  # Error: CONFIG disabled, renamed or denied by an ACL
+    items = []
+    for _ in range(int(reply[1:])):
+        reader.read_line()  # $<length>: setting names and values hold no newline
+        items.append(reader.read_line().decode(errors='replace'))
+    return dict(zip(items[::2], items[1::2])).get(name)
+
+
+def iter_rdb_snapshot(host: str, port: int, username: Optional[str], password: Optional[str],
+                      chunk_size: int = CHUNK_SIZE,
+                      allow_disk_sync: bool = REDIS_ALLOW_DISK_SYNC) -> Iterator[bytes]:
+    """
+    Yield an RDB snapshot of the whole server as it arrives.
+    Handles both transfer forms: `$<length>` (disk-based sync) and
+    `$EOF:<mark>` (diskless sync, data terminated by the mark).
+    Raises IOError before asking for the snapshot when the server is set
+    to disk-based sync, unless `allow_disk_sync`.
+    """
+    sock = socket.create_connection((host, port), timeout=REDIS_SOCKET_TIMEOUT)
+    try:
+        reader = _Reader(sock)
+        if password:
+            if username and username != "default":
+                _command(sock, reader, "AUTH", username, password)
+            else:
+                _command(sock, reader, "AUTH", password)
+
+        if not allow_disk_sync and _config_get(sock, reader, "repl-diskless-sync") == "no":
+            raise IOError(f"Redis {host}:{port} uses disk-based replication sync: a snapshot would "
+                          f"fork and write dump.rdb to its disk first. Set repl-diskless-sync yes on "
+                          f"the server, or BACKUP_REDIS_ALLOW_DISK_SYNC=true to accept it")
+
+        # Announce support for diskless transfers
+        _command(sock, reader, "REPLCONF", "capa", "eof")
+        try:
+            # Redis 7+: send the snapshot only, no replication stream after it
+            _command(sock, reader, "REPLCONF", "rdb-only", "1")
+        except IOError:
+            pass
+
+        sock.sendall(_encode_command("SYNC"))
+
+        # Newlines are keepalives sent while the snapshot is being prepared
+        header = b""
+        while not header:
+            header = reader.read_line()
+        if header.startswith(b"-"):
+            raise IOError(f"SYNC failed: {header[1:].decode(errors='replace')}")
+        if not header.startswith(b"$"):
+            raise IOError(f"Unexpected SYNC reply: {header[:64]!r}")
+
+        if header.startswith(b"$EOF:"):
+            mark = header[5:]
+            if len(mark) != EOF_MARK_SIZE:
+                raise IOError("Invalid EOF mark in SYNC reply")
+            # Hold back the last bytes until we know they are not the mark
+            tail = b""
+            while True:
+                data = tail + reader.read_some(chunk_size)
+                if data.endswith(mark):
+                    if len(data) > EOF_MARK_SIZE:
+                        yield data[:-EOF_MARK_SIZE]
+                    return
+                if len(data) > EOF_MARK_SIZE:
+                    yield data[:-EOF_MARK_SIZE]
+                tail = data[-EOF_MARK_SIZE:]
+        else:
+            remaining = int(header[1:])
+            while remaining > 0:
+                data = reader.read_some(min(chunk_size, remaining))
+                remaining -= len(data)
+                yield data
+    finally:
+        sock.close()
+
+
+def get_rdb_stats(host: str, port: int, username: Optional[str], password_encrypted: Optional[str]) -> dict:
+    """Snapshot cost as reported by the server (INFO persistence / stats)"""
+    try:
+        import redis
+    except ImportError:
+        raise RuntimeError("redis library not installed. Install with: pip install redis")
+
+    password = decrypt_password(password_encrypted) if password_encrypted else None
+
+    client = redis.Redis(
+        host=host,
+        port=port,
+        username=username or None,
+        password=password or None,
+        socket_timeout=10
+    )
+    try:
+        info = client.info("persistence")
+        info.update(client.info("stats"))
+        try:
+            # Recorded with the backup: disk-based sync (when allowed) wrote dump.rdb before sending it
+            diskless = client.config_get("repl-diskless-sync").get("repl-diskless-sync")
+            info["diskless_sync"] = diskless == "yes"
+        except Exception:
+            pass  # CONFIG may be disabled or renamed
+    finally:
+        client.close()
+
+    keys = (
+        "rdb_last_bgsave_status",
+        "rdb_last_bgsave_time_sec",
+        "rdb_last_cow_size",
+        "rdb_changes_since_last_save",
+        "latest_fork_usec",
+        "diskless_sync"
+    )
+    return {key: info.get(key) for key in keys if key in info}
@@ -0,0 +1,232 @@
+"""
+Staging areas for dumps written to local disk before they are copied
+(staged and directory dump modes).
+
+BACKUP_STAGING_DIRS lists one or more directories, each with an optional
+size limit: "/dev/shm/backups:2G,/var/backups/staging:200G". Every staged
+dump reserves its estimated size up front in the first area with room for
+it (list small fast areas such as a tmpfs first), so concurrent dumps can
+no longer fill a volume together. Dumps that do not fit anywhere wait in
+line until earlier ones release their space.
+"""
+import os
+import re
+import shutil
+import time
+import threading
+import logging
+from collections import deque
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STAGING_DIR = "/tmp/backups"
+
+# Free space left untouched on every staging volume
+STAGING_MIN_FREE_BYTES = int(os.getenv("BACKUP_STAGING_MIN_FREE_MB", "512")) * 1024 * 1024
+
+# How long a dump waits for staging space before it fails
+STAGING_WAIT_SECONDS = int(os.getenv("BACKUP_STAGING_WAIT_SECONDS", "3600"))
+
+# Free space is rechecked this often while dumps wait (other processes free disk too)
+STAGING_POLL_SECONDS = 5.0
+
+SIZE_RE = re.compile(r"^(\d+(?:\.\d+)?)\s*([KMGT]?)B?$", re.IGNORECASE)
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+# What backups write in a staging area: "<backup name>_<8 hex>" plus the dump
+# (.dump), directory dump (.dir) or WAL/binlog work dir suffix, and partial
+# copies (.partial, with their .checkpoint/.tmp side files)
+ARTIFACT_RE = re.compile(r"^.+_[0-9a-f]{8}\.(dump|dir|wal|binlog)$")
+PARTIAL_RE = re.compile(r"\.partial(\.checkpoint|\.tmp)?$")
+
+
+def parse_size(value: str) -> int:
+    """Byte count from "512M", "2G", "1.5T" or a plain number of bytes"""
+    match = SIZE_RE.match(value.strip())
+    if not match:
+        raise ValueError(f"Invalid size: {value}")
+    number, unit = match.groups()
+    return int(float(number) * SIZE_UNITS[unit.upper()])
+
+
+def path_usage(path: str) -> int:
+    """Bytes used by a file or directory tree (0 if it does not exist)"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass  # Removed while walking
+    return total
+
+
+class StagingArea:
+    """One staging directory with an optional cap on what dumps may use in it"""
+
+    def __init__(self, path: str, limit: Optional[int] = None):
+        self.path = path
+        self.limit = limit
+
+    def free_bytes(self) -> int:
+        """Space dumps could still use, not counting outstanding reservations"""
+        os.makedirs(self.path, exist_ok=True)
+        free = shutil.disk_usage(self.path).free - STAGING_MIN_FREE_BYTES
+        if self.limit:
+            free = min(free, self.limit - path_usage(self.path))
+        return max(free, 0)
+
+    def capacity(self) -> int:
+        """Largest dump the area could ever hold"""
+        os.makedirs(self.path, exist_ok=True)
+        total = shutil.disk_usage(self.path).total - STAGING_MIN_FREE_BYTES
+        return min(total, self.limit) if self.limit else total
+
+
+def parse_staging_dirs(value: str) -> List[StagingArea]:
+    areas = []
+    for entry in value.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        path, _, limit = entry.partition(":")
+        areas.append(StagingArea(path, parse_size(limit) if limit else None))
+    return areas or [StagingArea(DEFAULT_STAGING_DIR)]
+
+
+class Reservation:
+    """Space held in a staging area for one dump, written under `path`"""
+
+    def __init__(self, manager: "StagingManager", area: StagingArea, size: int, label: str):
+        self.manager = manager
+        self.area = area
+        self.size = size
+        self.label = label
+        self.paths = []
+
+    @property
+    def path(self) -> str:
+        return self.area.path
+
+    def track(self, path: str) -> str:
+        """Register the file or directory the dump writes, so its growth is accounted"""
+        self.paths.append(path)
+        return path
+
+    def remaining(self) -> int:
+        """Reserved bytes not written yet"""
+        return max(self.size - sum(path_usage(path) for path in self.paths), 0)
+
+    def release(self):
+        self.manager.release(self)
+
+
+class StagingManager:
+    """Hands out staging space in arrival order, waiting while no area has room"""
+
+    def __init__(self, areas: List[StagingArea]):
+        self.areas = areas
+        self._reservations = []
+        self._waiting = deque()
+        self._cond = threading.Condition()
+
+    @property
+    def default_dir(self) -> str:
+        return self.areas[0].path
+
+    def _available(self, area: StagingArea) -> int:
+        pending = sum(r.remaining() for r in self._reservations if r.area is area)
+        return area.free_bytes() - pending
+
+    def _find_area(self, size: int) -> Optional[StagingArea]:
+        for area in self.areas:
+            if self._available(area) >= size:
+                return area
+        return None
+
+    def reserve(self, size: int, label: str, timeout: float = STAGING_WAIT_SECONDS,
+                on_wait: Callable = None) -> Reservation:
+        """
+        Reserve `size` bytes in the first area with room for them, waiting in
+        line for at most `timeout` seconds. on_wait(queue_position=...) is called
+        once if the dump has to wait.
+        Raises RuntimeError if the space cannot be reserved.
+        """
+        if not any(area.capacity() >= size for area in self.areas):
+            raise RuntimeError(f"Estimated dump size ({size // (1024 * 1024)} MB) exceeds every staging area")
+
+        ticket = object()
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._waiting.append(ticket)
+            try:
+                notified = False
+                while True:
+                    area = self._find_area(size) if self._waiting[0] is ticket else None
+                    if area:
+                        reservation = Reservation(self, area, size, label)
+                        self._reservations.append(reservation)
+                        logger.info(f"Staging: reserved {size // (1024 * 1024)} MB in {area.path} for {label}")
+                        return reservation
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise RuntimeError(f"No staging space for {size // (1024 * 1024)} MB "
+                                           f"after waiting {int(timeout)}s")
+                    if not notified:
+                        position = self._waiting.index(ticket) + 1
+                        logger.info(f"Staging: {label} waiting for {size // (1024 * 1024)} MB "
+                                    f"(position {position} in line)")
+                        if on_wait:
+                            on_wait(queue_position=position)
+                        notified = True
+                    self._cond.wait(min(STAGING_POLL_SECONDS, remaining))
+            finally:
+                self._waiting.remove(ticket)
+                self._cond.notify_all()
+
+    def release(self, reservation: Reservation):
+        with self._cond:
+            if reservation in self._reservations:
+                self._reservations.remove(reservation)
+                self._cond.notify_all()
+
+
+staging = StagingManager(parse_staging_dirs(os.getenv("BACKUP_STAGING_DIRS", DEFAULT_STAGING_DIR)))
+
+
+def is_staging_artifact(name: str) -> bool:
+    """Whether a staging directory entry was written by a backup run"""
+    return bool(ARTIFACT_RE.match(name) or PARTIAL_RE.search(name))
+
+
+def reclaim_orphaned_staging(keep: List[str]):
+    """
+    Remove what crashed runs left in the staging areas: backup artifacts
+    and partial files, except the paths in `keep` (staged dumps of backups
+    that can still be retried). Anything else in the directory is not ours
+    and is left alone.
+    """
+    keep = {os.path.abspath(path) for path in keep if path}
+    reclaimed = 0
+    for area in staging.areas:
+        if not os.path.isdir(area.path):
+            continue
+        for name in os.listdir(area.path):
+            path = os.path.abspath(os.path.join(area.path, name))
+            if path in keep or not is_staging_artifact(name):
+                continue
+            try:
+                size = path_usage(path)
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+                reclaimed += size
+                logger.info(f"Staging: removed orphaned {path}")
+            except OSError as e:
+                logger.warning(f"Staging: could not remove orphaned {path}: {str(e)}")
+    if reclaimed:
+        logger.warning(f"Staging: reclaimed {reclaimed // (1024 * 1024)} MB left by interrupted backups")
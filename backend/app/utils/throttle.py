@@ -0,0 +1,112 @@
+"""
+Token-bucket bandwidth limits for destination writes.
+Each destination can have its own limit (DatabaseDestination.rate_limit_bps,
+optional burst_bytes); BACKUP_GLOBAL_RATE_LIMIT_MBPS caps the sum of all
+destination writes of the process on top of that.
+"""
+import os
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+# Process-wide cap in MB/s across every destination write (0 = unlimited)
+GLOBAL_RATE_LIMIT_BPS = int(float(os.getenv("BACKUP_GLOBAL_RATE_LIMIT_MBPS", "0")) * 1024 * 1024)
+
+# Window over which the effective rate is measured
+RATE_WINDOW_SECONDS = 5.0
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` bytes per second, up to `burst` bytes
+    at once after an idle period. A request larger than what is available
+    takes the bucket into debt and sleeps it off, so callers writing big
+    blocks still get the configured average rate.
+    """
+
+    def __init__(self, rate: int, burst: Optional[int] = None):
+        self.rate = rate
+        self.burst = burst or rate  # Default: one second worth of data
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount: int):
+        """Take `amount` bytes worth of tokens, sleeping until they are available"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class RateMeter:
+    """Bytes per second over the last RATE_WINDOW_SECONDS"""
+
+    def __init__(self, window: float = RATE_WINDOW_SECONDS):
+        self.window = window
+        self._samples = deque()
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def record(self, amount: int):
+        now = time.monotonic()
+        with self._lock:
+            self._samples.append((now, amount))
+            self._total += amount
+            self._expire(now)
+
+    def _expire(self, now: float):
+        while self._samples and now - self._samples[0][0] > self.window:
+            self._total -= self._samples.popleft()[1]
+
+    @property
+    def rate(self) -> int:
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if not self._samples:
+                return 0
+            elapsed = max(now - self._samples[0][0], 1.0)
+            return int(self._total / elapsed)
+
+
+global_bucket = TokenBucket(GLOBAL_RATE_LIMIT_BPS) if GLOBAL_RATE_LIMIT_BPS > 0 else None
+
+
+class Throttle:
+    """Limits applying to one destination write: its own bucket plus the global one"""
+
+    def __init__(self, rate_limit_bps: Optional[int] = None, burst_bytes: Optional[int] = None):
+        self.rate_limit_bps = rate_limit_bps or None
+        self._bucket = TokenBucket(rate_limit_bps, burst_bytes) if rate_limit_bps else None
+        self.meter = RateMeter()
+
+    @property
+    def limited(self) -> bool:
+        return self._bucket is not None or global_bucket is not None
+
+    @property
+    def block_size(self) -> Optional[int]:
+        """Largest write that keeps bursts within the limits (None when unlimited)"""
+        sizes = [bucket.burst for bucket in (self._bucket, global_bucket) if bucket]
+        return min(sizes) if sizes else None
+
+    def wait(self, amount: int):
+        """Account for `amount` bytes about to be written, sleeping as the limits require"""
+        if self._bucket:
+            self._bucket.consume(amount)
+        if global_bucket:
+            global_bucket.consume(amount)
+        self.meter.record(amount)
+
+    def status(self) -> dict:
+        return {
+            "rate_bps": self.meter.rate,
+            "rate_limit_bps": self.rate_limit_bps,
+            "global_rate_limit_bps": GLOBAL_RATE_LIMIT_BPS or None
+        }
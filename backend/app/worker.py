@@ -0,0 +1,46 @@
+"""
+Standalone backup worker: python -m app.worker
+
+Runs the job queue workers (dumps, copies, retention) in their own
+process, so backups neither slow down nor crash the API. The API must run
+with BACKUP_WORKER_MODE=external and point at the same app database
+(DATABASE_URL): it queues jobs, the worker claims and runs them. Several
+workers, on one host or many, can share a PostgreSQL app database; give
+each a BACKUP_WORKER_NAME and, if it cannot reach every destination,
+BACKUP_WORKER_DESTINATIONS.
+"""
+import signal
+import logging
+import threading
+
+from app.core.database import init_db
+from app.core.job_queue import start_workers, stop_workers
+from app.core.worker_nodes import NODE_NAME
+
+logger = logging.getLogger(__name__)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    logger.info(f"Starting BackupManager worker {NODE_NAME}...")
+    init_db()
+
+    stopping = threading.Event()
+
+    def _stop(signum, frame):
+        logger.info(f"Received signal {signum}, stopping")
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    start_workers()
+    while not stopping.wait(1):
+        pass
+    # Backups still running die with the process: their jobs are handed back now
+    stop_workers()
+    logger.info("Worker stopped")
+
+
+if __name__ == "__main__":
+    main()
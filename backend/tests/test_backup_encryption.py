@@ -0,0 +1,136 @@
+import os
+
+import pytest
+
+from app.utils.backup_encryption import (
+    HEADER_SIZE,
+    TAG_SIZE,
+    ArtifactEncryptor,
+    EncryptedFile,
+    decrypt_chunks,
+    encrypt_chunks,
+    parse_byte_range,
+)
+
+CHUNK_SIZE = 1024
+
+
+def _encrypt(data: bytes, piece: int = 700) -> bytes:
+    pieces = [data[i:i + piece] for i in range(0, len(data), piece)]
+    return b"".join(encrypt_chunks(pieces, ArtifactEncryptor(threads=2, chunk_size=CHUNK_SIZE)))
+
+
+def _write(tmp_path, encrypted: bytes) -> str:
+    path = str(tmp_path / "backup.dump.enc")
+    with open(path, "wb") as f:
+        f.write(encrypted)
+    return path
+
+
+@pytest.mark.parametrize("size", [0, 1, CHUNK_SIZE, 3 * CHUNK_SIZE, 3 * CHUNK_SIZE + 17])
+def test_round_trip(size):
+    data = os.urandom(size)
+    encrypted = _encrypt(data)
+
+    # Stream decryption, with the ciphertext split at arbitrary points
+    pieces = [encrypted[i:i + 333] for i in range(0, len(encrypted), 333)]
+    assert b"".join(decrypt_chunks(pieces)) == data
+
+
+def test_tampered_chunk_is_rejected(tmp_path):
+    data = os.urandom(3 * CHUNK_SIZE)
+    encrypted = bytearray(_encrypt(data))
+    encrypted[HEADER_SIZE + CHUNK_SIZE + TAG_SIZE + 5] ^= 1
+
+    with pytest.raises(ValueError, match="chunk 1"):
+        b"".join(decrypt_chunks([bytes(encrypted)]))
+
+    encrypted_file = EncryptedFile(_write(tmp_path, bytes(encrypted)))
+    try:
+        # Ranges not covering the tampered chunk still decrypt
+        assert b"".join(encrypted_file.iter_range(0, CHUNK_SIZE)) == data[:CHUNK_SIZE]
+        with pytest.raises(ValueError, match="chunk 1"):
+            b"".join(encrypted_file.iter_range(CHUNK_SIZE, 2 * CHUNK_SIZE))
+    finally:
+        encrypted_file.close()
+
+
+def test_tampered_header_is_rejected():
+    encrypted = bytearray(_encrypt(os.urandom(100)))
+    encrypted[10] ^= 1  # Chunk size field, authenticated with every chunk
+
+    with pytest.raises(ValueError):
+        b"".join(decrypt_chunks([bytes(encrypted)]))
+
+
+@pytest.mark.parametrize("cut", [
+    100 + TAG_SIZE,  # Short last chunk dropped: ends at a chunk boundary
+    5,               # Last chunk cut in the middle
+])
+def test_truncation_is_detected(tmp_path, cut):
+    truncated = _encrypt(os.urandom(2 * CHUNK_SIZE + 100))[:-cut]
+
+    with pytest.raises(ValueError, match="corrupted or truncated"):
+        b"".join(decrypt_chunks([truncated]))
+
+    encrypted_file = EncryptedFile(_write(tmp_path, truncated))
+    try:
+        with pytest.raises(ValueError):
+            b"".join(encrypted_file.iter_range())
+    finally:
+        encrypted_file.close()
+
+
+def test_truncated_header_is_rejected():
+    encrypted = _encrypt(b"data")
+
+    with pytest.raises(ValueError, match="header too short"):
+        b"".join(decrypt_chunks([encrypted[:HEADER_SIZE - 1]]))
+
+
+@pytest.mark.parametrize("start,end", [
+    (0, None),
+    (0, 1),
+    (CHUNK_SIZE - 1, CHUNK_SIZE + 1),  # Across a chunk boundary
+    (CHUNK_SIZE, 2 * CHUNK_SIZE),       # Exactly one chunk
+    (100, 3 * CHUNK_SIZE + 50),         # Several chunks, partial at both ends
+    (3 * CHUNK_SIZE, None),             # Only the short last chunk
+    (3 * CHUNK_SIZE + 10, 10 ** 9),     # End past the size is clamped
+    (50, 50),                           # Empty range
+])
+def test_iter_range(tmp_path, start, end):
+    data = os.urandom(3 * CHUNK_SIZE + 100)
+    encrypted_file = EncryptedFile(_write(tmp_path, _encrypt(data)))
+    try:
+        assert encrypted_file.size == len(data)
+        assert encrypted_file.chunk_count == 4
+        assert b"".join(encrypted_file.iter_range(start, end)) == data[start:end]
+    finally:
+        encrypted_file.close()
+
+
+@pytest.mark.parametrize("header,expected", [
+    (None, None),
+    ("", None),
+    ("bytes=0-99", (0, 100)),
+    ("bytes=100-", (100, 1000)),
+    ("bytes=900-5000", (900, 1000)),  # Last byte past the end is clamped
+    ("bytes=-100", (900, 1000)),      # Suffix range
+    ("bytes=-5000", (0, 1000)),
+    (" bytes=0-0 ", (0, 1)),
+])
+def test_parse_byte_range(header, expected):
+    assert parse_byte_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", [
+    "bytes=1000-",      # Starts at the end
+    "bytes=500-100",    # Reversed
+    "bytes=-",
+    "bytes=0-10,20-30", # Multi-part
+    "items=0-10",
+    "bytes=-0",
+])
+def test_parse_byte_range_rejects(header):
+    with pytest.raises(ValueError):
+        parse_byte_range(header, 1000)
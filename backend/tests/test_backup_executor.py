@@ -0,0 +1,91 @@
+import gzip
+import json
+import os
+from types import SimpleNamespace
+
+from app.utils import backup_pipeline
+from app.utils.backup_encryption import HEADER_SIZE, ArtifactEncryptor, decrypt_chunks
+from app.utils.backup_executor import copy_to_destinations
+from app.utils.compression import get_compressor
+
+
+def _leave_interrupted_copy(partial_file: str, data: bytes, info: dict):
+    """What a failed run leaves behind: a partial file and its checkpoint"""
+    with open(partial_file, "wb") as f:
+        f.write(data)
+    with open(partial_file + backup_pipeline.CHECKPOINT_SUFFIX, "w") as f:
+        json.dump(dict(info, offset=len(data)), f)
+
+
+def test_copy_resumes_from_checkpoint(tmp_path):
+    source = tmp_path / "app.sql"
+    source.write_bytes(b"x" * 4 * 1024 * 1024)
+    destination = SimpleNamespace(path=str(tmp_path / "dest"))
+    target = tmp_path / "dest" / "proj" / "app" / "app.sql"
+    target.parent.mkdir(parents=True)
+    stat = os.stat(source)
+    _leave_interrupted_copy(
+        str(target) + backup_pipeline.PARTIAL_SUFFIX, b"x" * 1024 * 1024,
+        {"source_size": stat.st_size, "source_mtime_ns": stat.st_mtime_ns, "compression": None}
+    )
+
+    results = copy_to_destinations(str(source), [destination], "proj", "app", resume=True)
+
+    result = results[destination.path]
+    assert result["success"], result
+    assert result["resumed_from_mb"] == 1.0
+    assert target.read_bytes() == b"x" * 4 * 1024 * 1024
+
+
+def test_copy_restarts_when_the_compression_level_changed(tmp_path):
+    """A partial file written at another level is not continued with different bytes"""
+    source = tmp_path / "app.sql"
+    source.write_bytes(b"row\n" * 1024 * 1024)
+    destination = SimpleNamespace(path=str(tmp_path / "dest"))
+    target = tmp_path / "dest" / "proj" / "app" / "app.sql.gz"
+    target.parent.mkdir(parents=True)
+    stat = os.stat(source)
+    _leave_interrupted_copy(
+        str(target) + backup_pipeline.PARTIAL_SUFFIX, b"\x1f\x8b" + b"?" * 1024 * 1024,
+        {"source_size": stat.st_size, "source_mtime_ns": stat.st_mtime_ns,
+         "compression": get_compressor("pgzip", level=1).parameters}
+    )
+
+    results = copy_to_destinations(str(source), [destination], "proj", "app",
+                                   compressor=get_compressor("pgzip", level=9), resume=True)
+
+    result = results[destination.path]
+    assert result["success"], result
+    assert "resumed_from_mb" not in result
+    assert gzip.decompress(target.read_bytes()) == b"row\n" * 1024 * 1024
+
+
+def test_encrypted_copy_starts_over_with_fresh_key(tmp_path):
+    """Resuming under the earlier run's data key would reuse its nonces"""
+    source = tmp_path / "app.sql"
+    source.write_bytes(b"new contents" * 1000)
+    destination = SimpleNamespace(path=str(tmp_path / "dest"))
+    target = tmp_path / "dest" / "proj" / "app" / "app.sql.enc"
+    target.parent.mkdir(parents=True)
+
+    # An earlier run encrypted different contents of the same path
+    earlier = ArtifactEncryptor()
+    earlier_data = earlier.encrypt(b"old contents" * 1000) + earlier.flush()
+    stat = os.stat(source)
+    _leave_interrupted_copy(
+        str(target) + backup_pipeline.PARTIAL_SUFFIX, earlier_data[:HEADER_SIZE + 64],
+        {"source_size": stat.st_size, "source_mtime_ns": stat.st_mtime_ns, "codec": None,
+         "header": earlier.header.hex()}
+    )
+
+    encryptor = ArtifactEncryptor()
+    results = copy_to_destinations(str(source), [destination], "proj", "app",
+                                   encryptor=encryptor, resume=True)
+
+    result = results[destination.path]
+    assert result["success"], result
+    assert "resumed_from_mb" not in result
+    data = target.read_bytes()
+    assert data[:HEADER_SIZE] == encryptor.header != earlier.header
+    assert b"".join(decrypt_chunks([data])) == b"new contents" * 1000
+    assert not os.path.exists(str(target) + backup_pipeline.PARTIAL_SUFFIX + backup_pipeline.CHECKPOINT_SUFFIX)
@@ -0,0 +1,47 @@
+import gzip
+
+from app.utils import compression
+from app.utils.cpu_budget import CpuBudget
+
+
+def test_pgzip_threads_come_from_cpu_budget(monkeypatch):
+    """A compressor gets the free part of the budget while it runs and gives it back"""
+    budget = CpuBudget(4)
+    monkeypatch.setattr(compression, "cpu_budget", budget)
+    held = budget.acquire(3)  # Another backup's parallel dump
+    blocks = [bytes([i]) * compression.PGZIP_BLOCK_SIZE for i in range(8)]
+    in_use = []
+
+    def source():
+        for block in blocks:
+            in_use.append(budget.in_use)
+            yield block
+
+    compressor = compression.get_compressor("pgzip", threads=8)
+    data = b"".join(compression.compress_chunks(source(), compressor))
+
+    assert gzip.decompress(data) == b"".join(blocks)
+    assert max(in_use) == budget.total
+    assert budget.in_use == held
+
+
+def test_compressor_never_waits_for_a_full_budget(monkeypatch):
+    """Another backup holding every slot leaves the compressor one thread instead of blocking it"""
+    budget = CpuBudget(4)
+    monkeypatch.setattr(compression, "cpu_budget", budget)
+    held = budget.acquire(4)
+    in_use = []
+
+    def source():
+        for i in range(4):
+            in_use.append(budget.in_use)
+            yield bytes([i]) * compression.PGZIP_BLOCK_SIZE
+
+    first = compression.get_compressor("pgzip")
+    second = compression.get_compressor("pgzip")
+    data = b"".join(compression.compress_chunks(source(), first))
+    data += b"".join(compression.compress_chunks(source(), second))
+
+    assert len(gzip.decompress(data)) == 8 * compression.PGZIP_BLOCK_SIZE
+    assert max(in_use) == budget.total + 1
+    assert budget.in_use == held
@@ -0,0 +1,126 @@
+import os
+import random
+import time
+
+from app.utils import backup_pipeline, dedup_store
+from app.utils.backup_pipeline import DedupDestinationWriter
+from app.utils.dedup_store import ChunkStore, ContentDefinedChunker, collect_garbage, write_manifest
+
+
+def _random_bytes(size: int, seed: int = 1) -> bytes:
+    return random.Random(seed).randbytes(size)
+
+
+def _chunk(data: bytes, feed_size: int = 100_000) -> list:
+    chunker = ContentDefinedChunker(min_size=4096, max_size=65536)
+    chunks = []
+    for i in range(0, len(data), feed_size):
+        chunks += chunker.feed(data[i:i + feed_size])
+    return chunks + chunker.finish()
+
+
+def _age(path: str, seconds: int):
+    past = time.time() - seconds
+    os.utime(path, (past, past))
+
+
+def test_chunker_boundaries_are_deterministic():
+    data = _random_bytes(1_000_000)
+    chunks = _chunk(data)
+
+    assert b"".join(chunks) == data
+    assert all(4096 <= len(chunk) <= 65536 for chunk in chunks[:-1])
+    # Boundaries do not depend on how the stream is fed
+    assert _chunk(data, feed_size=7_919) == chunks
+
+
+def test_chunker_insertion_only_changes_nearby_chunks():
+    data = _random_bytes(1_000_000)
+    edited = data[:500_000] + b"inserted row" + data[500_000:]
+
+    before = set(_chunk(data))
+    after = _chunk(edited)
+
+    changed = [chunk for chunk in after if chunk not in before]
+    assert len(changed) <= 2
+    assert sum(len(chunk) for chunk in changed) < 3 * 65536
+
+
+def test_manifest_reassembles_the_artifact(tmp_path):
+    data = _random_bytes(300_000)
+    target = tmp_path / "dest" / "proj" / "app" / "app.sql"
+    target.parent.mkdir(parents=True)
+
+    writer = DedupDestinationWriter(str(tmp_path / "dest"), str(target))
+    writer.chunker = ContentDefinedChunker(min_size=4096, max_size=65536)
+    writer.open()
+    for i in range(0, len(data), 50_000):
+        writer.write(data[i:i + 50_000])
+    result = writer.commit()
+
+    manifest_path = str(target) + dedup_store.MANIFEST_SUFFIX
+    assert result["file_path"] == manifest_path
+    assert b"".join(dedup_store.iter_manifest_data(manifest_path)) == data
+    assert dedup_store.missing_chunks(manifest_path) == []
+    assert not os.path.exists(writer.partial_file)
+
+    # The same data again stores no new chunk
+    again = DedupDestinationWriter(str(tmp_path / "dest"), str(tmp_path / "dest" / "proj" / "app" / "copy.sql"))
+    again.chunker = ContentDefinedChunker(min_size=4096, max_size=65536)
+    again.open()
+    again.write(data)
+    again.commit()
+    assert again.stored_bytes == 0
+
+
+def test_collect_garbage_keeps_referenced_and_young_chunks(tmp_path):
+    store = ChunkStore(str(tmp_path / dedup_store.CHUNK_STORE_DIR))
+    store.ensure()
+    kept, _ = store.put(b"referenced")
+    young, _ = store.put(b"written a moment ago")
+    old, _ = store.put(b"deleted backup")
+    for digest in (kept, old):
+        _age(store.chunk_path(digest), 7200)
+    write_manifest(str(tmp_path / "app.sql") + dedup_store.MANIFEST_SUFFIX, "app.sql", store.root,
+                   [[kept, len(b"referenced")]])
+
+    deleted, freed = collect_garbage(store.root, grace_seconds=3600)
+
+    assert (deleted, freed) == (1, len(b"deleted backup"))
+    assert os.path.exists(store.chunk_path(kept))
+    assert os.path.exists(store.chunk_path(young))
+    assert not os.path.exists(store.chunk_path(old))
+
+
+def test_collect_garbage_keeps_chunks_of_a_write_in_progress(tmp_path, monkeypatch):
+    """A backup running past the grace period keeps its early chunks through its partial manifest"""
+    monkeypatch.setattr(backup_pipeline, "PARTIAL_MANIFEST_INTERVAL", 0)
+    target = tmp_path / "proj" / "app" / "app.sql"
+    target.parent.mkdir(parents=True)
+    writer = DedupDestinationWriter(str(tmp_path), str(target))
+    writer.chunker = ContentDefinedChunker(min_size=4096, max_size=65536)
+    writer.open()
+    writer.write(_random_bytes(200_000))
+    assert writer.chunks
+
+    # The chunks were stored over an hour ago
+    for digest, _ in writer.chunks:
+        _age(writer.store.chunk_path(digest), 7200)
+
+    assert collect_garbage(writer.store.root, grace_seconds=3600) == (0, 0)
+
+    writer.write(_random_bytes(100_000, seed=2))
+    writer.commit()
+    assert dedup_store.missing_chunks(str(target) + dedup_store.MANIFEST_SUFFIX) == []
+
+
+def test_collect_garbage_ignores_abandoned_partial_manifests(tmp_path):
+    store = ChunkStore(str(tmp_path / dedup_store.CHUNK_STORE_DIR))
+    store.ensure()
+    digest, _ = store.put(b"crashed backup")
+    _age(store.chunk_path(digest), 7200)
+    partial = str(tmp_path / "app.sql") + dedup_store.PARTIAL_MANIFEST_SUFFIX
+    write_manifest(partial, "app.sql", store.root, [[digest, len(b"crashed backup")]])
+    _age(partial, 7200)
+
+    assert collect_garbage(store.root, grace_seconds=3600) == (1, len(b"crashed backup"))
@@ -0,0 +1,46 @@
+from collections import namedtuple
+from types import SimpleNamespace
+
+from app.utils import backup_pipeline, estimator
+from app.utils.backup_pipeline import open_destination_writers
+from app.utils.estimator import check_destination_space, dump_timeout
+
+DiskUsage = namedtuple("DiskUsage", "total used free")
+
+
+def _nearly_full(monkeypatch):
+    usage = lambda path: DiskUsage(100 * 2**30, 99 * 2**30, 2**30)  # 1 GB free
+    monkeypatch.setattr(estimator.shutil, "disk_usage", usage)
+    monkeypatch.setattr(backup_pipeline.shutil, "disk_usage", usage)
+
+
+def test_space_check_skips_full_file_destinations_only(tmp_path, monkeypatch):
+    _nearly_full(monkeypatch)
+    plain = SimpleNamespace(path=str(tmp_path / "plain"), storage_mode="file")
+    dedup = SimpleNamespace(path=str(tmp_path / "dedup"), storage_mode="dedup")
+
+    results = check_destination_space([plain, dedup], 10 * 2**30)
+
+    assert list(results) == [plain.path]
+    assert not results[plain.path]["success"]
+
+
+def test_dedup_writer_opens_on_a_nearly_full_destination(tmp_path, monkeypatch):
+    _nearly_full(monkeypatch)
+    plain = SimpleNamespace(path=str(tmp_path / "plain"), storage_mode="file")
+    dedup = SimpleNamespace(path=str(tmp_path / "dedup"), storage_mode="dedup")
+
+    writers, results = open_destination_writers(
+        [plain, dedup], "proj", "app", "app.sql", required_bytes=10 * 2**30
+    )
+
+    assert [writer.dest_path for writer in writers] == [dedup.path]
+    assert results[plain.path]["error"] == f"Insufficient space at {plain.path}"
+    for writer in writers:
+        writer.abort("test done")
+
+
+def test_dump_timeout_scales_with_the_estimate():
+    assert dump_timeout(None, None) == estimator.DUMP_TIMEOUT_SECONDS
+    assert dump_timeout(4 * 3600, None) == min(4 * 3600 * estimator.TIMEOUT_FACTOR, estimator.MAX_DUMP_TIMEOUT_SECONDS)
+    assert dump_timeout(10 ** 9, None) == estimator.MAX_DUMP_TIMEOUT_SECONDS
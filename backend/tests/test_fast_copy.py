@@ -0,0 +1,49 @@
+import hashlib
+import os
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from app.utils import backup_executor
+from app.utils.backup_executor import copy_to_destinations
+from app.utils.fast_copy import fast_copy
+
+DATA = random.Random(3).randbytes(3 * 1024 * 1024 + 17)
+
+
+@pytest.mark.parametrize("disabled", [(), ("copy_file_range",), ("copy_file_range", "sendfile")])
+@pytest.mark.parametrize("offset", [0, 1024 * 1024])
+def test_fast_copy_hashes_the_whole_source(tmp_path, monkeypatch, disabled, offset):
+    for name in disabled:
+        monkeypatch.delattr(os, name, raising=False)
+    source = tmp_path / "source"
+    source.write_bytes(DATA)
+    target = tmp_path / "target"
+    target.write_bytes(DATA[:offset])
+    hasher = hashlib.sha256()
+
+    with open(source, "rb") as src, open(target, "r+b") as dst:
+        dst.seek(offset)
+        fast_copy(src, dst, offset, block_size=1024 * 1024, hasher=hasher)
+
+    assert target.read_bytes() == DATA
+    assert hasher.hexdigest() == hashlib.sha256(DATA).hexdigest()
+
+
+def test_copy_to_destinations_reads_the_source_once_for_its_checksum(tmp_path, monkeypatch):
+    def _second_read(path):
+        raise AssertionError("source read again for its checksum")
+
+    monkeypatch.setattr(backup_executor, "checksum_file", _second_read)
+    source = tmp_path / "app.sql"
+    source.write_bytes(DATA)
+    destinations = [SimpleNamespace(path=str(tmp_path / name)) for name in ("nas", "usb")]
+
+    results = copy_to_destinations(str(source), destinations, "proj", "app")
+
+    expected = f"sha256:{hashlib.sha256(DATA).hexdigest()}"
+    for destination in destinations:
+        result = results[destination.path]
+        assert result["success"], result
+        assert result["checksum"] == expected
@@ -0,0 +1,115 @@
+import os
+
+from app.utils import pg_wal
+
+SEGMENT_SIZE = 16 * 1024 * 1024
+
+
+class FakeConnection:
+    def close(self):
+        pass
+
+
+def _stub_server(tmp_path, monkeypatch, start_segment="000000010000000000000002"):
+    monkeypatch.setattr(pg_wal, "STAGING_DIR", str(tmp_path))
+    monkeypatch.setattr(pg_wal, "_connect", lambda *args: FakeConnection())
+    monkeypatch.setattr(pg_wal, "slot_exists", lambda connection, slot_name: True)
+    monkeypatch.setattr(pg_wal, "switch_wal", lambda connection: "0/3000000")
+    monkeypatch.setattr(pg_wal, "get_start_segment",
+                        lambda connection, last_segment, start_lsn: (start_segment, SEGMENT_SIZE))
+
+
+def test_archive_wal_increment_ships_new_segments(tmp_path, monkeypatch):
+    """pg_receivewal (stubbed) starts at the seeded segment; the completed segments are shipped as one tar"""
+    _stub_server(tmp_path, monkeypatch)
+    commands = []
+
+    def fake_run_command(cmd, timeout, env=None, progress=None):
+        commands.append(cmd)
+        wal_dir = cmd[cmd.index("-D") + 1]
+        # Started from the full-size placeholder of the first segment not archived yet
+        seeded = os.path.join(wal_dir, "000000010000000000000002.partial")
+        assert os.path.getsize(seeded) == SEGMENT_SIZE
+        os.rename(seeded, os.path.join(wal_dir, "000000010000000000000002"))
+        for name in ("000000010000000000000003", "000000010000000000000004.partial"):
+            with open(os.path.join(wal_dir, name), "wb") as f:
+                f.write(b"wal")
+        return 0, "", False
+
+    shipped = {}
+
+    def fake_stream(make_chunks, filename, destinations, *args, **kwargs):
+        shipped["filename"] = filename
+        shipped["data"] = b"".join(make_chunks())
+        return True, {"/dest": {"success": True}}, len(shipped["data"]), "ok"
+
+    monkeypatch.setattr(pg_wal, "run_command", fake_run_command)
+    monkeypatch.setattr(pg_wal, "stream_chunks_to_destinations", fake_stream)
+
+    success, results, _, message, metadata = pg_wal.archive_wal_increment(
+        "db", 5432, "postgres", None, "app", "app_20261017", [], "proj", "app", "slot_1",
+        last_segment="000000010000000000000001", start_lsn="0/1000028"
+    )
+
+    assert success, message
+    assert commands and commands[0][0] == "pg_receivewal"
+    assert metadata["first_segment"] == "000000010000000000000002"
+    assert metadata["last_segment"] == "000000010000000000000003"
+    assert metadata["segment_count"] == 2
+    assert metadata["start_lsn"] == "0/1000028"
+    assert shipped["filename"].endswith(".wal.tar")
+    assert b"000000010000000000000004" not in shipped["data"]
+    # Nothing is left on this worker: the cursor is the metadata
+    assert os.listdir(tmp_path) == []
+
+
+def test_archive_wal_increment_reports_pg_receivewal_failure(tmp_path, monkeypatch):
+    _stub_server(tmp_path, monkeypatch)
+    monkeypatch.setattr(pg_wal, "run_command", lambda cmd, timeout, env=None, progress=None:
+                        (1, "replication slot is active", False))
+
+    success, results, _, message, metadata = pg_wal.archive_wal_increment(
+        "db", 5432, "postgres", None, "app", "app_20261017", [], "proj", "app", "slot_1",
+        last_segment=None, start_lsn="0/1000028"
+    )
+
+    assert not success
+    assert message == "replication slot is active"
+    assert os.listdir(tmp_path) == []
+
+
+def test_archive_wal_increment_uses_estimated_timeout(tmp_path, monkeypatch):
+    _stub_server(tmp_path, monkeypatch)
+    timeouts = []
+
+    def fake_run_command(cmd, timeout, env=None, progress=None):
+        timeouts.append(timeout)
+        return 0, "", True
+
+    monkeypatch.setattr(pg_wal, "run_command", fake_run_command)
+
+    success, results, _, message, metadata = pg_wal.archive_wal_increment(
+        "db", 5432, "postgres", None, "app", "app_20261017", [], "proj", "app", "slot_1",
+        last_segment=None, start_lsn="0/1000028", timeout=7200
+    )
+
+    assert not success
+    assert timeouts == [7200]
+    assert message == "WAL archiving timed out after 2 hours"
+
+
+def test_archive_wal_increment_without_start_position_restarts_the_chain():
+    success, results, _, message, metadata = pg_wal.archive_wal_increment(
+        "db", 5432, "postgres", None, "app", "app_20261017", [], "proj", "app", "slot_1",
+        last_segment=None, start_lsn=None
+    )
+
+    assert not success
+    assert metadata == {"restart_chain": True}
+
+
+def test_next_segment_name():
+    assert pg_wal.next_segment_name("000000010000000000000002", SEGMENT_SIZE) == "000000010000000000000003"
+    # 256 segments of 16 MB per log file, then the log number increases
+    assert pg_wal.next_segment_name("0000000200000003000000FF", SEGMENT_SIZE) == "000000020000000400000000"
+    assert pg_wal.next_segment_name("00000001000000000000003F", 64 * 1024 * 1024) == "000000010000000100000000"
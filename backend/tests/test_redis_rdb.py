@@ -0,0 +1,79 @@
+import socket
+import threading
+
+import pytest
+
+from app.utils import redis_rdb
+from app.utils.redis_rdb import iter_rdb_snapshot
+
+RDB = b"REDIS0011" + bytes(range(256)) * 64
+MARK = b"m" * redis_rdb.EOF_MARK_SIZE
+
+
+def _fake_server(diskless_sync):
+    """Redis stand-in on a local port, answering CONFIG GET, REPLCONF and SYNC; returns (port, commands)"""
+    listener = socket.create_server(("127.0.0.1", 0))
+    commands = []
+
+    def serve():
+        conn, _ = listener.accept()
+        listener.close()
+        stream = conn.makefile("rb")
+        try:
+            while True:
+                line = stream.readline()
+                if not line:
+                    return
+                args = []
+                for _ in range(int(line[1:])):
+                    stream.readline()
+                    args.append(stream.readline().rstrip(b"\r\n").decode())
+                commands.append(args)
+                if args[0] == "CONFIG":
+                    if diskless_sync is None:
+                        conn.sendall(b"-ERR unknown command 'CONFIG'\r\n")
+                    else:
+                        conn.sendall(b"*2\r\n$18\r\nrepl-diskless-sync\r\n"
+                                     + f"${len(diskless_sync)}\r\n{diskless_sync}\r\n".encode())
+                elif args[0] == "REPLCONF":
+                    conn.sendall(b"+OK\r\n")
+                elif args[0] == "SYNC":
+                    if diskless_sync == "yes":
+                        conn.sendall(b"\n\n$EOF:" + MARK + b"\r\n" + RDB + MARK)
+                    else:
+                        conn.sendall(f"${len(RDB)}\r\n".encode() + RDB)
+        finally:
+            stream.close()
+            conn.close()
+
+    threading.Thread(target=serve, daemon=True).start()
+    return listener.getsockname()[1], commands
+
+
+def test_diskless_snapshot():
+    port, commands = _fake_server("yes")
+
+    assert b"".join(iter_rdb_snapshot("127.0.0.1", port, None, None, chunk_size=1000)) == RDB
+    assert [args[0] for args in commands] == ["CONFIG", "REPLCONF", "REPLCONF", "SYNC"]
+
+
+def test_disk_based_sync_is_refused_before_the_snapshot():
+    port, commands = _fake_server("no")
+
+    with pytest.raises(IOError, match="repl-diskless-sync yes"):
+        b"".join(iter_rdb_snapshot("127.0.0.1", port, None, None, allow_disk_sync=False))
+    assert "SYNC" not in [args[0] for args in commands]
+
+
+def test_disk_based_sync_when_allowed():
+    port, commands = _fake_server("no")
+
+    assert b"".join(iter_rdb_snapshot("127.0.0.1", port, None, None, allow_disk_sync=True)) == RDB
+    # Not even asked: the snapshot is taken either way
+    assert "CONFIG" not in [args[0] for args in commands]
+
+
+def test_snapshot_when_config_is_unavailable():
+    port, commands = _fake_server(None)
+
+    assert b"".join(iter_rdb_snapshot("127.0.0.1", port, None, None, allow_disk_sync=False)) == RDB
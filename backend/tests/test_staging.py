@@ -0,0 +1,21 @@
+import os
+
+from app.utils import staging
+from app.utils.staging import StagingArea, reclaim_orphaned_staging
+
+
+def test_reclaim_orphaned_staging_only_removes_backup_artifacts(tmp_path, monkeypatch):
+    monkeypatch.setattr(staging.staging, "areas", [StagingArea(str(tmp_path))])
+    orphans = ["app_20261017_020000_1a2b3c4d.dump", "app_20261017_020000_1a2b3c4d.dump.partial",
+               "app_20261017_020000_1a2b3c4d.dump.partial.checkpoint"]
+    kept = "app_20261016_020000_9f8e7d6c.dump"
+    foreign = ["lost+found", "notes.txt", "app.dump", "pgdata"]
+    for name in orphans + [kept] + foreign:
+        with open(tmp_path / name, "wb") as f:
+            f.write(b"x")
+    for name in ("app_20261017_020000_5e6f7a8b.dir", "app_20261017_020000_0badcafe.wal"):
+        os.makedirs(tmp_path / name / "sub")
+
+    reclaim_orphaned_staging([str(tmp_path / kept)])
+
+    assert sorted(os.listdir(tmp_path)) == sorted([kept] + foreign)